@@ -13,6 +13,7 @@ from .processing import processing_mgmt
 from .processing.avspex_processor import AVSpexProcessor
 from .utils import dir_setup
 from .utils import config_edit
+from .utils import fixity_cache
 from .utils.log_setup import logger
 from .utils.config_setup import SpexConfig
 from .utils.config_manager import ConfigManager
@@ -66,6 +67,7 @@ class ParsedArguments:
     import_config: Optional[str]
     mediaconch_policy: Optional[str]
     use_default_config: bool
+    force_rehash: bool
 
 
 PROFILE_MAPPING = {
@@ -154,6 +156,8 @@ The scripts will confirm that the digital files conform to predetermined specifi
                     help='Import configs from JSON file')
     parser.add_argument("--mediaconch-policy",
                     help="Path to custom MediaConch policy XML file")
+    parser.add_argument("--force-rehash", action="store_true",
+                    help="Calculate checksums and stream hashes again, instead of using the ones cached from earlier runs")
 
     args = parser.parse_args()
 
@@ -196,7 +200,8 @@ The scripts will confirm that the digital files conform to predetermined specifi
         export_file=args.export_file,
         import_config=args.import_config,
         mediaconch_policy=args.mediaconch_policy,
-        use_default_config=args.use_default_config
+        use_default_config=args.use_default_config,
+        force_rehash=args.force_rehash
     )
 
 
@@ -243,6 +248,9 @@ def run_cli_mode(args):
     if args.mediaconch_policy:
         processing_mgmt.setup_mediaconch_policy(args.mediaconch_policy)
 
+    if args.force_rehash:
+        fixity_cache.force_rehash = True
+
     # Update spex config
     if args.sn_config_changes:
         config_edit.apply_signalflow_profile(args.sn_config_changes)
@@ -1,6 +1,5 @@
 import xml.etree.ElementTree as ET
 import subprocess
-import tempfile
 import os
 import time
 import re
@@ -8,10 +7,15 @@ import json
 from ..utils.log_setup import logger
 from ..utils.config_setup import ChecksConfig
 from ..utils.config_manager import ConfigManager
+from ..utils import fixity_cache
+from ..utils import mkv_tags
 
 config_mgr = ConfigManager()
 checks_config = config_mgr.get_config('checks', ChecksConfig)
 
+# Names of the stream hashes in the fixity cache
+stream_hash_names = ('video_stream_md5', 'audio_stream_md5')
+
 
 def get_total_frames(video_path):
     """
@@ -184,10 +188,35 @@ def make_stream_hash(video_path, check_cancelled=None, signals=None):
     return video_hash, audio_hash
 
 
+def get_stream_hashes(video_path, check_cancelled=None, signals=None, use_cache=True):
+    """
+    Returns the (video, audio) stream hashes of the MKV, from the fixity cache if it hasn't changed
+    since they were calculated, and with make_stream_hash otherwise.
+    With use_cache False they are always calculated, and replace the cached ones.
+    """
+    cached = fixity_cache.get_cached_digests(video_path, stream_hash_names) if use_cache else {}
+    if len(cached) == len(stream_hash_names):
+        logger.info(f'Using the stream hashes of {os.path.basename(video_path)} from the fixity cache, the file is unchanged since they were calculated\n')
+        return tuple(cached[name] for name in stream_hash_names)
+    read_identity = fixity_cache.file_identity(video_path)
+    hash_result = make_stream_hash(video_path, check_cancelled=check_cancelled, signals=signals)
+    if hash_result is None:
+        return None
+    if None not in hash_result:
+        fixity_cache.store_digests(video_path, dict(zip(stream_hash_names, hash_result)), read_identity)
+    return hash_result
+
+
 def extract_tags(video_path):
-    command = f"mkvextract tags {video_path}"
-    result = subprocess.run(command, capture_output=True, text=True, shell=True)
-    return result.stdout
+    """Returns the tags of the MKV as mkvextract's XML, or an empty string if it has none or they can't be read."""
+    try:
+        root = mkv_tags.read_tags(video_path)
+    except (OSError, mkv_tags.MatroskaError) as e:
+        logger.critical(f"Unable to read the MKV tags of {os.path.basename(video_path)}: {e}\n")
+        return ''
+    if root is None:
+        return ''
+    return ET.tostring(root, encoding="unicode")
 
 
 def add_stream_hash_tag(xml_tags, video_hash, audio_hash):
@@ -237,26 +266,15 @@ def add_stream_hash_tag(xml_tags, video_hash, audio_hash):
     return ET.tostring(root, encoding="unicode")
 
 
-def write_tags_to_temp_file(xml_tags):
-    # Create a temporary XML file
-    with tempfile.NamedTemporaryFile(mode='w+', suffix=".xml", delete=False) as temp_file:
-        temp_file.write(xml_tags)
-        temp_file_path = temp_file.name
-    return temp_file_path
-
-
-def write_tags_to_mkv(mkv_file, temp_xml_file):
-    command = f'mkvpropedit --tags "global:{temp_xml_file}" "{mkv_file}"'
-    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    stdout, stderr = process.communicate()
-
-    # Check if there's any output
-    if stdout:
-        # Modify the output as needed
-        modified_output = stdout.decode('utf-8').replace('Done.', '')
-        logger.info(f'Running mkvpropedit:\n{modified_output}')  # Or do something else with the modified output
-    if stderr:
-        logger.critical(f"Running mkvpropedit:\n{stderr.decode('utf-8')}")  # Print any errors if they occur
+def write_tags_to_mkv(mkv_file, xml_tags):
+    """Replaces the tags of the MKV with xml_tags (mkvextract's XML), in place."""
+    try:
+        mkv_tags.write_tags(mkv_file, ET.fromstring(xml_tags))
+    except (OSError, mkv_tags.MatroskaError) as e:
+        logger.critical(f"Unable to write the MKV tags of {os.path.basename(mkv_file)}: {e}\n")
+        return False
+    logger.info(f'Tags written to {os.path.basename(mkv_file)}\n')
+    return True
 
 
 def extract_hashes(xml_tags):
@@ -292,11 +310,11 @@ def compare_hashes(existing_video_hash, existing_audio_hash, video_hash, audio_h
         logger.critical(f"Audio hashes do not match. MD5 stored in MKV file: {existing_audio_hash} Generated MD5:{audio_hash}\n")
 
 
-def embed_fixity(video_path, check_cancelled=None, signals=None):
+def embed_fixity(video_path, check_cancelled=None, signals=None, use_cache=True):
 
     # Make md5 of video/audio stream
     logger.debug('Generating video and audio stream hashes. This may take a moment...')
-    hash_result = make_stream_hash(video_path, check_cancelled=check_cancelled, signals=signals)
+    hash_result = get_stream_hashes(video_path, check_cancelled=check_cancelled, signals=signals, use_cache=use_cache)
     if hash_result is None:
         return None
     video_hash, audio_hash = hash_result
@@ -316,21 +334,20 @@ def embed_fixity(video_path, check_cancelled=None, signals=None):
     if existing_tags:
         updated_tags = add_stream_hash_tag(existing_tags, video_hash, audio_hash)
     else:
-        logger.critical("mkvextract unable to extract MKV tags! Unable to embed stream hashes.\n")
+        logger.critical("Unable to read MKV tags! Unable to embed stream hashes.\n")
         return
     
     if check_cancelled():
         return None
 
-    # Write updated tags to a temporary XML file
-    temp_xml_file = write_tags_to_temp_file(updated_tags)
-
     # Write updated tags back to MKV file
-    logger.debug('Embedding video and audio stream hashes to XML in MKV file')
-    write_tags_to_mkv(video_path, temp_xml_file)
+    logger.debug('Embedding video and audio stream hashes in the MKV tags')
+    if not write_tags_to_mkv(video_path, updated_tags):
+        return
 
-    # Remove the temporary XML file
-    os.remove(temp_xml_file)
+    # Writing tags doesn't change the streams, the hashes just calculated are those of the file as it is now
+    if video_hash is not None and audio_hash is not None:
+        fixity_cache.store_digests(video_path, dict(zip(stream_hash_names, (video_hash, audio_hash))))
 
 
 def validate_embedded_md5(video_path, check_cancelled=None, signals=None):
@@ -356,7 +373,8 @@ def validate_embedded_md5(video_path, check_cancelled=None, signals=None):
             embed_fixity(video_path, check_cancelled=check_cancelled)
             return
         logger.debug('Generating video and audio stream hashes. This may take a moment...')
-        hash_result = make_stream_hash(video_path, check_cancelled=check_cancelled, signals=signals)
+        # calculated from the streams, never cached: validating has to read them (see fixity_check.get_file_digests)
+        hash_result = get_stream_hashes(video_path, check_cancelled=check_cancelled, signals=signals, use_cache=False)
         if hash_result is None:
             return None
         video_hash, audio_hash = hash_result
@@ -364,12 +382,32 @@ def validate_embedded_md5(video_path, check_cancelled=None, signals=None):
         logger.debug('Validating stream fixity\n')
         compare_hashes(existing_video_hash, existing_audio_hash, video_hash, audio_hash)
     else:
-        logger.critical("mkvextract unable to extract MKV tags! Cannot validate stream hashes.\n")
+        logger.critical("Unable to read MKV tags! Cannot validate stream hashes.\n")
 
     if check_cancelled():
         return None
 
 
+def stream_fixity_writes_tags(video_path):
+    """
+    Whether embedding or validating stream fixity may write tags into the MKV, as set in the fixity config.
+
+    Stream hashes are embedded if they are missing, or if they are to be overwritten (or the user may be asked),
+    and validation embeds them when they are missing. Anything reading the whole file has to wait until they are written.
+    """
+    fixity = checks_config.fixity
+    if fixity.embed_stream_fixity == 'yes':
+        if fixity.overwrite_stream_fixity != 'no':
+            return True
+    elif fixity.validate_stream_fixity != 'yes':
+        return False
+    existing_tags = extract_tags(video_path)
+    if not existing_tags:
+        return True
+    existing_video_hash, existing_audio_hash = extract_hashes(existing_tags)
+    return existing_video_hash is None or existing_audio_hash is None
+
+
 def process_embedded_fixity(video_path, check_cancelled=None, signals=None):
     """
     Handles embedding stream fixity tags in the video file.
@@ -388,7 +426,8 @@ def process_embedded_fixity(video_path, check_cancelled=None, signals=None):
         logger.critical("Existing stream hashes found!")
         if checks_config.fixity.overwrite_stream_fixity == 'yes':
             logger.critical('New stream hashes will be generated and old hashes will be overwritten!\n')
-            embed_fixity(video_path, check_cancelled=check_cancelled, signals=signals)
+            # new hashes, not cached ones, as with --force-rehash
+            embed_fixity(video_path, check_cancelled=check_cancelled, signals=signals, use_cache=False)
         elif checks_config.fixity.overwrite_stream_fixity == 'no':
             logger.error('Not writing stream hashes to MKV\n')
         elif checks_config.fixity.overwrite_stream_fixity == 'ask me':
@@ -396,7 +435,7 @@ def process_embedded_fixity(video_path, check_cancelled=None, signals=None):
             while True:
                 user_input = input("Do you want to overwrite existing stream hashes? (yes/no): ")
                 if user_input.lower() in ["yes", "y"]:
-                    embed_fixity(video_path, check_cancelled=check_cancelled, signals=signals)
+                    embed_fixity(video_path, check_cancelled=check_cancelled, signals=signals, use_cache=False)
                     break
                 elif user_input.lower() in ["no", "n"]:
                     logger.debug('Not writing stream hashes to MKV\n')
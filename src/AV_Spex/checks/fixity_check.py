@@ -5,9 +5,30 @@ import shutil
 import re
 from datetime import datetime
 from ..utils.log_setup import logger
+from ..utils.file_reader import BlockReader
+from ..utils import fixity_cache
+from ..utils.config_setup import ChecksConfig
+from ..utils.config_manager import ConfigManager
 
+config_mgr = ConfigManager()
+checks_config = config_mgr.get_config('checks', ChecksConfig)
 
-def check_fixity(directory, video_id, actual_checksum=None, check_cancelled=None, signals=None):
+# Algorithms the fixity checks can compute, by their hashlib names. md5 is always computed, it is what check_fixity validates
+checksum_algorithms = ('md5', 'sha1', 'sha256', 'blake2b')
+
+# Digests computed during this run from reading the files, keyed by file identity (see get_file_digests)
+file_digests = {}
+
+
+def clear_file_digests():
+    """
+    Forgets the digests computed so far. Called at the start of each processing run, so a later run
+    (another run in the GUI) reads the files again, and --force-rehash and cache_max_age_days apply to it.
+    """
+    file_digests.clear()
+
+
+def check_fixity(directory, video_id, actual_checksum=None, check_cancelled=None, signals=None, drop_cache=True):
     if check_cancelled():
         return None
     
@@ -64,11 +85,16 @@ def check_fixity(directory, video_id, actual_checksum=None, check_cancelled=None
     if os.path.exists(video_file_path):
         # If checksum has not yet been calculated, then:
         if not checksum_files and actual_checksum is None:
-            output_fixity(directory, video_file_path, check_cancelled=check_cancelled, signals=signals)
+            output_fixity(directory, video_file_path, check_cancelled=check_cancelled, signals=signals, drop_cache=drop_cache)
             return
         elif checksum_files and actual_checksum is None:
-            # Calculate the MD5 checksum of the video file
-            actual_checksum = hashlib_md5(video_file_path, check_cancelled=check_cancelled, signals=signals)
+            # Calculate the MD5 checksum of the video file, unless it has already been calculated in this run.
+            # Never from the fixity cache: it can't tell that the file's content has changed (bit rot)
+            digests = get_file_digests(video_file_path, check_cancelled=check_cancelled, signals=signals, drop_cache=drop_cache,
+                                       use_cache=False)
+            if digests is None:
+                return None
+            actual_checksum = digests['md5']
     else:
         logger.critical(f'Video file not found: {video_file_path}')
         return
@@ -105,20 +131,22 @@ def check_fixity(directory, video_id, actual_checksum=None, check_cancelled=None
         result_file.close()
 
 
-def output_fixity(source_directory, video_path, check_cancelled=None, signals=None):
+def output_fixity(source_directory, video_path, check_cancelled=None, signals=None, drop_cache=True):
     # Parse video_id from video file path
     video_id = os.path.splitext(os.path.basename(os.path.basename(video_path)))[0]
     # Create fixity results files
-    fixity_result_file = os.path.join(source_directory, f'{video_id}_{datetime.now().strftime("%Y_%m_%d_%H_%M")}_fixity.txt')
-    fixity_md5_file = os.path.join(source_directory, f'{video_id}_{datetime.now().strftime("%Y_%m_%d_%H_%M")}_fixity.md5')
+    fixity_date = datetime.now().strftime("%Y_%m_%d_%H_%M")
+    fixity_result_file = os.path.join(source_directory, f'{video_id}_{fixity_date}_fixity.txt')
+    fixity_md5_file = os.path.join(source_directory, f'{video_id}_{fixity_date}_fixity.md5')
 
     if check_cancelled():
         return None
     
-    # Calculate the MD5 checksum of the video file
-    md5_checksum = hashlib_md5(video_path, check_cancelled=check_cancelled, signals=signals)
-    if md5_checksum is None:  # Handle cancelled case
+    # Calculate the checksums of the video file in one read (or reuse the ones calculated earlier in this run)
+    digests = get_file_digests(video_path, check_cancelled=check_cancelled, signals=signals, drop_cache=drop_cache)
+    if digests is None:  # Handle cancelled case
         return None
+    md5_checksum = digests['md5']
     
     if check_cancelled():
         return None
@@ -132,6 +160,15 @@ def output_fixity(source_directory, video_path, check_cancelled=None, signals=No
     
     shutil.copy(fixity_result_file, fixity_md5_file)
     logger.debug(f'MD5 checksum written to {fixity_result_file}\n')    
+
+    # Every other configured algorithm gets its own sidecar, in the same format ({video_id}_{date}_fixity.sha256)
+    for algorithm, checksum in digests.items():
+        if algorithm == 'md5':
+            continue
+        fixity_checksum_file = os.path.join(source_directory, f'{video_id}_{fixity_date}_fixity.{algorithm}')
+        with open(fixity_checksum_file, 'w') as checksum_file:
+            print(f'{checksum}  {os.path.basename(video_path)}', file = checksum_file)
+        logger.debug(f'{algorithm} checksum written to {fixity_checksum_file}\n')
     return md5_checksum
 
 
@@ -150,54 +187,118 @@ def read_checksum_from_file(file_path):
     return None
 
 
-def hashlib_md5(filename, check_cancelled=None, signals=None):
+def get_algorithms(algorithms=None):
+    """
+    Returns the algorithms to compute: md5 first, then the others in algorithms (checksum_algorithms in the
+    fixity config if None). Algorithms that aren't in checksum_algorithms are skipped with a warning.
+    """
+    if algorithms is None:
+        algorithms = checks_config.fixity.checksum_algorithms
+    selected = ['md5']
+    for algorithm in algorithms:
+        algorithm = algorithm.lower()
+        if algorithm not in checksum_algorithms:
+            logger.warning(f"Unsupported checksum algorithm '{algorithm}', use one of {', '.join(checksum_algorithms)}\n")
+        elif algorithm not in selected:
+            selected.append(algorithm)
+    return selected
+
+
+def get_file_digests(filename, algorithms=None, check_cancelled=None, signals=None, drop_cache=True, use_cache=True):
+    """
+    Returns the checksums of a file, calculating them in a single read the first time they are needed in this run.
+
+    Results are kept by the file's path, size and modification time, so output_fixity and check_fixity share
+    one read of the file, and a file that has changed since is read again. Checksums calculated in an earlier
+    run are taken from the fixity cache when the file hasn't changed since (see fixity_cache), unless use_cache
+    is False.
+
+    Parameters:
+        filename (str): Path to the file
+        algorithms (list, optional): Algorithms to compute on top of md5, see get_algorithms.
+        check_cancelled (callable, optional): Returns True if processing has been cancelled.
+        signals (optional): Progress is emitted with signals.md5_progress.
+        drop_cache (bool): Drop the pages read from the page cache (see file_reader.BlockReader). Turn it off
+            when the file is being read by another process at the same time, like the stream hash ffmpeg.
+        use_cache (bool): Take checksums from the fixity cache. check_fixity doesn't: the cache only knows the
+            file's size and times, which don't change when its content decays, so validating needs the file read.
+
+    Returns:
+        dict or None: Hex digest by algorithm name, or None if it was cancelled.
+    """
+    algorithms = get_algorithms(algorithms)
+    stat = os.stat(filename)
+    key = (os.path.realpath(filename), stat.st_size, stat.st_mtime_ns)
+    # only digests read from the file in this run are kept in file_digests, cached ones are not
+    digests = dict(file_digests.get(key, {}))
+    missing = [algorithm for algorithm in algorithms if algorithm not in digests]
+    if missing and use_cache:
+        cached = fixity_cache.get_cached_digests(filename, missing)
+        if cached:
+            logger.info(f'Using the {", ".join(cached)} checksum of {os.path.basename(filename)} from the fixity cache, the file is unchanged since it was calculated\n')
+            digests.update(cached)
+            missing = [algorithm for algorithm in missing if algorithm not in cached]
+    if missing:
+        read_identity = fixity_cache.file_identity(filename)
+        calculated = hash_file(filename, missing, check_cancelled=check_cancelled, signals=signals, drop_cache=drop_cache)
+        if calculated is None:
+            return None
+        fixity_cache.store_digests(filename, calculated, read_identity)
+        file_digests[key] = {**file_digests.get(key, {}), **calculated}
+        digests.update(calculated)
+    else:
+        logger.debug(f'Using the checksums of {os.path.basename(filename)} calculated earlier\n')
+    return {algorithm: digests[algorithm] for algorithm in algorithms}
+
+
+def hash_file(filename, algorithms=('md5',), check_cancelled=None, signals=None, drop_cache=True):
     '''
-    Create an md5 checksum.
+    Create checksums of a file with each of algorithms, reading it once.
     '''
-    if check_cancelled():
+    if check_cancelled is not None and check_cancelled():
         return None
     
-    read_size = 0
     last_percent_done = 0
-    md5_object = hashlib.md5()
-    total_size = os.path.getsize(filename)
-    logger.debug(f'Generating md5 checksum for {os.path.basename(filename)} via {os.path.basename(__file__)}:')
-    
-    with open(str(filename), 'rb') as file_object:
-        while True:
-            if check_cancelled():
+    hash_objects = {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+    logger.debug(f'Generating {", ".join(algorithms)} checksum for {os.path.basename(filename)} via {os.path.basename(__file__)}:')
+
+    def report_progress(read_size, total_size):
+        nonlocal last_percent_done
+        # Calculate percentage (0-100), capped at 100
+        percent_done = min(100, int((read_size * 100) / total_size)) if total_size else 100
+        if percent_done > last_percent_done:
+            if signals:
+                signals.md5_progress.emit(percent_done)
+            else:
+                sys.stdout.write('[%d%%]\r' % percent_done)
+                sys.stdout.flush()
+            last_percent_done = percent_done
+
+    # blocks are read ahead on another thread while this one hashes (see file_reader)
+    with BlockReader(str(filename), progress=report_progress, drop_cache=drop_cache) as reader:
+        for block in reader:
+            if check_cancelled is not None and check_cancelled():
                 logger.warning("Checksum calculation cancelled.")
                 return None
-            buf = file_object.read(2**20)
-            if not buf:
-                break
-            read_size += len(buf)
-            md5_object.update(buf)
-            
-            # Calculate percentage (0-100)
-            percent_done = int((read_size * 100) / total_size)
-            
-            # Ensure percent_done is capped at 100
-            percent_done = min(100, percent_done)
-            
-            if percent_done > last_percent_done:
-                # Add debug printing for both cases
-                
-                if signals:
-                    # Make doubly sure we're emitting an integer percentage in range 0-100
-                    safe_percent = min(100, max(0, int(percent_done)))
-                    signals.md5_progress.emit(safe_percent)
-                else:
-                    sys.stdout.write('[%d%%]\r' % percent_done)
-                    sys.stdout.flush()
-                    
-                last_percent_done = percent_done
-                
-    md5_output = md5_object.hexdigest()
-    logger.info(f'Calculated md5 checksum is {md5_output}\n')
-    return md5_output
+            for hash_object in hash_objects.values():
+                hash_object.update(block)
+
+    digests = {algorithm: hash_object.hexdigest() for algorithm, hash_object in hash_objects.items()}
+    for algorithm, digest in digests.items():
+        logger.info(f'Calculated {algorithm} checksum is {digest}\n')
+    return digests
+
+
+def hashlib_md5(filename, check_cancelled=None, signals=None):
+    '''
+    Create an md5 checksum.
+    '''
+    digests = hash_file(filename, ('md5',), check_cancelled=check_cancelled, signals=signals)
+    if digests is None:
+        return None
+    return digests['md5']
 
-## The function above, hashlib_md5 is a slightly modified version of the function from the open-source project IFIscripts
+## The function hash_file above (formerly hashlib_md5) is a slightly modified version of the function from the open-source project IFIscripts
 ## More here: https://github.com/Irish-Film-Institute/IFIscripts/blob/master/scripts/copyit.py
 ## IFIscripts license information below:
 # The MIT License (MIT)
@@ -8,36 +8,34 @@
 # The original code from the qct-parse was written by Brendan Coates and Morgan Morel as part of the 2016 AMIA "Hack Day"
 # Summary of that event here: https://wiki.curatecamp.org/index.php/Association_of_Moving_Image_Archivists_%26_Digital_Library_Federation_Hack_Day_2016
 
-import gzip
+import math
 import os
 import subprocess
 import shutil
 import sys
+import time
 import re
 import operator
 import collections      # for circular buffer
 import csv
+import concurrent.futures
 import datetime as dt
+from array import array
 from dataclasses import asdict
 
 from ..utils.log_setup import logger
 from ..utils.config_setup import ChecksConfig, SpexConfig
 from ..utils.config_manager import ConfigManager
+from .qctools_report import (
+    load_etree, load_numpy, open_report, is_embedded_report, iter_report_frames, iter_report_window, get_report_columns,
+    ColumnsBuilder, FrameParser, release_frame
+)
+from .tag_statistics import TagStatistics, report_tag_statistics
 
 config_mgr = ConfigManager()
 checks_config = config_mgr.get_config('checks', ChecksConfig)
 spex_config = config_mgr.get_config('spex', SpexConfig)
 
-def load_etree():
-    """Helper function to load lxml.etree with error handling"""
-    try:
-        from lxml import etree
-        return etree
-    except ImportError as e:
-        logger.critical(f"Error importing lxml.etree: {e}")
-        return None
-
-
 # Dictionary to map the string to the corresponding operator function
 operator_mapping = {
     'lt': operator.lt,
@@ -47,6 +45,231 @@ operator_mapping = {
 # init variable for config list of QCTools tags
 fullTagList = asdict(spex_config.qct_parse_values.fullTagList)
 
+
+# Threshold rules
+# Every check compares tag values with thresholds: the profile and tag checks, content filters and bars evaluation.
+# The comparisons are worked out once per run, from the config (or maxBarsDict), into ThresholdRules
+# that every evaluator uses, instead of each one working them out again for every frame.
+ThresholdRule = collections.namedtuple('ThresholdRule', ['tag', 'key', 'comparison', 'threshold'])
+
+
+def rule_key(tag):
+    """
+    Returns the frameDict key of a tag named in the config.
+
+    The config names psnr and mse tags with an underscore (mse_y), frameDicts with a dot (mse.y, see qctools_report.tag_key_name).
+    """
+    match = re.match(r"^(mse|psnr)_([yuv])$", tag)
+    if match:
+        return f"{match.group(1)}.{match.group(2)}"
+    return tag
+
+
+class ThresholdRules:
+    """
+    An immutable, ordered set of threshold comparisons.
+
+    A frame fails a rule if comparison(value, threshold) is True. Tags missing from a frame never fail.
+
+    Parameters:
+        rules (iterable): ThresholdRule for each tag that is checked.
+    """
+
+    def __init__(self, rules=()):
+        self.rules = tuple(rules)
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def __len__(self):
+        return len(self.rules)
+
+    @property
+    def keys(self):
+        """frameDict keys the rules read."""
+        return [rule.key for rule in self.rules]
+
+    def failures(self, frameDict):
+        """Returns (rule, value) for each rule the frame fails."""
+        failed = []
+        for rule in self.rules:
+            value = frameDict.get(rule.key)
+            if value is None:
+                continue
+            value = float(value)
+            if rule.comparison(value, rule.threshold):
+                failed.append((rule, value))
+        return failed
+
+    def all_met(self, frameDict):
+        """Returns True if the frame has every tag and meets every comparison, as content filters require."""
+        for rule in self.rules:
+            value = frameDict.get(rule.key)
+            if value is None or not rule.comparison(float(value), rule.threshold):
+                return False
+        return True
+
+    def bind(self, columns):
+        """
+        Resolves the rules to the columns of a report, for whole column evaluation.
+
+        Returns:
+            tuple: (rules, indices, less_than, thresholds) for the rules whose tags are columns: the rules, and
+                NumPy arrays of their column indices, whether the comparison is lt (otherwise gt) and thresholds.
+        """
+        numpy = load_numpy()
+        bound = [rule for rule in self.rules if rule.key in columns]
+        indices = numpy.array([columns.column_index(rule.key) for rule in bound], dtype=numpy.intp)
+        less_than = numpy.array([rule.comparison is operator.lt for rule in bound], dtype=bool)
+        thresholds = numpy.array([rule.threshold for rule in bound], dtype=numpy.float64)
+        return tuple(bound), indices, less_than, thresholds
+
+
+def compile_profile(profile):
+    """
+    Compiles a threshold profile (or maxBarsDict), where the tag name sets the comparison:
+    frames fail below the thresholds of MIN and LOW tags, and above the others.
+
+    Parameters:
+        profile (dict): Tag names and their thresholds. Tags with no threshold (None) are skipped.
+
+    Returns:
+        ThresholdRules
+    """
+    rules = []
+    for tag, threshold in profile.items():
+        if threshold is None:
+            continue
+        comparison = operator.lt if "MIN" in tag or "LOW" in tag else operator.gt
+        rules.append(ThresholdRule(tag, rule_key(tag), comparison, float(threshold)))
+    return ThresholdRules(rules)
+
+
+def parse_tagname(tagname):
+    """
+    Parses the tagname setting into (tag, operator, threshold) entries.
+
+    tagname is a string in the format "YMIN, lt, 100", with several tags separated by ; or new lines,
+    or a list of [tag, operator, threshold] lists or "tag, operator, threshold" strings. Entries that
+    don't have a known operator and a number threshold are logged and skipped.
+
+    Returns:
+        list: (tag, operator string, threshold float) for each valid entry.
+    """
+    if not tagname:
+        return []
+    if isinstance(tagname, str):
+        entries = re.split(r"[;\n]", tagname)
+    else:
+        entries = tagname
+    parsed = []
+    for entry in entries:
+        if isinstance(entry, str):
+            if not entry.strip():
+                continue
+            parts = [part.strip() for part in entry.strip(" []").split(",")]
+        else:
+            parts = [str(part).strip() for part in entry]
+        try:
+            tag, operator_string, threshold = parts
+            if operator_string not in operator_mapping:
+                raise ValueError(f"unknown operator {operator_string}")
+            parsed.append((tag, operator_string, float(threshold)))
+        except ValueError as e:
+            logger.error(f"Ignoring qct-parse tagname entry {entry}, expected format 'YMIN, lt, 100': {e}\n")
+    return parsed
+
+
+def compile_tagname(tagname):
+    """Compiles the tagname setting (see parse_tagname) into ThresholdRules."""
+    return ThresholdRules(
+        ThresholdRule(tag, rule_key(tag), operator_mapping[operator_string], threshold)
+        for tag, operator_string, threshold in parse_tagname(tagname)
+    )
+
+
+def compile_content_filter(contentFilter_dict):
+    """
+    Compiles a content filter into ThresholdRules.
+
+    Parameters:
+        contentFilter_dict (dict): Tags and their [threshold, operator] lists, from qct_parse_values.content
+            in spex_config, or "threshold, operator" strings.
+    """
+    rules = []
+    for tag, config_value in contentFilter_dict.items():
+        if isinstance(config_value, str):
+            config_value = config_value.split(", ")
+        threshold, operator_string = config_value
+        rules.append(ThresholdRule(tag, rule_key(tag), operator_mapping[operator_string], float(threshold)))
+    return ThresholdRules(rules)
+
+
+# Profile name that selects every threshold profile in spex_config
+all_profiles = 'all'
+
+# Tags and thresholds of a profile (for kbeyond and the summary), and its compiled ThresholdRules
+ProfileCheck = collections.namedtuple('ProfileCheck', ['profile', 'rules'])
+
+
+class CompiledChecks:
+    """
+    The threshold rules of the checks enabled in qct_parse, compiled once per run.
+
+    Bars evaluation is compiled separately (compile_profile(maxBarsDict)), once the color bars values are known.
+
+    Parameters:
+        qct_parse (dict): qct-parse dictionary from checks_config
+
+    Attributes:
+        profiles (dict): Name of each threshold profile to check (every profile in spex_config if
+            qct_parse['profile'] is ["all"]) and its ProfileCheck.
+        tag_profile (dict): Tags of the tag check and their thresholds, None without a tag check.
+        tag_rules (ThresholdRules)
+        content_filters (dict): Name and ThresholdRules of each content filter defined in spex_config.
+        statistics_tags (list): (tag, key) of every tag in fullTagList if tagStatistics is on, otherwise empty.
+    """
+
+    def __init__(self, qct_parse):
+        qct_parse_values = spex_config.qct_parse_values
+        templates = qct_parse['profile'] or []
+        if all_profiles in templates:
+            templates = list(qct_parse_values.profiles.__dict__)
+        self.profiles = {}
+        for template in templates:
+            profile = {}
+            if template in qct_parse_values.profiles.__dict__:
+                # If the template matches one of the profiles
+                template_values = getattr(qct_parse_values.profiles, template)
+                for tag in fullTagList:
+                    if hasattr(template_values, tag):
+                        profile[tag] = getattr(template_values, tag)
+            self.profiles[template] = ProfileCheck(profile, compile_profile(profile))
+
+        self.tag_profile = None
+        self.tag_rules = ThresholdRules()
+        if qct_parse['tagname']:
+            self.tag_rules = compile_tagname(qct_parse['tagname'])
+            self.tag_profile = {rule.tag: rule.threshold for rule in self.tag_rules}
+
+        self.content_filters = {}
+        for filter_name in qct_parse['contentFilter'] or []:
+            if hasattr(qct_parse_values.content, filter_name):
+                self.content_filters[filter_name] = compile_content_filter(asdict(getattr(qct_parse_values.content, filter_name)))
+
+        self.statistics_tags = [(tag, rule_key(tag)) for tag in fullTagList] if qct_parse['tagStatistics'] else []
+
+    def profile_outputs(self, report_directory, template):
+        """
+        Returns the (failures csv, summary csv) paths of a profile check.
+
+        With more than one profile, the name of the profile is added to the file names
+        (qct-parse_profile_summary_{template}.csv), so every profile has its own summary.
+        """
+        suffix = f"_{template}" if len(self.profiles) > 1 else ""
+        return (os.path.join(report_directory, f"qct-parse_profile_failures{suffix}.csv"),
+                os.path.join(report_directory, f"qct-parse_profile_summary{suffix}.csv"))
+
 # Creates timestamp for pkt_dts_time
 def dts2ts(frame_pkt_dts_time):
     """
@@ -82,7 +305,7 @@ def dts2ts(frame_pkt_dts_time):
 
 
 # finds stuff over/under threshold
-def threshFinder(qct_parse, video_path, inFrame, startObj, pkt, tag, over, thumbPath, thumbDelay, thumbExportDelay, profile_name, failureInfo, adhoc_tag):
+def threshFinder(qct_parse, video_path, inFrame, startObj, pkt, rule, thumbPath, thumbDelay, thumbExportDelay, profile_name, failureInfo, frameCount):
     """
     Compares tagValue in frameDict (from qctools.xml.gz) with threshold from config
 
@@ -92,51 +315,30 @@ def threshFinder(qct_parse, video_path, inFrame, startObj, pkt, tag, over, thumb
         inFrame (dict): The most recent frameDict in framesList
         startObj (qctools.xml.gz): Starting object or reference, used in logging or naming.
         pkt (str): The attribute key used to extract timestamps from <frame> tag in qctools.xml.gz.
-        tag (str): Attribute tag from <frame> tag in qctools.xml.gz, is checked against the threshold.
-        over (float): The threshold value to compare against, from config
-        comp_op (callable): The comparison operator function (e.g., operator.lt, operator.gt).
+        rule (ThresholdRule): The tag, its comparison operator (e.g., operator.lt, operator.gt) and the threshold from config
         thumbPath (str): Path where thumbnails are saved.
         thumbDelay (int): Current delay count between thumbnails.
         thumbExportDelay (int): Required delay count between exporting thumbnails.
         profile_name (str): The name of the profile being checked against, used in naming thumbnail images
-        failureInfo (dict): Dictionary that stores tag, tagValue and threshold value (over) for each failed timestamp
+        failureInfo (FailureStore): Stores the timestamp, tag, tagValue and threshold value (over) of each failure
+        frameCount (int): Number of the frame in the report, to find runs of consecutive failing frames
 
     Returns:
-        tuple: (bool indicating if threshold was met, updated thumbDelay, updated failureInfo dictionary)
+        tuple: (bool indicating if threshold was met, updated thumbDelay, updated failureInfo)
     """
 
-    tagValue = float(inFrame[tag])
+    tag = rule.tag
+    over = rule.threshold
+    if rule.key not in inFrame:
+        return False, thumbDelay, failureInfo
+    tagValue = float(inFrame[rule.key])
     frame_pkt_dts_time = inFrame[pkt]
-
-    if adhoc_tag:
-        operator_string = None
-        for tag_list in qct_parse['tagname']:
-            if tag == tag_list[0]:
-                operator_string = tag_list[1]
-                break
-        if operator_string == "gt":
-            comparision = operator.gt
-        elif operator_string == "lt":
-            comparision = operator.lt
-    else:
-        if "MIN" in tag or "LOW" in tag:
-            comparision = operator.lt
-        else:
-            comparision = operator.gt
 	
-    if comparision(float(tagValue), float(over)): # if the attribute is over usr set threshold
-        timeStampString = dts2ts(frame_pkt_dts_time)
-        # Store failure information in the dictionary (update the existing dictionary, not create a new one)
-        if timeStampString not in failureInfo:  # If timestamp not in dict, initialize an empty list
-            failureInfo[timeStampString] = []
-
-        failureInfo[timeStampString].append({  # Add failure details to the list
-            'tag': tag,
-            'tagValue': tagValue,
-            'over': over
-        })
+    if rule.comparison(tagValue, over): # if the attribute is over usr set threshold
+        failureInfo.add(frame_pkt_dts_time, tag, tagValue, over, frameCount)  # Store failure information
 
         if qct_parse['thumbExport'] and (thumbDelay > int(thumbExportDelay)): # if thumb export is turned on and there has been enough delay between this frame and the last exported thumb, then export a new thumb
+            timeStampString = dts2ts(frame_pkt_dts_time)
             printThumb(video_path, tag, profile_name, startObj, thumbPath, tagValue, timeStampString)
             thumbDelay = 0
         return True, thumbDelay, failureInfo # return true because it was over and thumbDelay
@@ -144,10 +346,65 @@ def threshFinder(qct_parse, video_path, inFrame, startObj, pkt, tag, over, thumb
         return False, thumbDelay, failureInfo # return false because it was NOT over and thumbDelay
 
 
+class ThumbnailQueue:
+    """
+    Collects the thumbnails qct-parse asks for during analysis, then renders them all at once.
+
+    Each thumbnail is one ffmpeg command seeking straight to its timestamp. render() runs the commands with
+    no more than max_workers ffmpeg processes at a time, and returns once every thumbnail has been written.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.jobs = {}  # output path: ffmpeg command, so the same thumbnail is only made once
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def add(self, outputFramePath, ffmpegCommand):
+        self.jobs.setdefault(outputFramePath, ffmpegCommand)
+
+    def clear(self):
+        self.jobs = {}
+
+    def render(self, check_cancelled=None):
+        """
+        Runs the queued ffmpeg commands and waits for them to finish.
+
+        Parameters:
+            check_cancelled (callable, optional): Returns True if processing has been cancelled. Queued thumbnails that haven't started are skipped.
+
+        Returns:
+            int: The number of thumbnails written.
+        """
+        jobs = list(self.jobs.items())
+        self.clear()
+        if not jobs:
+            return 0
+
+        def run_job(job):
+            outputFramePath, ffmpegCommand = job
+            if check_cancelled is not None and check_cancelled():
+                return False
+            subprocess.run(ffmpegCommand, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            return os.path.isfile(outputFramePath)
+
+        logger.debug(f"Exporting {len(jobs)} thumbnails, {self.max_workers} at a time\n")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            rendered = sum(executor.map(run_job, jobs))
+        if rendered < len(jobs):
+            logger.warning(f"{len(jobs) - rendered} of {len(jobs)} thumbnails could not be exported\n")
+        return rendered
+
+
+# thumbnails requested by the current qct-parse run, rendered at the end of run_qctparse
+thumbQueue = ThumbnailQueue()
+
+
 #  print thumbnail images of overs/unders        
 def printThumb(video_path, tag, profile_name, startObj, thumbPath, tagValue, timeStampString):
     """
-    Exports a thumbnail image for a specific frame 
+    Queues a thumbnail image export for a specific frame, see ThumbnailQueue
 
     Parameters:
         video_path (str): Path to the video file.
@@ -165,14 +422,16 @@ def printThumb(video_path, tag, profile_name, startObj, thumbPath, tagValue, tim
         if match:
             ffoutputFramePath = ffoutputFramePath.replace(".", ":", 1) # replace first instance of "." in string ffoutputFramePath
         if tag == "TOUT":
-            ffmpegString = "ffmpeg -ss " + timeStampString + ' -i "' + video_path +  '" -vf signalstats=out=tout:color=yellow -vframes 1 -s 720x486 -y "' + ffoutputFramePath + '"' # Hardcoded output frame size to 720x486 for now, need to infer from input eventually
+            signalstatsFilter = "signalstats=out=tout:color=yellow"
         elif tag == "VREP":
-            ffmpegString = "ffmpeg -ss " + timeStampString + ' -i "' + video_path +  '" -vf signalstats=out=vrep:color=pink -vframes 1 -s 720x486 -y "' + ffoutputFramePath + '"' # Hardcoded output frame size to 720x486 for now, need to infer from input eventually
+            signalstatsFilter = "signalstats=out=vrep:color=pink"
         else:
-            ffmpegString = "ffmpeg -ss " + timeStampString + ' -i "' + video_path +  '" -vf signalstats=out=brng:color=cyan -vframes 1 -s 720x486 -y "' + ffoutputFramePath + '"' # Hardcoded output frame size to 720x486 for now, need to infer from input eventually
+            signalstatsFilter = "signalstats=out=brng:color=cyan"
+        # Hardcoded output frame size to 720x486 for now, need to infer from input eventually
+        ffmpegCommand = ['ffmpeg', '-ss', timeStampString, '-i', video_path, '-vf', signalstatsFilter, '-vframes', '1', '-s', '720x486', '-y', ffoutputFramePath]
         # Removing logging statement for now - too much clutter in output
         # logger.warning(f"Exporting thumbnail image of {video_id} to {os.path.basename(ffoutputFramePath)}\n")
-        output = subprocess.Popen(ffmpegString, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
+        thumbQueue.add(ffoutputFramePath, ffmpegCommand)
     else:
         logger.critical("Input video file not found when attempting to create thumbnail for report. Ensure video file is in the '_qc_metadata' directory as the QCTools report and report file name contains video file extension.")
         exit()
@@ -180,308 +439,176 @@ def printThumb(video_path, tag, profile_name, startObj, thumbPath, tagValue, tim
 
 
 # detect bars    
-def detectBars(startObj,pkt,durationStart,durationEnd,framesList,buffSize,bit_depth_10):
+def detectBars(startObj,pkt,bit_depth_10,durationLimit=None):
     """
-    Detects color bars in a video by analyzing frames within a buffered window and logging the start and end times of the bars.
+    Detects color bars at the head of a video, logging the start and end times of the bars.
 
-    This function iterates through the frames in a QCTools report, parses each frame, 
-    and analyzes specific tags (YMAX, YMIN, YDIF) to detect the presence of color bars. 
-    The detection checks a frame each time the buffer reaches the specified size (`buffSize`) and ends when the frame tags no longer match the expected bar values.
+    Only the frames of the first durationLimit seconds of the QCTools report are read, into columns of the
+    tags bars detection needs (YMAX, YMIN, YDIF), which detect_bars_columns checks all at once.
 
     Args:
-    args (argparse.Namespace): Parsed command-line arguments.
     startObj (str): Path to the QCTools report file (.qctools.xml.gz)
     pkt (str): Key used to identify the packet timestamp (pkt_*ts_time) in the XML frames.
-    durationStart (str): The timestamp when the bars start, initially an empty string.
-    durationEnd (str): The timestamp when the bars end, initially an empty string.
-    framesList (list): List of dictionaries storing the parsed frame data.
-    buffSize (int): The size of the frame buffer to hold frames for analysis.
+    bit_depth_10 (bool): Whether the video is 10 bit, which sets the thresholds of the bars signature.
+    durationLimit (float, optional): Seconds of the report searched for bars, bars_search_duration if None.
 
     Returns:
     tuple:
-    float: The timestamp (`durationStart`) when the bars were first detected.
-    float: The timestamp (`durationEnd`) when the bars were last detected.
-
-    Behavior:
-    - Parses the input XML file frame by frame.
-    - Each frame's timestamp (`pkt_*ts_time`) and key-value pairs are stored in a dictionary (`frameDict`).
-    - Once the buffer reaches the specified size (`buffSize`), it checks the middle frame's attributes:
-    - Color bars are detected if `YMAX > 210`, `YMIN < 10`, and `YDIF < 3.0`.
-    - Logs the start and end times of the bars and stops detection once the bars end.
-    - Clears the memory of parsed elements to avoid excessive memory usage during parsing.
+    float: The timestamp (`durationStart`) when the bars were first detected, "" if no bars were found.
+    float: The timestamp (`durationEnd`) when the bars were last detected, "" if no bars were found.
+    str: The start of the bars (HH:MM:SS.ssss), or None.
+    str: The end of the bars (HH:MM:SS.ssss), or None if they don't end within durationLimit.
 
     Example log outputs:
     - "Bars start at [timestamp] ([formatted timestamp])"
     - "Bars ended at [timestamp] ([formatted timestamp])"
     """
-    etree = load_etree()
-    if etree is None:
-        return "", "", None, None
-    
-    if bit_depth_10:
-        YMAX_thresh = 800
-        YMIN_thresh = 10
-        YDIF_thresh = 10
-    else:
-        YMAX_thresh = 210
-        YMIN_thresh = 10
-        YDIF_thresh = 3.0
+    if durationLimit is None:
+        durationLimit = bars_search_duration
+    frames = iter_report_window(startObj, 0, durationLimit, keys=bars_detection_keys)
+    if load_numpy() is None:
+        # frame by frame, without numpy
+        barsDetection = BarsDetection(pkt, bit_depth_10, durationLimit)
+        for frame_pkt, frameDict in frames:
+            barsDetection.feed(frameDict)
+            if barsDetection.done:
+                break
+        return BarsDuration(barsDetection.durationStart, barsDetection.durationEnd, barsDetection.barsStartString, barsDetection.barsEndString)
 
-    barsStartString = None
-    barsEndString = None
-
-    with gzip.open(startObj) as xml:
-        for event, elem in etree.iterparse(xml, events=('end',), tag='frame'): #iterparse the xml doc
-            if elem.attrib['media_type'] == "video": #get just the video frames
-                frame_pkt_dts_time = elem.attrib[pkt] #get the timestamps for the current frame we're looking at
-                frameDict = {}  #start an empty dict for the new frame
-                frameDict[pkt] = frame_pkt_dts_time  #give the dict the timestamp, which we have now
-                for t in list(elem):    #iterating through each attribute for each element
-                    keySplit = t.attrib['key'].split(".")   #split the names by dots 
-                    keyName = str(keySplit[-1])             #get just the last word for the key name
-                    frameDict[keyName] = t.attrib['value']	#add each attribute to the frame dictionary
-                framesList.append(frameDict)
-                middleFrame = int(round(float(len(framesList))/2))	# i hate this calculation, but it gets us the middle index of the list as an integer
-                if len(framesList) == buffSize:	# wait till the buffer is full to start detecting bars
-                ## This is where the bars detection magic actually happens
-                    # Check conditions
-                    if (float(framesList[middleFrame]['YMAX']) > YMAX_thresh and 
-                        float(framesList[middleFrame]['YMIN']) < YMIN_thresh and 
-                        float(framesList[middleFrame]['YDIF']) < YDIF_thresh):
-                        if durationStart == "":
-                            durationStart = float(framesList[middleFrame][pkt])
-                            barsStartString = dts2ts(framesList[middleFrame][pkt])
-                            logger.debug("Bars start at " + str(framesList[middleFrame][pkt]) + " (" + dts2ts(framesList[middleFrame][pkt]) + ")")							
-                        durationEnd = float(framesList[middleFrame][pkt])
-                    else:
-                        if durationStart != "" and durationEnd != "" and durationEnd - durationStart > 2:
-                            logger.debug("Bars ended at " + str(framesList[middleFrame][pkt]) + " (" + dts2ts(framesList[middleFrame][pkt]) + ")\n")
-                            barsEndString = dts2ts(framesList[middleFrame][pkt])
-                            break
-            elem.clear() # we're done with that element so let's get it outta memory
-    return durationStart, durationEnd, barsStartString, barsEndString
+    builder = ColumnsBuilder()
+    for frame_pkt, frameDict in frames:
+        builder.feed(frame_pkt, frameDict)
+    columns = builder.build()
+    if columns is None:
+        return BarsDuration("", "", None, None)
+    return detect_bars_columns(columns, bit_depth_10, durationLimit)
 
 
-def evalBars(startObj,pkt,durationStart,durationEnd,framesList,buffSize):
+def evalBars(startObj,pkt,durationStart,durationEnd):
     """
     Find maximum or minimum values for specific QCTools keys inside the duration of the color bars. 
 
+    Only the frames inside the bars are read (see qctools_report.iter_report_window),
+    and evaluate_bars_columns reduces each tag's column to its maximum or minimum.
+
     Parameters:
+        startObj (str): Path to the QCTools report file (.qctools.xml.gz)
         pkt (str): The attribute key used to extract timestamps from <frame> tag in qctools.xml.gz.
         durationStart (float): Initial timestamp marking the potential start of detected bars.
         durationEnd (float): Timestamp marking the end of detected bars.
-        framesList (list): List of frameDict dictionaries
 
     Returns:
         maxBarsDict (dict): Returns dictionary of max or min value of corresponding QCTools keys
     """
-    
-    etree = load_etree()
-    if etree is None:
+    frames = iter_report_window(startObj, durationStart, durationEnd, keys=bars_evaluation_keys)
+    if load_numpy() is None:
+        return evalBarsFrames((frameDict for frame_pkt, frameDict in frames), pkt, durationStart, durationEnd)
+
+    builder = ColumnsBuilder()
+    for frame_pkt, frameDict in frames:
+        builder.feed(frame_pkt, frameDict)
+    columns = builder.build()
+    if columns is None:
         return None
-    
-    # Define the keys for which you want to calculate the average
-    keys_to_check = ['YMAX', 'YMIN', 'UMIN', 'UMAX', 'VMIN', 'VMAX', 'SATMAX', 'SATMIN']
-    # Initialize a dictionary to store the highest values for each key
-    maxBarsDict = {}
-    # adds the list keys_to_check as keys to a dictionary
-    for key_being_checked in keys_to_check:
-        # assign 'dummy' threshold to be overwritten
-        if "MAX" in key_being_checked:
-            maxBarsDict[key_being_checked] = 0
-        elif "MIN" in key_being_checked:
-            maxBarsDict[key_being_checked] = 1023
-	
-    with gzip.open(startObj) as xml:
-        for event, elem in etree.iterparse(xml, events=('end',), tag='frame'): # iterparse the xml doc
-            if elem.attrib['media_type'] == "video": # get just the video frames
-                frame_pkt_dts_time = elem.attrib[pkt] # get the timestamps for the current frame we're looking at
-                if frame_pkt_dts_time >= str(durationStart): 	# only work on frames that are after the start time   # only work on frames that are after the start time
-                    if float(frame_pkt_dts_time) > durationEnd:        # only work on frames that are before the end time
-                        break
-                    frameDict = {}  # start an empty dict for the new frame
-                    frameDict[pkt] = frame_pkt_dts_time  # give the dict the timestamp, which we have now
-                    for t in list(elem):    # iterating through each attribute for each element
-                        keySplit = t.attrib['key'].split(".")   # split the names by dots 
-                        keyName = str(keySplit[-1])             # get just the last word for the key name
-                        frameDict[keyName] = t.attrib['value']	# add each attribute to the frame dictionary
-                    framesList.append(frameDict)
-                    if len(framesList) == buffSize:	# wait till the buffer is full to start detecting bars
-                        ## This is where the bars detection magic actually happens
-                        for colorbar_key in keys_to_check:
-                            if colorbar_key in frameDict:
-                                if "MAX" in colorbar_key:
-                                    # Convert the value to float and compare it with the current highest value
-                                    value = float(frameDict[colorbar_key])
-                                    if value > maxBarsDict[colorbar_key]:
-                                        maxBarsDict[colorbar_key] = value
-                                elif "MIN" in colorbar_key:
-                                    # Convert the value to float and compare it with the current highest value
-                                    value = float(frameDict[colorbar_key])
-                                    if value < maxBarsDict[colorbar_key]:
-                                        maxBarsDict[colorbar_key] = value
-                                # Convert highest values to integer
-                                maxBarsDict = {colorbar_key: int(value) for colorbar_key, value in maxBarsDict.items()}
-							
-    return maxBarsDict
-
-
-def find_common_durations(content_over):
-    """
-    Identifies common durations across different content tags.
-
-    Extracts tags and their associated durations from content_over dictionary, and uses set
-    intersection to find durations that are common across all tags.
-
-    Parameters:
-        content_over (dict): A dictionary with tags as keys and sets of durations (strings) as values.
-
-    Returns:
-        set: A set containing durations that are common across all provided tags.
-    """
-
-    # Extract all tags and their durations into a dictionary of sets
-    tag_durations = {tag: set(durations) for tag, durations in content_over.items()}
+    return evaluate_bars_columns(columns, durationStart, durationEnd)
 
-    # Use set intersection to find common durations across all tags
-    common_durations = set.intersection(*tag_durations.values())
-    return common_durations
 
-
-def print_consecutive_durations(durations,qctools_check_output,contentFilter_name,video_path,qct_parse,startObj,thumbPath):
+class ContentFilterDetection:
     """
-    Intended to be used with detectContentFilter and find_common_durations
-    
-    Writes the start and end times of consecutive segments to a file and logs them.
+    Finds the segments of a report where every condition of a content filter is met, one frame at a time.
 
-    This function takes a list of durations (each a string in 'HH:MM:SS' format), sorts them,
-    and identifies consecutive segments where the time difference between segments is less than 5 seconds.
-    These segments are then written to a specified output file.
+    Matching frames less than 5 seconds apart are merged into one segment. Only the segment being built
+    is kept, each segment is written to qctools_check_output (and a thumbnail exported) as soon as it ends.
+    Call finish() after the last frame.
 
     Parameters:
-        durations (list of str): A list of time durations in 'HH:MM:SS' format.
-        qctools_check_output (str): The file path where the output should be written.
-        contentFilter_name (str): The name of the content filter used to determine the thresholds.
-        video_path (str): Path to the video file.
-        qct_parse (dict): qct-parse dictionary from command_config.yaml 
+        pkt (str): The attribute key used to extract timestamps from <frame> tag in qctools.xml.gz.
+        contentFilter_name (str): The name of the content filter configuration to apply.
+        contentFilter_rules (ThresholdRules): The content filter, compiled by compile_content_filter
+        qctools_check_output (str): The file path where segments meeting the content filter criteria are written.
+        qct_parse (dict): qct-parse dictionary from checks_config
         thumbPath (str): Path where thumbnails are saved.
-
-    Returns:
-        None
+        video_path (str): Path to the video file.
+        startObj (str): Path to the QCTools report file (.qctools.xml.gz)
     """
 
-    logger.info(f"Segments found within thresholds of content filter {contentFilter_name}:")
-
-    sorted_durations = sorted(durations, key=lambda x: list(map(float, x.split(':'))))
-
-    start_time = None
-    end_time = None
-    thumbDelay = 0
-
-    with open(qctools_check_output, 'w') as f:
-        f.write("qct-parse content detection summary:\n")
-        f.write(f"Segments found within thresholds of content filter {contentFilter_name}:\n")
-
-        for i in range(len(sorted_durations)):
-            if start_time is None:
-                start_time = sorted_durations[i]
-                end_time = sorted_durations[i]
-            else:
-                current_time = sorted_durations[i]
-                previous_time = sorted_durations[i - 1]
-
-                current_seconds = sum(x * float(t) for x, t in zip([3600, 60, 1], current_time.split(':')))
-                previous_seconds = sum(x * float(t) for x, t in zip([3600, 60, 1], previous_time.split(':')))
+    def __init__(self, pkt, contentFilter_name, contentFilter_rules, qctools_check_output, qct_parse, thumbPath, video_path, startObj):
+        self.pkt = pkt
+        self.contentFilter_name = contentFilter_name
+        self.qctools_check_output = qctools_check_output
+        self.qct_parse = qct_parse
+        self.thumbPath = thumbPath
+        self.video_path = video_path
+        self.startObj = startObj
+        self.rules = contentFilter_rules
+        self.start_time = None
+        self.end_time = None
+        self.end_seconds = None
+        self.output = None
+        self.done = False   # every frame of the report has to be checked
+
+    def feed(self, frameDict):
+        if not self.rules.all_met(frameDict):
+            return
+        timeStampString = dts2ts(frameDict[self.pkt])
+        seconds = sum(x * float(t) for x, t in zip([3600, 60, 1], timeStampString.split(':')))
+        if self.start_time is None:
+            logger.info(f"Segments found within thresholds of content filter {self.contentFilter_name}:")
+            self.output = open(self.qctools_check_output, 'w')
+            self.output.write("qct-parse content detection summary:\n")
+            self.output.write(f"Segments found within thresholds of content filter {self.contentFilter_name}:\n")
+            self.start_time = timeStampString
+        elif seconds - self.end_seconds >= 5:
+            self.write_segment()
+            self.start_time = timeStampString
+        self.end_time = timeStampString
+        self.end_seconds = seconds
+
+    def write_segment(self):
+        if self.start_time != self.end_time:
+            logger.info(f"{self.start_time} - {self.end_time}")
+            self.output.write(f"{self.start_time} - {self.end_time}\n")
+        else:
+            logger.info(self.start_time)
+            self.output.write(f"{self.start_time}\n")
+        if self.qct_parse['thumbExport']:
+            printThumb(self.video_path, "thumbnail", self.contentFilter_name, self.startObj, self.thumbPath, "output", self.start_time)
+
+    def finish(self):
+        if self.start_time is None:
+            logger.error(f"No segments found matching content filter: {self.contentFilter_name}\n")
+            return
+        self.write_segment()
+        logger.debug(f"")
+        self.close()
 
-                if current_seconds - previous_seconds < 5:
-                    end_time = current_time
-                else:
-                    if start_time != end_time:
-                        logger.info(f"{start_time} - {end_time}")
-                        f.write(f"{start_time} - {end_time}\n")
-                    else:
-                        logger.info(start_time)
-                        f.write(f"{start_time}\n")
-                    if qct_parse['thumbExport']:
-                        printThumb(video_path, "thumbnail", contentFilter_name, startObj, thumbPath, "output", start_time)
-                    start_time = current_time
-                    end_time = current_time
-
-        # Print the last range or single time
-        if start_time and end_time:
-            if start_time != end_time:
-                logger.info(f"{start_time} - {end_time}")
-                f.write(f"{start_time} - {end_time}\n")
-            else:
-                logger.info(start_time)
-                f.write(f"{start_time}\n")
-            logger.debug(f"")
-            if qct_parse['thumbExport']:
-                printThumb(video_path, "thumbnail", contentFilter_name, startObj, thumbPath, "output", start_time)
+    def close(self):
+        if self.output is not None:
+            self.output.close()
+            self.output = None
 
 
-# Modified version of detectBars for finding segments that meet all thresholds instead of any thresholds (like analyze does)
-def detectContentFilter(startObj, pkt, contentFilter_name, contentFilter_dict, qctools_check_output, framesList, qct_parse, thumbPath, video_path):
+def detectContentFilter(startObj, pkt, contentFilter_name, contentFilter_rules, qctools_check_output, qct_parse, thumbPath, video_path):
     """
-    Checks values against thresholds of multiple values
+    Checks every frame of the report against all thresholds of a content filter, and writes the matching segments.
 
     Parameters:
         startObj (qctools.xml.gz): A gzip-compressed XML file containing frame attributes.
         pkt (str): The attribute key used to extract timestamps from <frame> tag in qctools.xml.gz.
         contentFilter_name (str): The name of the content filter configuration to apply.
-        contentFilter_dict (dict): Dictionary of content filter values from qct-parse[content] section of config.yaml 
+        contentFilter_rules (ThresholdRules): The content filter, compiled by compile_content_filter
         qctools_check_output (str): The file path where segments meeting the content filter criteria are written.
-        framesList: List of frameDict dictionaries
         qct_parse (dict): qct-parse dictionary from command_config.yaml 
         thumbPath (str): Path where thumbnails are saved.
         video_path (str): Path to the video file.
     """
-    
-    content_over = {tag: [] for tag in contentFilter_dict}
-
-    for frameDict in framesList:
-        for tag, config_value in contentFilter_dict.items():
-            tag_threshold, op_string = config_value.split(", ")
-            thresh = float(tag_threshold)
-            comp_op = operator_mapping[op_string]
-            if tag in frameDict and comp_op(float(frameDict[tag]), thresh):
-                content_over[tag].append(dts2ts(frameDict[pkt]))
-
-    common_durations = find_common_durations(content_over)
-    if common_durations:
-        print_consecutive_durations(common_durations, qctools_check_output, contentFilter_name, video_path, qct_parse, startObj, thumbPath)
-    else:
-        logger.error(f"No segments found matching content filter: {contentFilter_name}\n")
-
+    detection = ContentFilterDetection(pkt, contentFilter_name, contentFilter_rules, qctools_check_output, qct_parse, thumbPath, video_path, startObj)
+    for frame_pkt, frameDict in iter_report_frames(startObj, keys=contentFilter_rules.keys):
+        detection.feed(frameDict)
+    detection.finish()
 
-def getCompFromConfig(qct_parse, profile, tag):
-   """
-   Determines the comparison operator based on profile and tag.
 
-    Args:
-        qct_parse (dict): qct-parse configuration.
-        profile (dict): Profile data.
-        tag (str): Tag to check.
-
-    Returns:
-        callable: Comparison operator (e.g., operator.lt, operator.gt).
-   """
-   smpte_color_bars_keys = asdict(spex_config.qct_parse_values.smpte_color_bars).keys()
-
-   if qct_parse['profile']:
-       template = qct_parse['profile'][0]
-       if hasattr(spex_config.qct_parse_values.profiles, template):
-           profile_keys = asdict(getattr(spex_config.qct_parse_values.profiles, template)).keys()
-           if set(profile) == set(profile_keys):
-               return operator.lt if "MIN" in tag or "LOW" in tag else operator.gt
-
-   if set(profile) == set(smpte_color_bars_keys):
-       return operator.lt if "MIN" in tag else operator.gt
-
-   raise ValueError(f"No matching comparison operator found for profile and tag: {profile}, {tag}")
-
-
-def analyzeIt(qct_parse, video_path, profile, profile_name, startObj, pkt, durationStart, durationEnd, thumbPath, thumbDelay, thumbExportDelay, framesList, frameCount=0, overallFrameFail=0, adhoc_tag=False, check_cancelled=None):
+def analyzeIt(qct_parse, video_path, profile, profile_name, startObj, pkt, durationStart, durationEnd, thumbPath, thumbDelay, thumbExportDelay, framesList, frameCount=0, overallFrameFail=0, rules=None, check_cancelled=None, keys=None, failures=None):
     """
     Analyzes video frames from the QCTools report to detect threshold exceedances for specified tags or profiles and logs frame failures.
 
@@ -500,12 +627,16 @@ def analyzeIt(qct_parse, video_path, profile, profile_name, startObj, pkt, durat
         framesList (list): A circular buffer to hold dictionaries of parsed frame attributes.
         frameCount (int, optional): The total number of frames analyzed (defaults to 0).
         overallFrameFail (int, optional): A count of how many frames failed threshold checks across all tags (defaults to 0).
+        rules (ThresholdRules, optional): The compiled thresholds to check, compile_profile(profile) if None.
+        keys (iterable, optional): QCTools keys to parse (see get_needed_keys), all keys if None.
+        failures (FailureStore, optional): Where failures are stored, kept in memory if None.
 
     Returns:
         tuple: 
             - kbeyond (dict): A dictionary where each tag is associated with a count of how many times its threshold was exceeded.
             - frameCount (int): The total number of frames analyzed.
             - overallFrameFail (int): The total number of frames that exceeded thresholds across all tags.
+            - failureInfo (FailureStore): The failures.
 
     Behavior:
         - Iteratively parses the input XML file and analyzes frames after `durationStart` and before `durationEnd`.
@@ -518,16 +649,19 @@ def analyzeIt(qct_parse, video_path, profile, profile_name, startObj, pkt, durat
         - Analyzing frames using a single tag threshold: `analyzeIt(args, {}, startObj, pkt, durationStart, durationEnd, thumbPath, thumbDelay, framesList)`
         - Analyzing frames using a profile: `analyzeIt(args, profile, startObj, pkt, durationStart, durationEnd, thumbPath, thumbDelay, framesList)`
     """
+    failureInfo = FailureStore() if failures is None else failures  # store failure information
     etree = load_etree()
     if etree is None:
-        return {}, 0, 0, {}
+        return {}, 0, 0, failureInfo
     
     kbeyond = {} # init a dict for each key which we'll use to track how often a given key is over
     fots = "" # init frame over threshold to avoid counting the same frame more than once in the overallFrameFail count
-    failureInfo = {}  # Initialize a new dictionary to store failure information
-    for k,v in profile.items(): 
-        kbeyond[k] = 0
-    with gzip.open(startObj) as xml:	
+    if rules is None:
+        rules = compile_profile(profile)
+    for rule in rules: 
+        kbeyond[rule.tag] = 0
+    parser = FrameParser(pkt, keys=keys)
+    with open_report(startObj) as xml:	
         for event, elem in etree.iterparse(xml, events=('end',), tag='frame'): #iterparse the xml doc
             if elem.attrib['media_type'] == "video": 	#get just the video frames
                 frameCount = frameCount + 1
@@ -539,28 +673,19 @@ def analyzeIt(qct_parse, video_path, profile, profile_name, startObj, pkt, durat
                         if float(frame_pkt_dts_time) > durationEnd:		#only work on frames that are before the end time
                             print("started at " + str(durationStart) + " seconds and stopped at " + str(frame_pkt_dts_time) + " seconds (" + dts2ts(frame_pkt_dts_time) + ") or " + str(frameCount) + " frames!")
                             break
-                    frameDict = {}  								#start an empty dict for the new frame
-                    frameDict[pkt] = frame_pkt_dts_time  			#make a key for the timestamp, which we have now
-                    for t in list(elem):    						#iterating through each attribute for each element
-                        keySplit = t.attrib['key'].split(".")   	#split the names by dots 
-                        keyName = str(keySplit[-1])             	#get just the last word for the key name
-                        if len(keyName) == 1:						#if it's psnr or mse, keyName is gonna be a single char
-                            keyName = '.'.join(keySplit[-2:])		#full attribute made by combining last 2 parts of split with a period in btw
-                        frameDict[keyName] = t.attrib['value']		#add each attribute to the frame dictionary
+                    frameDict = parser(elem)  						#make a dict of the frame's timestamp and tag values
                     framesList.append(frameDict)					#add this dict to our circular buffer
                     # Now we can parse the frame data from the buffer!	
-                    for k,v in profile.items():
-                        tag = k
-                        over = float(v)
+                    for rule in rules:
                         # ACTUALLY DO THE THING ONCE FOR EACH TAG
-                        frameOver, thumbDelay, failureInfo = threshFinder(qct_parse, video_path, framesList[-1], startObj, pkt, tag, over, thumbPath, thumbDelay, thumbExportDelay, profile_name, failureInfo, adhoc_tag)
+                        frameOver, thumbDelay, failureInfo = threshFinder(qct_parse, video_path, framesList[-1], startObj, pkt, rule, thumbPath, thumbDelay, thumbExportDelay, profile_name, failureInfo, frameCount)
                         if frameOver is True:
-                            kbeyond[k] = kbeyond[k] + 1 # note the over in the key over dict
+                            kbeyond[rule.tag] = kbeyond[rule.tag] + 1 # note the over in the key over dict
                             if not frame_pkt_dts_time in fots: # make sure that we only count each over frame once
                                 overallFrameFail = overallFrameFail + 1
                                 fots = frame_pkt_dts_time # set it again so we don't dupe
                     thumbDelay = thumbDelay + 1				
-            elem.clear() #we're done with that element so let's get it outta memory
+            release_frame(elem) #we're done with that element so let's get it outta memory
 
     return kbeyond, frameCount, overallFrameFail, failureInfo
 
@@ -592,15 +717,17 @@ def print_color_bar_values(video_id, smpte_color_bars, maxBarsDict, colorbars_va
             writer.writerow([key, smpte_value, maxbars_value])
 
 
-def printresults(profile, kbeyond, frameCount, overallFrameFail, qctools_check_output):
+def printresults(profile, kbeyond, frameCount, overallFrameFail, qctools_check_output, adhoc_tag=False):
     """
     Writes the analyzeIt results into a summary file, detailing the count and percentage of frames that exceeded the thresholds.
 
     Parameters:
+        profile (dict): The tags and thresholds that were checked.
         kbeyond (dict): Dictionary mapping tags to the count of frames exceeding the thresholds.
         frameCount (int): Total number of frames analyzed.
         overallFrameFail (int): Total number of frames with at least one threshold exceedance.
         qctools_check_output (str): File path to write the output summary.
+        adhoc_tag (bool): True for the results of the tag check (the tagname setting).
 
     Returns:
         None
@@ -625,7 +752,7 @@ def printresults(profile, kbeyond, frameCount, overallFrameFail, qctools_check_o
 
         writer.writerow(["**************************"])
 
-        if profile == fullTagList:
+        if adhoc_tag:
             writer.writerow(["qct-parse evaluation of user specified tags summary"])
         elif set(profile.keys()) == set(color_bar_keys):
             writer.writerow(["qct-parse color bars evaluation summary"])
@@ -797,69 +924,185 @@ def archiveThumbs(thumbPath):
         return None
 
 
+def failure_segments_path(failure_csv_path):
+    """Path of the failure segments CSV written next to a failures CSV (qct-parse_tags_failures.csv -> qct-parse_tags_failure_segments.csv)."""
+    directory, file_name = os.path.split(failure_csv_path)
+    if "_failures" in file_name:
+        return os.path.join(directory, file_name.replace("_failures", "_failure_segments", 1))
+    root, ext = os.path.splitext(file_name)
+    return os.path.join(directory, f"{root}_segments{ext}")
+
+
+class FailureStore:
+    """
+    Compact store of the failures of a threshold check.
+
+    Instead of a dict per failure, each failure is kept as its frame's timestamp in seconds, the index of its
+    tag in tags, the tag value and the threshold, in parallel arrays. With a csv_path, the failures are
+    appended to that CSV every flush_size failures, so memory use doesn't grow with the number of failures.
+    Without one they are all kept until save_failures_to_csv writes them.
+
+    Failures of a tag in consecutive frames are also merged into segments, written to the failure segments
+    CSV (see failure_segments_path) with the start, end, number of frames and peak failure of each segment.
+
+    Parameters:
+        csv_path (str, optional): Path of the failures CSV. It is only created once there is a failure.
+        flush_size (int): Number of failures kept in memory before they are written to csv_path.
+    """
+
+    # the columns generate_report.summarize_failures reads
+    fieldnames = ['Timestamp', 'Tag', 'Tag Value', 'Threshold']
+    segment_fieldnames = ['Start', 'End', 'Tag', 'Frame Count', 'Peak Timestamp', 'Peak Value', 'Threshold', 'Peak Deviation']
+
+    def __init__(self, csv_path=None, flush_size=65536):
+        self.csv_path = csv_path
+        self.flush_size = flush_size
+        self.tags = []
+        self.tag_ids = {}
+        self.seconds = array('d')
+        self.tag_index = array('I')
+        self.values = array('d')
+        self.thresholds = array('d')
+        self.flushed = 0
+        self.output = None
+        # the segment each tag id is in: [start, end, last frame, frame count, peak timestamp, peak value, threshold, peak deviation]
+        self.open_segments = {}
+        self.segments = []   # ended segments that haven't been written yet
+        self.segments_output = None
+
+    def __len__(self):
+        return self.flushed + len(self.seconds)
+
+    def tag_id(self, tag):
+        """Returns the index of tag in tags, adding it if it is new."""
+        if tag not in self.tag_ids:
+            self.tag_ids[tag] = len(self.tags)
+            self.tags.append(tag)
+        return self.tag_ids[tag]
+
+    def add(self, frame_pkt_dts_time, tag, tagValue, over, frame):
+        """
+        Stores one failure: the frame's timestamp (seconds, as a number or string), tag, tag value, threshold
+        and the number of the frame in the report.
+        """
+        seconds = float(frame_pkt_dts_time)
+        tag_id = self.tag_id(tag)
+        self.seconds.append(seconds)
+        self.tag_index.append(tag_id)
+        self.values.append(tagValue)
+        self.thresholds.append(over)
+        self.add_to_segment(seconds, tag_id, tagValue, over, frame)
+        if self.csv_path is not None and len(self.seconds) >= self.flush_size:
+            self.flush()
+
+    def extend(self, seconds, tag_ids, values, thresholds, frames):
+        """Stores failures from lists of timestamps (seconds), tag ids (see tag_id), tag values, thresholds and frame numbers."""
+        self.seconds.extend(seconds)
+        self.tag_index.extend(tag_ids)
+        self.values.extend(values)
+        self.thresholds.extend(thresholds)
+        for failure in zip(seconds, tag_ids, values, thresholds, frames):
+            self.add_to_segment(*failure)
+        if self.csv_path is not None and len(self.seconds) >= self.flush_size:
+            self.flush()
+
+    def add_to_segment(self, seconds, tag_id, tagValue, over, frame):
+        # a failure in the frame right after the tag's segment extends it, any other starts a new segment
+        deviation = abs(tagValue - over)
+        segment = self.open_segments.get(tag_id)
+        if segment is not None and frame == segment[2] + 1:
+            segment[1] = seconds
+            segment[2] = frame
+            segment[3] = segment[3] + 1
+            if deviation > segment[7]:
+                segment[4], segment[5], segment[7] = seconds, float(tagValue), deviation
+            return
+        if segment is not None:
+            self.segments.append((tag_id, segment))
+        self.open_segments[tag_id] = [seconds, seconds, frame, 1, seconds, float(tagValue), float(over), deviation]
+
+    def rows(self):
+        """Yields the failures that haven't been written to the CSV yet, as (Timestamp, Tag, Tag Value, Threshold) rows."""
+        last_seconds = None
+        for seconds, tag_id, tagValue, over in zip(self.seconds, self.tag_index, self.values, self.thresholds):
+            if seconds != last_seconds:  # the failures of a frame share its timestamp
+                timeStampString = dts2ts(seconds)
+                last_seconds = seconds
+            yield timeStampString, self.tags[tag_id], tagValue, over
+
+    def segment_rows(self):
+        """Yields the ended segments that haven't been written to the segments CSV yet, as rows of segment_fieldnames."""
+        for tag_id, (start, end, last_frame, frame_count, peak_seconds, peak_value, over, deviation) in self.segments:
+            yield dts2ts(start), dts2ts(end), self.tags[tag_id], frame_count, dts2ts(peak_seconds), peak_value, over, round(deviation, 6)
+
+    def flush(self):
+        """Appends the failures and ended segments in memory to their CSVs, writing the headers first."""
+        if self.seconds:
+            if self.output is None:
+                self.output = open(self.csv_path, 'w', newline='')
+                csv.writer(self.output).writerow(self.fieldnames)
+            csv.writer(self.output).writerows(self.rows())
+            self.flushed = self.flushed + len(self.seconds)
+            for column in (self.seconds, self.tag_index, self.values, self.thresholds):
+                del column[:]
+        if self.segments:
+            if self.segments_output is None:
+                self.segments_output = open(failure_segments_path(self.csv_path), 'w', newline='')
+                csv.writer(self.segments_output).writerow(self.segment_fieldnames)
+            csv.writer(self.segments_output).writerows(self.segment_rows())
+            self.segments = []
+
+    def close(self):
+        """Ends the open segments, writes everything left to the CSVs and closes them."""
+        self.segments.extend(sorted(self.open_segments.items(), key=lambda item: item[1][0]))
+        self.open_segments = {}
+        if self.csv_path is not None:
+            self.flush()
+        for output in (self.output, self.segments_output):
+            if output is not None:
+                output.close()
+        self.output = None
+        self.segments_output = None
+
+    def discard(self):
+        """Drops the failures and removes the CSVs, if they have been written (e.g. when the analysis is cancelled)."""
+        for output in (self.output, self.segments_output):
+            if output is not None:
+                output.close()
+                os.remove(output.name)
+        self.output = None
+        self.segments_output = None
+        self.flushed = 0
+        self.open_segments = {}
+        self.segments = []
+        for column in (self.seconds, self.tag_index, self.values, self.thresholds):
+            del column[:]
+
+
 def save_failures_to_csv(failureInfo, failure_csv_path):
-    """Saves the failure information to a CSV file.
+    """Saves the failure information to a CSV file, and its failure segments next to it (see failure_segments_path).
 
     Args:
-        failureInfo (dict): A dictionary where keys are timestamps and values are lists of failure details.
-        failure_csv_path (str, optional): The path to the CSV file. Defaults to 'failures.csv'.
-    """
-    with open(failure_csv_path, 'w', newline='') as csvfile:
-        fieldnames = ['Timestamp', 'Tag', 'Tag Value', 'Threshold']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for timestamp, info_list in failureInfo.items():
-            for info in info_list:
-                writer.writerow({'Timestamp': timestamp, 'Tag': info['tag'], 'Tag Value': info['tagValue'], 'Threshold': info['over']})
-
-def extract_report_mkv(startObj, qctools_output_path):
-    etree = load_etree()
-    if etree is None:
-        return None
-    
-    report_file_output = qctools_output_path.replace(".qctools.mkv", ".qctools.xml.gz")
-
-    # If previous report exists, remove it
-    if os.path.isfile(report_file_output):
-        os.remove(report_file_output)
-
-    # Run ffmpeg command to extract xml.gz report
-    full_command = [
-        'ffmpeg', 
-        '-hide_banner', 
-        '-loglevel', 'panic', 
-        '-dump_attachment:t:0', report_file_output, 
-        '-i', qctools_output_path
-    ]
-    logger.info(f'Extracting qctools.xml.gz report from {os.path.basename(qctools_output_path)}\n')
-    logger.debug(f'Running command: {" ".join(full_command)}\n')
-    subprocess.run(full_command)
-
-    if os.path.isfile(report_file_output):
-        startObj = report_file_output
-    else:
-        logger.critical(f'Unable to extract XML from QCTools mkv report file\n')
-        startObj = None
-    
-    return startObj
-    
+        failureInfo (FailureStore): The failures of a threshold check. If they are already being written to
+            a CSV, the rest of them are written to it.
+        failure_csv_path (str): The path to the CSV file, if failureInfo doesn't have one.
+    """
+    if failureInfo.csv_path is None:
+        failureInfo.csv_path = failure_csv_path
+    failureInfo.close()
+
 
-def detectBitdepth(startObj,pkt,framesList,buffSize):
+def detectBitdepth(startObj,pkt,framesList,buffSize,keys=None):
     etree = load_etree()
     if etree is None:
         return False
 
     bit_depth_10 = False
-    with gzip.open(startObj) as xml:
+    parser = FrameParser(pkt, keys=keys)
+    with open_report(startObj) as xml:
         for event, elem in etree.iterparse(xml, events=('end',), tag='frame'): # iterparse the xml doc
             if elem.attrib['media_type'] == "video": # get just the video frames
-                frame_pkt_dts_time = elem.attrib[pkt] # get the timestamps for the current frame we're looking at
-                frameDict = {}  # start an empty dict for the new frame
-                frameDict[pkt] = frame_pkt_dts_time  # give the dict the timestamp, which we have now
-                for t in list(elem):    # iterating through each attribute for each element
-                    keySplit = t.attrib['key'].split(".")   # split the names by dots 
-                    keyName = str(keySplit[-1])             # get just the last word for the key name
-                    frameDict[keyName] = t.attrib['value']	# add each attribute to the frame dictionary
+                frameDict = parser(elem) # make a dict of the frame's timestamp and tag values
                 framesList.append(frameDict)
                 middleFrame = int(round(float(len(framesList))/2))	# i hate this calculation, but it gets us the middle index of the list as an integer
                 if len(framesList) == buffSize:	# wait till the buffer is full to start detecting bars
@@ -868,12 +1111,678 @@ def detectBitdepth(startObj,pkt,framesList,buffSize):
                     if float(framesList[middleFrame]['YMAX']) > 250:
                         bit_depth_10 = True
                         break
-            elem.clear() # we're done with that element so let's get it outta memory
+            release_frame(elem) # we're done with that element so let's get it outta memory
 
     return bit_depth_10
 
 
-def run_qctparse(video_path, qctools_output_path, report_directory, check_cancelled=None):
+######## Single-pass analysis engine ########
+
+# QCTools keys read by detectBars and evalBars
+bars_detection_keys = ['YMAX', 'YMIN', 'YDIF']
+bars_evaluation_keys = ['YMAX', 'YMIN', 'UMIN', 'UMAX', 'VMIN', 'VMAX', 'SATMAX', 'SATMIN']
+
+# Color bars are at the head of the tape, only this many seconds of the report are searched for them
+bars_search_duration = 600
+
+# Bars start at the first of this many consecutive frames with the bars signature, so an isolated frame
+# that happens to have it doesn't start them. The same window as the frame buffer detectBars used to check.
+bars_start_frames = 11
+
+# Result of bars detection, the same attributes as BarsDetection
+BarsDuration = collections.namedtuple('BarsDuration', ['durationStart', 'durationEnd', 'barsStartString', 'barsEndString'])
+
+
+def bars_thresholds(bit_depth_10):
+    """Thresholds of the bars signature: (YMAX, YMIN, YDIF). Bars have YMAX over, and YMIN and YDIF under them."""
+    if bit_depth_10:
+        return 800, 10, 10
+    return 210, 10, 3.0
+
+
+def get_needed_keys(qct_parse, threshold_checks=True, checks=None, bars_checks=True):
+    """
+    Works out which QCTools keys the enabled qct-parse checks read, so the parser can skip every other <tag>.
+
+    Parameters:
+        qct_parse (dict): qct-parse dictionary from checks_config
+        threshold_checks (bool): Include the keys of the profile and tag checks, and of the tag statistics.
+            Without them, only the keys of the frame by frame checks (bit depth, content filters, bars) are returned.
+        checks (CompiledChecks, optional): The checks compiled from qct_parse, compiled here if None.
+        bars_checks (bool): Include the keys of bars detection and evaluation.
+
+    Returns:
+        set: QCTools key names, as used in frameDicts.
+    """
+    qct_parse_values = spex_config.qct_parse_values
+    if checks is None:
+        checks = CompiledChecks(qct_parse)
+    keys = {'YMAX'}  # bit depth detection
+    if threshold_checks:
+        for profile_check in checks.profiles.values():
+            keys.update(profile_check.rules.keys)
+        keys.update(checks.tag_rules.keys)
+        keys.update(key for tag, key in checks.statistics_tags)
+    for rules in checks.content_filters.values():
+        keys.update(rules.keys)
+    if bars_checks and qct_parse['barsDetection']:
+        keys.update(bars_detection_keys)
+        if qct_parse['evaluateBars']:
+            keys.update(bars_evaluation_keys)
+            keys.update(asdict(qct_parse_values.smpte_color_bars))
+    return keys
+
+
+class FrameBuffer:
+    """
+    Compact store of selected tag values for every frame seen so far.
+
+    Analyses that depend on the result of an earlier analysis (bars detection needs the bit depth,
+    bars evaluation needs the bars duration) can't start on the first frame of a single pass.
+    The buffer keeps just the values they need so those frames can be replayed to them once they start.
+    Values are stored as floats, which is all the analyses ever read them as.
+    """
+
+    def __init__(self, pkt, keys):
+        self.pkt = pkt
+        self.timestamps = []
+        self.columns = {key: array('d') for key in keys}
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def append(self, frameDict):
+        self.timestamps.append(frameDict[self.pkt])
+        for key, column in self.columns.items():
+            value = frameDict.get(key)
+            column.append(float(value) if value is not None else math.nan)
+
+    def replay(self):
+        """Yields the buffered frames as frameDicts, in the order they were appended."""
+        for i, frame_pkt_dts_time in enumerate(self.timestamps):
+            frameDict = {self.pkt: frame_pkt_dts_time}
+            for key, column in self.columns.items():
+                if not math.isnan(column[i]):
+                    frameDict[key] = column[i]
+            yield frameDict
+
+
+class BitdepthDetection:
+    """Frame by frame equivalent of detectBitdepth."""
+
+    def __init__(self, buffSize):
+        self.buffSize = buffSize
+        self.framesList = collections.deque(maxlen=buffSize)
+        self.bit_depth_10 = False
+        self.done = False
+
+    def feed(self, frameDict):
+        self.framesList.append(frameDict)
+        if len(self.framesList) == self.buffSize:
+            middleFrame = int(round(float(len(self.framesList))/2))
+            if float(self.framesList[middleFrame]['YMAX']) > 250:
+                self.bit_depth_10 = True
+                self.done = True
+
+
+class BarsDetection:
+    """
+    Frame by frame equivalent of detect_bars_columns, for when the report can't be read into columns.
+
+    Each frame is checked as it is fed. Bars start at the first of bars_start_frames consecutive frames with the bars
+    signature, and end at the first frame without it once they have lasted more than 2 seconds. Frames after
+    durationLimit seconds are not checked.
+    """
+
+    def __init__(self, pkt, bit_depth_10, durationLimit=None):
+        self.pkt = pkt
+        self.YMAX_thresh, self.YMIN_thresh, self.YDIF_thresh = bars_thresholds(bit_depth_10)
+        self.durationLimit = bars_search_duration if durationLimit is None else durationLimit
+        self.durationStart = ""
+        self.durationEnd = ""
+        self.barsStartString = None
+        self.barsEndString = None
+        self.done = False
+        # timestamps of the consecutive frames with the bars signature, before the bars start
+        self.run = []
+
+    def feed(self, frameDict):
+        if float(frameDict[self.pkt]) > self.durationLimit:
+            self.done = True
+            return
+        if (float(frameDict['YMAX']) > self.YMAX_thresh and
+            float(frameDict['YMIN']) < self.YMIN_thresh and
+            float(frameDict['YDIF']) < self.YDIF_thresh):
+            if self.durationStart == "":
+                self.run.append(frameDict[self.pkt])
+                if len(self.run) < bars_start_frames:
+                    return
+                self.durationStart = float(self.run[0])
+                self.barsStartString = dts2ts(self.run[0])
+                logger.debug("Bars start at " + str(self.run[0]) + " (" + dts2ts(self.run[0]) + ")")
+            self.durationEnd = float(frameDict[self.pkt])
+        else:
+            self.run = []
+            if self.durationStart != "" and self.durationEnd != "" and self.durationEnd - self.durationStart > 2:
+                logger.debug("Bars ended at " + str(frameDict[self.pkt]) + " (" + dts2ts(frameDict[self.pkt]) + ")\n")
+                self.barsEndString = dts2ts(frameDict[self.pkt])
+                self.done = True
+
+
+def evalBarsFrames(frames, pkt, durationStart, durationEnd):
+    """
+    Frame by frame equivalent of evaluate_bars_columns, for frameDicts that have already been parsed.
+
+    Parameters:
+        frames (iterable): frameDict dictionaries, in report order.
+        pkt (str): The attribute key used to extract timestamps from <frame> tag in qctools.xml.gz.
+        durationStart (float): Timestamp marking the start of detected bars.
+        durationEnd (float): Timestamp marking the end of detected bars.
+
+    Returns:
+        maxBarsDict (dict): Returns dictionary of max or min value of corresponding QCTools keys
+    """
+    maxBarsDict = {}
+    for key_being_checked in bars_evaluation_keys:
+        if "MAX" in key_being_checked:
+            maxBarsDict[key_being_checked] = 0
+        elif "MIN" in key_being_checked:
+            maxBarsDict[key_being_checked] = 1023
+
+    for frameDict in frames:
+        frame_seconds = float(frameDict[pkt])
+        if frame_seconds >= durationStart:
+            if frame_seconds > durationEnd:
+                break
+            for colorbar_key in bars_evaluation_keys:
+                if colorbar_key in frameDict:
+                    value = float(frameDict[colorbar_key])
+                    if "MAX" in colorbar_key and value > maxBarsDict[colorbar_key]:
+                        maxBarsDict[colorbar_key] = value
+                    elif "MIN" in colorbar_key and value < maxBarsDict[colorbar_key]:
+                        maxBarsDict[colorbar_key] = value
+
+    # Convert highest values to integer
+    return {colorbar_key: int(value) for colorbar_key, value in maxBarsDict.items()}
+
+
+def detect_bars_columns(columns, bit_depth_10, durationLimit=None):
+    """
+    Finds the color bars in the first durationLimit seconds of a report's columns.
+
+    A frame has the bars signature if its YMAX is over, and its YMIN and YDIF under, the thresholds for its bit depth.
+    The bars start at the first of bars_start_frames consecutive frames with the signature: a cumulative count of the
+    frames with it gives the count in every window. They end at the first frame without it once the last frame
+    with the signature is more than 2 seconds after the start, so short dropouts inside the bars don't end them.
+    Every frame is checked at once: a running maximum gives the last frame with the signature up to each frame.
+
+    Parameters:
+        columns (ReportColumns): The report's columns, with at least YMAX, YMIN and YDIF.
+        bit_depth_10 (bool): Whether the video is 10 bit.
+        durationLimit (float, optional): Seconds of the report searched for bars, bars_search_duration if None.
+
+    Returns:
+        BarsDuration: (durationStart, durationEnd, barsStartString, barsEndString), as detectBars.
+    """
+    numpy = load_numpy()
+    if durationLimit is None:
+        durationLimit = bars_search_duration
+    if not all(key in columns for key in bars_detection_keys):
+        return BarsDuration("", "", None, None)
+    YMAX_thresh, YMIN_thresh, YDIF_thresh = bars_thresholds(bit_depth_10)
+
+    timestamps = columns.timestamps
+    head = int(numpy.searchsorted(timestamps, durationLimit, side='right'))
+    bars = ((columns['YMAX'][:head] > YMAX_thresh) &
+            (columns['YMIN'][:head] < YMIN_thresh) &
+            (columns['YDIF'][:head] < YDIF_thresh))
+    # frames with the signature in each window of bars_start_frames frames, by the window's first frame
+    counts = numpy.concatenate(([0], numpy.cumsum(bars)))
+    windows = numpy.flatnonzero(counts[bars_start_frames:] - counts[:-bars_start_frames] == bars_start_frames)
+    if windows.size == 0:
+        return BarsDuration("", "", None, None)
+
+    first = int(windows[0])
+    durationStart = float(timestamps[first])
+    barsStartString = dts2ts(f"{durationStart:.6f}")
+    logger.debug(f"Bars start at {durationStart:.6f} ({barsStartString})")
+
+    # timestamp of the last frame with the bars signature, at or before each frame from the start of the bars
+    last_match = numpy.maximum.accumulate(numpy.where(bars[first:], numpy.arange(first, head), first))
+    last_match_seconds = timestamps[last_match]
+    ends = numpy.flatnonzero(~bars[first:] & (last_match_seconds - durationStart > 2))
+    if ends.size == 0:
+        return BarsDuration(durationStart, float(last_match_seconds[-1]), barsStartString, None)
+
+    end = first + int(ends[0])
+    durationEnd = float(last_match_seconds[ends[0]])
+    barsEndString = dts2ts(f"{timestamps[end]:.6f}")
+    logger.debug(f"Bars ended at {timestamps[end]:.6f} ({barsEndString})\n")
+    return BarsDuration(durationStart, durationEnd, barsStartString, barsEndString)
+
+
+def evaluate_bars_columns(columns, durationStart, durationEnd):
+    """
+    Maximum or minimum value of each bars evaluation key over the frames from durationStart to durationEnd.
+
+    Each key's column is sliced to the bars and reduced with nanmax or nanmin.
+    MAX keys start from 0 and MIN keys from 1023, which are kept if the bars have no value above or below them.
+
+    Returns:
+        maxBarsDict (dict): Returns dictionary of max or min value of corresponding QCTools keys
+    """
+    numpy = load_numpy()
+    timestamps = columns.timestamps
+    bars = slice(int(numpy.searchsorted(timestamps, durationStart, side='left')),
+                 int(numpy.searchsorted(timestamps, durationEnd, side='right')))
+    maxBarsDict = {}
+    for colorbar_key in bars_evaluation_keys:
+        maxBarsDict[colorbar_key] = 0 if "MAX" in colorbar_key else 1023
+        if colorbar_key not in columns:
+            continue
+        values = columns[colorbar_key][bars]
+        values = values[~numpy.isnan(values)]
+        if values.size == 0:
+            continue
+        if "MAX" in colorbar_key:
+            maxBarsDict[colorbar_key] = max(maxBarsDict[colorbar_key], float(values.max()))
+        else:
+            maxBarsDict[colorbar_key] = min(maxBarsDict[colorbar_key], float(values.min()))
+
+    # Convert highest values to integer
+    return {colorbar_key: int(value) for colorbar_key, value in maxBarsDict.items()}
+
+
+class ThresholdAnalysis:
+    """
+    Frame by frame equivalent of analyzeIt.
+
+    Takes the same arguments as analyzeIt, minus the report itself. Call feed() with each frameDict,
+    then results() returns the same (kbeyond, frameCount, overallFrameFail, failureInfo) tuple analyzeIt does.
+    """
+
+    def __init__(self, qct_parse, video_path, profile, profile_name, startObj, pkt, durationStart, durationEnd, thumbPath, thumbDelay, thumbExportDelay, rules=None, failures=None):
+        self.qct_parse = qct_parse
+        self.video_path = video_path
+        self.profile = profile
+        self.profile_name = profile_name
+        self.startObj = startObj
+        self.pkt = pkt
+        self.durationStart = durationStart
+        self.durationEnd = durationEnd
+        self.thumbPath = thumbPath
+        self.thumbDelay = thumbDelay
+        self.thumbExportDelay = thumbExportDelay
+        self.rules = compile_profile(profile) if rules is None else rules
+        self.kbeyond = {rule.tag: 0 for rule in self.rules}
+        self.frameCount = 0
+        self.overallFrameFail = 0
+        self.failureInfo = FailureStore() if failures is None else failures
+        self.fots = ""
+        self.done = False
+
+    def feed(self, frameDict):
+        self.frameCount = self.frameCount + 1
+        frame_pkt_dts_time = frameDict[self.pkt]
+        if frame_pkt_dts_time >= str(self.durationStart):
+            if self.durationEnd and float(frame_pkt_dts_time) > self.durationEnd:
+                self.done = True
+                return
+            for rule in self.rules:
+                frameOver, self.thumbDelay, self.failureInfo = threshFinder(self.qct_parse, self.video_path, frameDict, self.startObj, self.pkt, rule, self.thumbPath, self.thumbDelay, self.thumbExportDelay, self.profile_name, self.failureInfo, self.frameCount)
+                if frameOver is True:
+                    self.kbeyond[rule.tag] = self.kbeyond[rule.tag] + 1
+                    if not frame_pkt_dts_time in self.fots:   # make sure that we only count each over frame once
+                        self.overallFrameFail = self.overallFrameFail + 1
+                        self.fots = frame_pkt_dts_time
+            self.thumbDelay = self.thumbDelay + 1
+
+    def results(self):
+        return self.kbeyond, self.frameCount, self.overallFrameFail, self.failureInfo
+
+
+# Number of failing frames evaluate_thresholds stores at a time
+failure_block_size = 65536
+
+
+def evaluate_thresholds(qct_parse, video_path, columns, profile, profile_name, startObj, durationStart, durationEnd, thumbPath, thumbDelay, thumbExportDelay, rules=None, failures=None):
+    """
+    Column equivalent of analyzeIt: checks every frame against the profile with one array comparison per tag.
+
+    Frames are in the window if their timestamp is >= durationStart, up to the first frame after durationEnd.
+    Failures are stored in blocks of failure_block_size frames, and only the frames with failures are visited
+    one by one, to export thumbnails.
+
+    Parameters:
+        columns (ReportColumns): Decoded QCTools report (see qctools_report.get_report_columns).
+        The others are the same as analyzeIt.
+
+    Returns:
+        tuple: (kbeyond, frameCount, overallFrameFail, failureInfo), as returned by analyzeIt.
+    """
+    numpy = load_numpy()
+    if rules is None:
+        rules = compile_profile(profile)
+    kbeyond = {rule.tag: 0 for rule in rules}
+    failureInfo = FailureStore() if failures is None else failures
+    if numpy is None:
+        return kbeyond, 0, 0, failureInfo
+
+    timestamps = columns.timestamps
+    frameCount = columns.frame_count
+    stop = frameCount
+    if durationEnd:
+        past_end = numpy.flatnonzero(timestamps > durationEnd)
+        if past_end.size:
+            stop = int(past_end[0])
+            frameCount = stop + 1   # analyzeIt counts the frame it stops at
+    evaluated = numpy.flatnonzero(timestamps[:stop] >= float(durationStart))
+
+    bound, indices, less_than, thresholds = rules.bind(columns)
+    if not bound or not evaluated.size:
+        return kbeyond, frameCount, 0, failureInfo
+
+    values = columns.data[numpy.ix_(indices, evaluated)]
+    with numpy.errstate(invalid='ignore'):   # NaN (tag missing from the frame) never fails
+        overs = numpy.where(less_than[:, None], values < thresholds[:, None], values > thresholds[:, None])
+    for rule, count in zip(bound, overs.sum(axis=1).tolist()):
+        kbeyond[rule.tag] = kbeyond[rule.tag] + count
+
+    failing = numpy.flatnonzero(overs.any(axis=0))
+    if not failing.size:
+        return kbeyond, frameCount, 0, failureInfo
+
+    # a failing frame is counted once, frames sharing the timestamp of the previous failing frame are not counted again
+    failing_times = timestamps[evaluated[failing]]
+    overallFrameFail = 1 + int(numpy.count_nonzero(failing_times[1:] != failing_times[:-1]))
+
+    tag_ids = numpy.array([failureInfo.tag_id(rule.tag) for rule in bound], dtype=numpy.intp)
+    for block in range(0, failing.size, failure_block_size):
+        block_frames = failing[block:block + failure_block_size]
+        # the failures of each failing frame, in the order of the rules
+        frame_rows, rule_rows = numpy.nonzero(overs[:, block_frames].T)
+        failureInfo.extend(failing_times[block:block + failure_block_size][frame_rows].tolist(), tag_ids[rule_rows].tolist(),
+                           values[rule_rows, block_frames[frame_rows]].tolist(), thresholds[rule_rows].tolist(),
+                           (evaluated[block_frames[frame_rows]] + 1).tolist())   # frame numbers count from 1, like analyzeIt's frameCount
+
+    if qct_parse['thumbExport']:
+        lastThumb = None
+        for position, frame_time, frame_overs, frame_values in zip(failing.tolist(), failing_times.tolist(), overs[:, failing].T.tolist(), values[:, failing].T.tolist()):
+            if lastThumb is None:
+                frameThumbDelay = thumbDelay + position
+            else:
+                frameThumbDelay = position - lastThumb
+            for rule, frameOver, tagValue in zip(bound, frame_overs, frame_values):
+                if frameOver and frameThumbDelay > int(thumbExportDelay):
+                    printThumb(video_path, rule.tag, profile_name, startObj, thumbPath, tagValue, dts2ts(frame_time))
+                    frameThumbDelay = 0
+                    lastThumb = position
+
+    return kbeyond, frameCount, overallFrameFail, failureInfo
+
+
+class ColumnThresholdAnalysis:
+    """
+    ThresholdAnalysis that checks the whole report at once with evaluate_thresholds.
+
+    It is done from the start, so it is never fed frames. results() runs the evaluation the first time it is called.
+    """
+
+    done = True
+
+    def __init__(self, columns, qct_parse, video_path, profile, profile_name, startObj, durationStart, durationEnd, thumbPath, thumbDelay, thumbExportDelay, rules=None, failures=None):
+        self.columns = columns
+        self.qct_parse = qct_parse
+        self.video_path = video_path
+        self.profile = profile
+        self.profile_name = profile_name
+        self.startObj = startObj
+        self.durationStart = durationStart
+        self.durationEnd = durationEnd
+        self.thumbPath = thumbPath
+        self.thumbDelay = thumbDelay
+        self.thumbExportDelay = thumbExportDelay
+        self.rules = rules
+        self.failures = failures
+        self._results = None
+
+    def feed(self, frameDict):
+        pass
+
+    def results(self):
+        if self._results is None:
+            self._results = evaluate_thresholds(self.qct_parse, self.video_path, self.columns, self.profile, self.profile_name, self.startObj, self.durationStart, self.durationEnd, self.thumbPath, self.thumbDelay, self.thumbExportDelay, self.rules, self.failures)
+        return self._results
+
+
+def analyze_single_pass(startObj, video_path, report_directory, qct_parse, thumbPath, check_cancelled=None, use_cache=True, follow=None, columns=None):
+    """
+    Runs every enabled qct-parse analysis in one pass over the QCTools report.
+
+    The report is decoded into columns once, or loaded from its columns sidecar (see qctools_report), and the
+    threshold checks (profile, tag check, bars evaluation) run on whole columns with evaluate_thresholds.
+    The frame by frame analyses (bit depth detection, content filters) then go through the few columns
+    they need, stopping early once only bit depth detection is left and it is done, and bars detection and
+    evaluation run on the head of the columns once the bit depth is known (detect_bars_columns, evaluate_bars_columns).
+    If the columns aren't available, the report is parsed once and each frame is handed to every active analysis instead.
+    Bars detection can then only start once the bit depth is known, and bars evaluation once the bars duration
+    is known, so the values those two need are kept in a FrameBuffer and replayed to them when they start.
+    The tag statistics are accumulated from the columns, or from each frame when there are no columns.
+    Writes the same CSVs as the multi-pass path in run_qctparse.
+
+    Parameters:
+        startObj (str): Path to the QCTools report file (.qctools.xml.gz)
+        video_path (str): Path to the video file being analyzed.
+        report_directory (str): Path to {video_id}_report_csvs directory.
+        qct_parse (dict): qct-parse dictionary from checks_config
+        thumbPath (str): Path where thumbnails are saved.
+        check_cancelled (callable, optional): Returns True if processing has been cancelled.
+        use_cache (bool): Load the report's columns sidecar, writing it if it is missing or stale.
+        follow (callable, optional): Returns True while the report is still being written, in which case
+            it is decoded as it grows (see qctools_report.open_report).
+        columns (ReportColumns, optional): Frame stats that have already been decoded (e.g. by
+            qctools_report.read_signalstats), analyzed instead of reading startObj.
+
+    Returns:
+        bool: True if the analysis finished, None if it was cancelled or could not run.
+    """
+    if check_cancelled is None:
+        check_cancelled = lambda: False
+
+    baseName = (os.path.basename(startObj)).split('.')[0]
+    buffSize = int(11)
+    thumbDelay = 9000
+    thumbExportDelay = 9000
+    durationStart = 0
+    durationEnd = 99999999
+    runBarsEvaluation = qct_parse['evaluateBars'] and qct_parse['barsDetection']
+    if qct_parse['evaluateBars'] and not qct_parse['barsDetection']:
+        logger.critical("Cannot run color bars evaluation without running Bars Detection.")
+
+    pkt = None
+    bitdepth = BitdepthDetection(buffSize)
+    profileAnalyses = {}
+    tagAnalysis = None
+    barsDetection = None
+    barsAnalysis = None
+    barsBuffer = None
+    maxBarsDict = None
+    contentFilters = []
+    failureStores = []
+    tagStatistics = None
+    checks = CompiledChecks(qct_parse)
+
+    if columns is None:
+        columns = get_report_columns(startObj, use_cache=use_cache, check_cancelled=check_cancelled, keys=get_needed_keys(qct_parse, checks=checks), follow=follow)
+    if check_cancelled():
+        return None
+    if columns is not None:
+        frames = columns.iter_frames(keys=get_needed_keys(qct_parse, threshold_checks=False, checks=checks, bars_checks=False))
+    else:
+        frames = iter_report_frames(startObj, keys=get_needed_keys(qct_parse, checks=checks), follow=follow)
+
+    def threshold_analysis(profile, profile_name, rules, failure_csv_path):
+        # failures are written to their CSV as they are found
+        failures = FailureStore(failure_csv_path)
+        failureStores.append(failures)
+        if columns is not None:
+            return ColumnThresholdAnalysis(columns, qct_parse, video_path, profile, profile_name, startObj, durationStart, durationEnd, thumbPath, thumbDelay, thumbExportDelay, rules=rules, failures=failures)
+        return ThresholdAnalysis(qct_parse, video_path, profile, profile_name, startObj, pkt, durationStart, durationEnd, thumbPath, thumbDelay, thumbExportDelay, rules=rules, failures=failures)
+
+    def discard_outputs():
+        for contentFilter in contentFilters:
+            contentFilter.close()
+        for failures in failureStores:
+            failures.discard()
+
+    def start_deferred_analyses(end_of_report=False):
+        # Starts bars detection and bars evaluation once what they depend on is known, replaying buffered frames to them
+        nonlocal barsDetection, barsAnalysis, barsBuffer, maxBarsDict
+        started = []
+        bitdepth_known = bitdepth.done or end_of_report
+        if barsBuffer is None:
+            return started
+        if barsDetection is None and bitdepth_known:
+            logger.debug(f"Starting Bars Detection on {baseName}")
+            barsDetection = BarsDetection(pkt, bitdepth.bit_depth_10)
+            for frameDict in barsBuffer.replay():
+                barsDetection.feed(frameDict)
+                if barsDetection.done:
+                    break
+            started.append(barsDetection)
+        if barsDetection is not None and (barsDetection.done or end_of_report):
+            if runBarsEvaluation and barsDetection.durationStart != "" and barsDetection.durationEnd != "":
+                maxBarsDict = evalBarsFrames(barsBuffer.replay(), pkt, barsDetection.durationStart, barsDetection.durationEnd)
+                logger.debug(f"Starting qct-parse color bars evaluation on {baseName}\n")
+                barsAnalysis = threshold_analysis(maxBarsDict, 'color_bars_evaluation', compile_profile(maxBarsDict), os.path.join(report_directory, "qct-parse_colorbars_eval_failures.csv"))
+                if not barsAnalysis.done:
+                    for frameDict in barsBuffer.replay():
+                        barsAnalysis.feed(frameDict)
+                started.append(barsAnalysis)
+            barsBuffer = None
+        return started
+
+    for frame_pkt, frameDict in frames:
+        if pkt is None:
+            pkt = frame_pkt
+            analyses = [bitdepth]
+            for filter_name in qct_parse['contentFilter'] or []:
+                logger.debug(f"Checking for segments of {os.path.basename(video_path)} that match the content filter {filter_name}\n")
+                if filter_name in checks.content_filters:
+                    qctools_content_check_output = os.path.join(report_directory, f"qct-parse_contentFilter_{filter_name}_summary.csv")
+                    contentFilters.append(ContentFilterDetection(pkt, filter_name, checks.content_filters[filter_name], qctools_content_check_output, qct_parse, thumbPath, video_path, startObj))
+            analyses.extend(contentFilters)
+            # every profile is checked in this same pass
+            for template, profile_check in checks.profiles.items():
+                logger.debug(f"Starting qct-parse analysis against {template} thresholds on {baseName}\n")
+                profileAnalyses[template] = threshold_analysis(profile_check.profile, f"threshold_profile_{template}", profile_check.rules, checks.profile_outputs(report_directory, template)[0])
+                analyses.append(profileAnalyses[template])
+            if checks.tag_profile is not None:
+                logger.debug(f"Starting qct-parse analysis against user input tag thresholds on {baseName}\n")
+                tagAnalysis = threshold_analysis(checks.tag_profile, 'tag_check', checks.tag_rules, os.path.join(report_directory, "qct-parse_tags_failures.csv"))
+                analyses.append(tagAnalysis)
+            if qct_parse['barsDetection'] and columns is None:
+                buffer_keys = bars_detection_keys + bars_evaluation_keys if runBarsEvaluation else bars_detection_keys
+                barsBuffer = FrameBuffer(pkt, dict.fromkeys(buffer_keys))
+            if checks.statistics_tags:
+                if columns is None and load_numpy() is None:
+                    logger.error("Cannot compute qct-parse tag statistics without numpy\n")
+                else:
+                    tagStatistics = TagStatistics(checks.statistics_tags)
+                    if columns is None:
+                        analyses.append(tagStatistics)
+
+        if check_cancelled():
+            discard_outputs()
+            return None
+
+        for analysis in analyses:
+            if not analysis.done:
+                analysis.feed(frameDict)
+        if barsBuffer is not None:
+            barsBuffer.append(frameDict)
+        analyses.extend(start_deferred_analyses())
+
+        if all(analysis.done for analysis in analyses) and barsBuffer is None:
+            break
+
+    if pkt is None:
+        logger.critical(f"No video frames with timestamps found in {os.path.basename(startObj)}\n")
+        return None
+
+    start_deferred_analyses(end_of_report=True)
+    if qct_parse['barsDetection'] and columns is not None:
+        logger.debug(f"Starting Bars Detection on {baseName}")
+        barsDetection = detect_bars_columns(columns, bitdepth.bit_depth_10)
+        if runBarsEvaluation and barsDetection.durationStart != "" and barsDetection.durationEnd != "":
+            maxBarsDict = evaluate_bars_columns(columns, barsDetection.durationStart, barsDetection.durationEnd)
+            logger.debug(f"Starting qct-parse color bars evaluation on {baseName}\n")
+            barsAnalysis = threshold_analysis(maxBarsDict, 'color_bars_evaluation', compile_profile(maxBarsDict), os.path.join(report_directory, "qct-parse_colorbars_eval_failures.csv"))
+    for contentFilter in contentFilters:
+        contentFilter.finish()
+    if tagStatistics is not None:
+        if columns is not None:
+            tagStatistics.update_columns(columns, check_cancelled)
+        else:
+            tagStatistics.finish()
+
+    if check_cancelled():
+        discard_outputs()
+        return None
+
+    ######## Write results ########
+    for template, profileAnalysis in profileAnalyses.items():
+        kbeyond, frameCount, overallFrameFail, failureInfo = profileAnalysis.results()
+        profile_fails_csv_path, qctools_profile_check_output = checks.profile_outputs(report_directory, template)
+        if failureInfo:
+            save_failures_to_csv(failureInfo, profile_fails_csv_path)
+        printresults(profileAnalysis.profile, kbeyond, frameCount, overallFrameFail, qctools_profile_check_output)
+        logger.debug(f"qct-parse summary written to {qctools_profile_check_output}\n")
+
+    if tagAnalysis is not None:
+        kbeyond, frameCount, overallFrameFail, failureInfo = tagAnalysis.results()
+        tag_fails_csv_path = os.path.join(report_directory, "qct-parse_tags_failures.csv")
+        if failureInfo:
+            save_failures_to_csv(failureInfo, tag_fails_csv_path)
+        qctools_tag_check_output = os.path.join(report_directory, "qct-parse_tags_summary.csv")
+        printresults(tagAnalysis.profile, kbeyond, frameCount, overallFrameFail, qctools_tag_check_output, adhoc_tag=True)
+        logger.debug(f"qct-parse summary written to {qctools_tag_check_output}\n")
+
+    if barsDetection is not None:
+        qctools_colorbars_duration_output = os.path.join(report_directory, "qct-parse_colorbars_durations.csv")
+        if barsDetection.durationStart == "" and barsDetection.durationEnd == "":
+            logger.error("No color bars detected\n")
+            print_bars_durations(qctools_colorbars_duration_output, barsDetection.barsStartString, barsDetection.barsEndString)
+        if barsDetection.barsStartString and barsDetection.barsEndString:
+            print_bars_durations(qctools_colorbars_duration_output, barsDetection.barsStartString, barsDetection.barsEndString)
+            if qct_parse['thumbExport']:
+                barsStampString = dts2ts(barsDetection.durationStart)
+                printThumb(video_path, "bars_found", "color_bars_detection", startObj, thumbPath, "first_frame", barsStampString)
+
+        if runBarsEvaluation:
+            if barsAnalysis is None:
+                logger.critical(f"Cannot run color bars evaluation - no color bars found.\n")
+            else:
+                smpte_color_bars = asdict(spex_config.qct_parse_values.smpte_color_bars)
+                colorbars_values_output = os.path.join(report_directory, "qct-parse_colorbars_values.csv")
+                print_color_bar_values(baseName, smpte_color_bars, maxBarsDict, colorbars_values_output)
+                kbeyond, frameCount, overallFrameFail, failureInfo = barsAnalysis.results()
+                colorbars_eval_fails_csv_path = os.path.join(report_directory, "qct-parse_colorbars_eval_failures.csv")
+                if failureInfo:
+                    save_failures_to_csv(failureInfo, colorbars_eval_fails_csv_path)
+                qctools_bars_eval_check_output = os.path.join(report_directory, "qct-parse_colorbars_eval_summary.csv")
+                printresults(maxBarsDict, kbeyond, frameCount, overallFrameFail, qctools_bars_eval_check_output)
+                logger.debug(f"qct-parse bars evaluation complete. qct-parse summary written to {qctools_bars_eval_check_output}\n")
+
+    if tagStatistics is not None:
+        tag_statistics_output = os.path.join(report_directory, "qct-parse_tag_statistics.csv")
+        tagStatistics.write_csv(tag_statistics_output)
+        logger.debug(f"qct-parse tag statistics written to {tag_statistics_output}\n")
+
+    return True
+
+
+def run_qctparse(video_path, qctools_output_path, report_directory, check_cancelled=None, single_pass=True, use_cache=True, follow=None, columns=None):
     """
     Executes the qct-parse analysis on a given video file, exporting relevant data and thumbnails based on specified thresholds and profiles.
 
@@ -881,6 +1790,14 @@ def run_qctparse(video_path, qctools_output_path, report_directory, check_cancel
         video_path (str): Path to the video file being analyzed.
         qctools_output_path (str): Path to the QCTools XML report output.
         report_directory (str): Path to {video_id}_report_csvs directory.
+        single_pass (bool): Run every analysis in one pass over the report (see analyze_single_pass).
+            If False, the report is re-parsed for each analysis.
+        use_cache (bool): In single pass mode, reuse the decoded columns of the report stored in the
+            QCTools cache directory ({report}.columns.npy, see qctools_report), writing them on the first run.
+        follow (callable, optional): Returns True while qcli is still writing the report. In single pass mode
+            the report is analyzed as it is written, otherwise qct-parse waits for it to be finished.
+        columns (ReportColumns, optional): Frame stats from qctools_report.read_signalstats, analyzed in a single
+            pass instead of a QCTools report. qctools_output_path is then only used to name the outputs.
 
     """
     # Check if we can load required library
@@ -888,6 +1805,17 @@ def run_qctparse(video_path, qctools_output_path, report_directory, check_cancel
     if etree is None:
         logger.critical("Cannot proceed with qct-parse: required library lxml.etree is not available")
         return None
+
+    if check_cancelled is None:
+        check_cancelled = lambda: False
+
+    if follow is not None and not single_pass:
+        # only the single pass analysis can read the report as it is written
+        while follow():
+            if check_cancelled():
+                return None
+            time.sleep(1)
+        follow = None
     
     logger.info("Starting qct-parse\n")
 
@@ -896,10 +1824,14 @@ def run_qctparse(video_path, qctools_output_path, report_directory, check_cancel
     
     qct_parse = asdict(checks_config.tools.qct_parse)
 
-    qctools_ext = checks_config.outputs.qctools_ext
-
-    if qctools_ext.lower().endswith('mkv'):
-        startObj = extract_report_mkv(startObj, qctools_output_path)
+    if columns is not None:
+        single_pass = True
+    # a report embedded in a .qctools.mkv is streamed out of it by ffmpeg each time it is read (see open_report)
+    elif is_embedded_report(startObj):
+        if shutil.which('ffmpeg') is None:
+            logger.critical(f"Cannot read the QCTools report in {os.path.basename(startObj)}: ffmpeg was not found\n")
+            return None
+        logger.info(f'Reading qctools.xml.gz report from {os.path.basename(startObj)}\n')
 
     # Initalize circular buffer for efficient xml parsing
     buffSize = int(11)
@@ -927,14 +1859,25 @@ def run_qctparse(video_path, qctools_output_path, report_directory, check_cancel
             if archive_result:
                 logger.debug(f"Archived thumbnails to {archive_result}\n")
 
-    profile = {}  # init a dictionary where we'll store reference values from config.yaml file
+    thumbQueue.clear()
+
+    if single_pass:
+        if analyze_single_pass(startObj, video_path, report_directory, qct_parse, thumbPath, check_cancelled=check_cancelled, use_cache=use_cache, follow=follow, columns=columns) is None:
+            thumbQueue.clear()
+            return None
+        thumbQueue.render(check_cancelled)
+        logger.info(f"qct-parse finished processing file: {os.path.basename(startObj)} \n")
+        return
+
+    # compile the thresholds of every check once, every pass uses them
+    checks = CompiledChecks(qct_parse)
 
-    # init a list of every tag available in a QCTools Report from the fullTagList in the config.yaml
-    tagList = list(fullTagList.keys())
+    # every pass shares framesList, so they all parse the same keys
+    neededKeys = get_needed_keys(qct_parse, checks=checks)
 
     # open qctools report 
     # determine if report stores pkt_dts_time or pkt_pts_time
-    with gzip.open(startObj) as xml:    
+    with open_report(startObj) as xml:    
         for event, elem in etree.iterparse(xml, events=('end',), tag='frame'):  # iterparse the xml doc
             if elem.attrib['media_type'] == "video":  # get just the video frames
                 # we gotta find out if the qctools report has pkt_dts_time or pkt_pts_time ugh
@@ -944,7 +1887,7 @@ def run_qctparse(video_path, qctools_output_path, report_directory, check_cancel
                     break
 
     # Determine if video values are 10 bit depth
-    bit_depth_10 = detectBitdepth(startObj,pkt,framesList,buffSize)
+    bit_depth_10 = detectBitdepth(startObj,pkt,framesList,buffSize,keys=neededKeys)
 
     if check_cancelled():
         return None
@@ -953,58 +1896,46 @@ def run_qctparse(video_path, qctools_output_path, report_directory, check_cancel
     if qct_parse['contentFilter']:
         for filter_name in qct_parse['contentFilter']:
             logger.debug(f"Checking for segments of {os.path.basename(video_path)} that match the content filter {filter_name}\n")
-            if hasattr(spex_config.qct_parse_values.content, filter_name):
-                raw_dict = asdict(getattr(spex_config.qct_parse_values.content, filter_name))
-                # Convert the [value, operation] lists to "value, operation" strings
-                contentFilter_dict = {
-                    key: f"{value[0]}, {value[1]}" 
-                    for key, value in raw_dict.items()
-                }
+            if filter_name in checks.content_filters:
                 qctools_content_check_output = os.path.join(report_directory, f"qct-parse_contentFilter_{filter_name}_summary.csv")
-                detectContentFilter(startObj, pkt, filter_name, contentFilter_dict, qctools_content_check_output, framesList, qct_parse, thumbPath, video_path)
+                detectContentFilter(startObj, pkt, filter_name, checks.content_filters[filter_name], qctools_content_check_output, qct_parse, thumbPath, video_path)
 
     if check_cancelled():
         return None
 
     ######## Iterate Through the XML for General Analysis ########
-    if qct_parse['profile']:
-        template = qct_parse['profile'][0] 
-        if template in spex_config.qct_parse_values.profiles.__dict__:
-        # If the template matches one of the profiles
-            for t in tagList:
-                if hasattr(getattr(spex_config.qct_parse_values.profiles, template), t):
-                    profile[t] = getattr(getattr(spex_config.qct_parse_values.profiles, template), t)
+    for template, profile_check in checks.profiles.items():
+        profile = profile_check.profile
         logger.debug(f"Starting qct-parse analysis against {template} thresholds on {baseName}\n")
         # set thumbExportDelay for profile check
         thumbExportDelay = 9000
         # set profile_name
         profile_name = f"threshold_profile_{template}"
+        profile_fails_csv_path, qctools_profile_check_output = checks.profile_outputs(report_directory, template)
         # check xml against thresholds, return kbeyond (dictionary of tags: framecount exceeding), frameCount (total # of frames), and overallFrameFail (total # of failed frames)
-        kbeyond, frameCount, overallFrameFail, failureInfo = analyzeIt(qct_parse, video_path, profile, profile_name, startObj, pkt, durationStart, durationEnd, thumbPath, thumbDelay, thumbExportDelay, framesList, frameCount=0, overallFrameFail=0, adhoc_tag=False, check_cancelled=check_cancelled)
-        profile_fails_csv_path = os.path.join(report_directory, "qct-parse_profile_failures.csv")
+        kbeyond, frameCount, overallFrameFail, failureInfo = analyzeIt(qct_parse, video_path, profile, profile_name, startObj, pkt, durationStart, durationEnd, thumbPath, thumbDelay, thumbExportDelay, framesList, frameCount=0, overallFrameFail=0, rules=profile_check.rules, check_cancelled=check_cancelled, keys=neededKeys, failures=FailureStore(profile_fails_csv_path))
         if failureInfo:
             save_failures_to_csv(failureInfo, profile_fails_csv_path)
-        qctools_profile_check_output = os.path.join(report_directory, "qct-parse_profile_summary.csv")
         printresults(profile, kbeyond, frameCount, overallFrameFail, qctools_profile_check_output)
         logger.debug(f"qct-parse summary written to {qctools_profile_check_output}\n")
 
     if check_cancelled():
         return None
 
-    if qct_parse['tagname']:
+    if checks.tag_profile is not None:
         logger.debug(f"Starting qct-parse analysis against user input tag thresholds on {baseName}\n")
         # set profile and thumbExportDelay for ad hoc tag check
-        profile = fullTagList
+        profile = checks.tag_profile
         thumbExportDelay = 9000
         # set profile_name
         profile_name = 'tag_check'
-        # check xml against thresholds, return kbeyond (dictionary of tags:framecount exceeding), frameCount (total # of frames), and overallFrameFail (total # of failed frames)
-        kbeyond, frameCount, overallFrameFail, failureInfo = analyzeIt(qct_parse, video_path, profile, profile_name, startObj, pkt, durationStart, durationEnd, thumbPath, thumbDelay, thumbExportDelay, framesList, frameCount=0, overallFrameFail=0, adhoc_tag = True, check_cancelled=check_cancelled)
         tag_fails_csv_path = os.path.join(report_directory, "qct-parse_tags_failures.csv")
+        # check xml against thresholds, return kbeyond (dictionary of tags:framecount exceeding), frameCount (total # of frames), and overallFrameFail (total # of failed frames)
+        kbeyond, frameCount, overallFrameFail, failureInfo = analyzeIt(qct_parse, video_path, profile, profile_name, startObj, pkt, durationStart, durationEnd, thumbPath, thumbDelay, thumbExportDelay, framesList, frameCount=0, overallFrameFail=0, rules=checks.tag_rules, check_cancelled=check_cancelled, keys=neededKeys, failures=FailureStore(tag_fails_csv_path))
         if failureInfo:
             save_failures_to_csv(failureInfo, tag_fails_csv_path)
         qctools_tag_check_output = os.path.join(report_directory, "qct-parse_tags_summary.csv")
-        printresults(profile, kbeyond, frameCount, overallFrameFail, qctools_tag_check_output)
+        printresults(profile, kbeyond, frameCount, overallFrameFail, qctools_tag_check_output, adhoc_tag=True)
         logger.debug(f"qct-parse summary written to {qctools_tag_check_output}\n")
 
     if check_cancelled():
@@ -1016,7 +1947,7 @@ def run_qctparse(video_path, qctools_output_path, report_directory, check_cancel
         durationEnd = ""                            # if bar detection is turned on then we have to calculate this
         logger.debug(f"Starting Bars Detection on {baseName}")
         qctools_colorbars_duration_output = os.path.join(report_directory, "qct-parse_colorbars_durations.csv")
-        durationStart, durationEnd, barsStartString, barsEndString = detectBars(startObj,pkt,durationStart,durationEnd,framesList,buffSize,bit_depth_10)
+        durationStart, durationEnd, barsStartString, barsEndString = detectBars(startObj,pkt,bit_depth_10)
         if durationStart == "" and durationEnd == "":
             logger.error("No color bars detected\n")
             print_bars_durations(qctools_colorbars_duration_output, barsStartString, barsEndString)
@@ -1035,7 +1966,7 @@ def run_qctparse(video_path, qctools_output_path, report_directory, check_cancel
         if qct_parse['barsDetection'] and durationStart == "" and durationEnd == "":
             logger.critical(f"Cannot run color bars evaluation - no color bars found.\n")
         elif qct_parse['barsDetection'] and durationStart != "" and durationEnd != "":
-            maxBarsDict = evalBars(startObj,pkt,durationStart,durationEnd,framesList,buffSize)
+            maxBarsDict = evalBars(startObj,pkt,durationStart,durationEnd)
             if maxBarsDict is None:
                 logger.critical("Something went wrong - Cannot run evaluate color bars\n")
             else:
@@ -1050,9 +1981,9 @@ def run_qctparse(video_path, qctools_output_path, report_directory, check_cancel
                 profile = maxBarsDict
                 profile_name = 'color_bars_evaluation'
                 thumbExportDelay = 9000            
-                # check xml against thresholds, return kbeyond (dictionary of tags:framecount exceeding), frameCount (total # of frames), and overallFrameFail (total # of failed frames)
-                kbeyond, frameCount, overallFrameFail, failureInfo = analyzeIt(qct_parse, video_path, profile, profile_name, startObj, pkt, durationStart, durationEnd, thumbPath, thumbDelay, thumbExportDelay, framesList, frameCount=0, overallFrameFail=0, adhoc_tag=False, check_cancelled=check_cancelled)
                 colorbars_eval_fails_csv_path = os.path.join(report_directory, "qct-parse_colorbars_eval_failures.csv")
+                # check xml against thresholds, return kbeyond (dictionary of tags:framecount exceeding), frameCount (total # of frames), and overallFrameFail (total # of failed frames)
+                kbeyond, frameCount, overallFrameFail, failureInfo = analyzeIt(qct_parse, video_path, profile, profile_name, startObj, pkt, durationStart, durationEnd, thumbPath, thumbDelay, thumbExportDelay, framesList, frameCount=0, overallFrameFail=0, rules=compile_profile(maxBarsDict), check_cancelled=check_cancelled, keys=neededKeys, failures=FailureStore(colorbars_eval_fails_csv_path))
                 if failureInfo:
                     save_failures_to_csv(failureInfo, colorbars_eval_fails_csv_path)
                 qctools_bars_eval_check_output = os.path.join(report_directory, "qct-parse_colorbars_eval_summary.csv")
@@ -1064,6 +1995,22 @@ def run_qctparse(video_path, qctools_output_path, report_directory, check_cancel
     if check_cancelled():
         return None
 
+    ######## Iterate Through the XML for Tag Statistics ########
+    if checks.statistics_tags:
+        logger.debug(f"Computing qct-parse tag statistics of {baseName}\n")
+        tagStatistics = report_tag_statistics(startObj, checks.statistics_tags, check_cancelled=check_cancelled)
+        if tagStatistics is not None:
+            tag_statistics_output = os.path.join(report_directory, "qct-parse_tag_statistics.csv")
+            tagStatistics.write_csv(tag_statistics_output)
+            logger.debug(f"qct-parse tag statistics written to {tag_statistics_output}\n")
+
+    if check_cancelled():
+        thumbQueue.clear()
+        return None
+
+    # make every queued thumbnail before the report reads ThumbExports
+    thumbQueue.render(check_cancelled)
+
     logger.info(f"qct-parse finished processing file: {os.path.basename(startObj)} \n")
 
     return
@@ -0,0 +1,1153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Reading QCTools reports (.qctools.xml.gz, or embedded in a .qctools.mkv)
+# Frames are parsed into frameDicts using the key naming rules from qct_parse.analyzeIt.
+# A report can also be decoded once into per-tag NumPy columns, which are stored as a memory-mappable
+# sidecar so later runs don't have to decompress and parse the XML again, and indexed by timestamp so
+# a time range can be read without starting from the top of the report.
+# The sidecars are kept in a cache directory in the user config directory, not next to the report:
+# the report's directory is a deliverable, and the sidecars can be rebuilt from the report at any time.
+
+import contextlib
+import gzip
+import hashlib
+import heapq
+import io
+import json
+import math
+import os
+import re
+import subprocess
+import time
+from array import array
+
+from ..utils.log_setup import logger
+from ..utils.config_manager import ConfigManager
+
+# Bump when the layout of the columns sidecar changes
+COLUMNS_VERSION = 1
+COLUMNS_SUFFIX = ".columns.npy"
+COLUMNS_HEADER_SUFFIX = ".columns.json"
+
+cache_dir = os.path.join(ConfigManager().get_user_config_dir(), 'qctools_cache')
+
+
+def load_etree():
+    """Helper function to load lxml.etree with error handling"""
+    try:
+        from lxml import etree
+        return etree
+    except ImportError as e:
+        logger.critical(f"Error importing lxml.etree: {e}")
+        return None
+
+
+def load_numpy():
+    """Helper function to load numpy with error handling"""
+    try:
+        import numpy
+        return numpy
+    except ImportError as e:
+        logger.critical(f"Error importing numpy: {e}")
+        return None
+
+
+def is_embedded_report(startObj):
+    """Returns True if startObj is a .qctools.mkv, which carries the report as an attachment."""
+    return startObj.lower().endswith('mkv')
+
+
+def embedded_report_command(startObj):
+    """The ffmpeg command that writes the report attached to a .qctools.mkv to stdout."""
+    return ['ffmpeg', '-hide_banner', '-loglevel', 'panic', '-dump_attachment:t:0', 'pipe:1', '-i', startObj]
+
+
+# seconds to wait before looking for more of a report that is still being written
+follow_poll_interval = 0.5
+
+
+class ReportFollower(io.RawIOBase):
+    """
+    Reads a file while another process is still writing it, like tail -f.
+
+    At the end of the file, reads wait for more data for as long as is_running() returns True.
+    Once it returns False, whatever is left in the file is read and then the end of the file is returned.
+    The file doesn't have to exist yet.
+
+    Parameters:
+        path (str): Path to the file being written.
+        is_running (callable): Returns True while the file is still being written.
+    """
+
+    def __init__(self, path, is_running):
+        self.path = path
+        self.is_running = is_running
+        self.file = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while True:
+            # asked before reading, so nothing written before the writer stopped is missed
+            running = self.is_running()
+            if self.file is None and os.path.isfile(self.path):
+                self.file = open(self.path, 'rb')
+            if self.file is not None:
+                count = self.file.readinto(b)
+                if count:
+                    return count
+            if not running:
+                return 0
+            time.sleep(follow_poll_interval)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        super().close()
+
+
+@contextlib.contextmanager
+def open_report(startObj, mode='rb', follow=None):
+    """
+    Opens a QCTools report for reading as decompressed XML.
+
+    A report embedded in a .qctools.mkv is decompressed straight from an ffmpeg pipe as ffmpeg writes it,
+    rather than being extracted to a .qctools.xml.gz first.
+
+    Parameters:
+        startObj (str): Path to the QCTools report file (.qctools.xml.gz or .qctools.mkv)
+        mode (str): 'rb' or 'rt' (UTF-8)
+        follow (callable, optional): Returns True while the report is still being written (e.g. by qcli).
+            The report is then read as it grows (see ReportFollower). A report that ends before
+            it is complete raises EOFError, like any truncated gzip file.
+    """
+    encoding = 'utf-8' if 't' in mode else None
+    if follow is not None:
+        with ReportFollower(startObj, follow) as report, gzip.open(report, mode, encoding=encoding) as xml:
+            yield xml
+        return
+    if not is_embedded_report(startObj):
+        with gzip.open(startObj, mode, encoding=encoding) as xml:
+            yield xml
+        return
+
+    process = subprocess.Popen(embedded_report_command(startObj), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        with gzip.open(process.stdout, mode, encoding=encoding) as xml:
+            yield xml
+    finally:
+        # the reader may stop early (e.g. at the end of a time window), don't wait for ffmpeg to finish writing
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+
+def find_pkt(elem, etree):
+    """
+    Determines if a <frame> element stores pkt_dts_time or pkt_pts_time.
+
+    Returns:
+        str or None: The name of the timestamp attribute, or None if the frame has neither.
+    """
+    match = re.search(r"pkt_.ts_time", etree.tostring(elem).decode('utf-8'))
+    if match:
+        return match.group()
+    return None
+
+
+def tag_key_name(key):
+    """
+    Returns the frameDict key for the key attribute of a <tag>, using the same naming as analyzeIt.
+
+    The last part of the key is used (lavfi.signalstats.YMIN -> YMIN), except for psnr and mse,
+    where the last part is a single character and the last 2 parts are used (lavfi.psnr.mse.y -> mse.y).
+    """
+    keySplit = key.split(".")
+    keyName = str(keySplit[-1])
+    if len(keyName) == 1:
+        keyName = '.'.join(keySplit[-2:])
+    return keyName
+
+
+class FrameParser:
+    """
+    Builds frameDicts from <frame> elements of a QCTools report.
+
+    The name of each distinct <tag> key is worked out once and remembered, rather than splitting it again
+    for every frame. If keys is given, only those keys are put in the frameDict and every other <tag> is skipped.
+    """
+
+    def __init__(self, pkt, keys=None):
+        self.pkt = pkt
+        self.keys = None if keys is None else set(keys)
+        self.key_names = {}
+
+    def __call__(self, elem):
+        frameDict = {self.pkt: elem.attrib[self.pkt]}
+        key_names = self.key_names
+        for t in elem.iterchildren('tag'):   # skip any other children, e.g. side_data_list
+            attrib = t.attrib
+            key = attrib['key']
+            try:
+                keyName = key_names[key]
+            except KeyError:
+                keyName = tag_key_name(key)
+                if self.keys is not None and keyName not in self.keys:
+                    keyName = None
+                key_names[key] = keyName
+            if keyName is not None:
+                frameDict[keyName] = attrib['value']
+        return frameDict
+
+
+def release_frame(elem):
+    """
+    Frees a <frame> element once it has been read, so iterparse runs in constant memory.
+
+    elem.clear() only empties the element itself. The cleared frames stay attached to the tree,
+    so the frames before this one are deleted from their parent as well.
+    """
+    elem.clear()
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
+
+
+def iterparse_report_frames(startObj, keys=None, follow=None):
+    """
+    Parses a QCTools report with lxml iterparse, yielding each video frame.
+
+    Parameters:
+        startObj (str): Path to the QCTools report file (.qctools.xml.gz or .qctools.mkv)
+        keys (iterable, optional): Only put these keys in the frameDicts (see FrameParser). All keys if None.
+        follow (callable, optional): Returns True while the report is still being written, see open_report.
+
+    Yields:
+        tuple: (pkt, frameDict) where pkt is pkt_dts_time or pkt_pts_time, whichever the report uses.
+    """
+    etree = load_etree()
+    if etree is None:
+        return
+
+    pkt = None
+    parser = None
+    with open_report(startObj, follow=follow) as xml:
+        for event, elem in etree.iterparse(xml, events=('end',), tag='frame'):
+            if elem.attrib['media_type'] == "video":
+                if pkt is None:
+                    # we gotta find out if the qctools report has pkt_dts_time or pkt_pts_time
+                    pkt = find_pkt(elem, etree)
+                    if pkt is not None:
+                        parser = FrameParser(pkt, keys)
+                if pkt is not None:
+                    yield pkt, parser(elem)
+            release_frame(elem) # we're done with that element so let's get it outta memory
+
+
+# QCTools reports are written by ffprobe, so every <frame> looks the same:
+# <frame media_type="video" ... pkt_pts_time="0.033367" ...><tag key="lavfi.signalstats.YMIN" value="4"/>...</frame>
+tag_key_pattern = re.compile(r'<tag key="([^"]*)" value="[^"]*"/>')
+tag_value_pattern = re.compile(r'<tag key="[^"]*" value="([^"]*)"/>')
+pkt_pattern = re.compile(r'\b(pkt_.ts_time)="')
+scan_chunk_size = 2**20
+
+
+def scan_report_frames(startObj, keys=None, follow=None):
+    """
+    Reads video frames from a QCTools report by scanning its fixed layout, without building lxml elements.
+
+    Yields the same (pkt, frameDict) tuples as iterparse_report_frames. If the report has anything the
+    scanner doesn't expect (markup other than <tag> inside a frame, escaped characters, an unclosed frame)
+    None is yielded and scanning stops, so the caller can fall back to iterparse.
+    """
+    with open_report(startObj, 'rt', follow=follow) as xml:
+        yield from scan_frames(xml, keys)
+
+
+def scan_frames(xml, keys=None):
+    """
+    Scans video frames out of decompressed report text (see scan_report_frames).
+
+    xml can start anywhere between two frames, e.g. at an offset from the report index.
+    """
+    pkt = None
+    pkt_value_pattern = None
+    # frames almost always carry the same tags in the same order, so the frameDict names
+    # (and which tags to keep) are worked out once per distinct sequence of tag keys
+    layouts = {}
+    wanted = None if keys is None else set(keys)
+    text = ""
+    while True:
+        chunk = xml.read(scan_chunk_size)
+        text = text + chunk
+        find = text.find
+        pos = 0
+        while True:
+            start = find("<frame", pos)
+            if start < 0:
+                pos = max(pos, len(text) - 5)   # keep what could be the start of a "<frame" cut off by the chunk
+                break
+            if text[start + 6:start + 7] not in (" ", ">", "/", "\n", "\t", "\r"):
+                if start + 7 > len(text):
+                    pos = start     # cut off at the end of the chunk, wait for the next one
+                    break
+                pos = start + 6     # <frames>
+                continue
+            attributes_end = find(">", start)
+            if attributes_end < 0:
+                pos = start
+                break
+            if text[attributes_end - 1] == "/":
+                attributes = text[start + 6:attributes_end - 1]
+                body = ""
+                frame_end = attributes_end + 1
+            else:
+                close = find("</frame>", attributes_end)
+                if close < 0:
+                    pos = start
+                    break
+                attributes = text[start + 6:attributes_end]
+                body = text[attributes_end + 1:close]
+                frame_end = close + 8
+            pos = frame_end
+
+            if "&" in attributes or "&" in body:
+                yield None
+                return
+            if 'media_type="video"' not in attributes:
+                if 'media_type="' not in attributes:
+                    yield None
+                    return
+                continue    # only video frames are read, whatever is in the others
+            tag_keys = tuple(tag_key_pattern.findall(body))
+            if body.count("<") != len(tag_keys):
+                yield None
+                return
+            if pkt is None:
+                found = pkt_pattern.search(attributes)
+                if found is None:
+                    continue
+                pkt = found.group(1)
+                pkt_value_pattern = re.compile(r'\b' + pkt + r'="([^"]*)"')
+            frame_time = pkt_value_pattern.search(attributes)
+            if frame_time is None:
+                yield None
+                return
+
+            layout = layouts.get(tag_keys)
+            if layout is None:
+                names = [tag_key_name(key) for key in tag_keys]
+                kept = [i for i, name in enumerate(names) if wanted is None or name in wanted]
+                layout = layouts[tag_keys] = ([names[i] for i in kept], kept, len(kept) == len(names))
+            kept_names, kept, keep_all = layout
+            values = tag_value_pattern.findall(body)
+            frameDict = {pkt: frame_time.group(1)}
+            if keep_all:
+                frameDict.update(zip(kept_names, values))
+            else:
+                frameDict.update(zip(kept_names, [values[i] for i in kept]))
+            yield pkt, frameDict
+
+        text = text[pos:]
+        if not chunk:
+            break
+
+    if "<frame " in text or "<frame>" in text:
+        yield None
+
+
+def iter_report_frames(startObj, keys=None, fast=True, follow=None):
+    """
+    Reads a QCTools report, yielding each video frame.
+
+    Parameters:
+        startObj (str): Path to the QCTools report file (.qctools.xml.gz or .qctools.mkv)
+        keys (iterable, optional): Only put these keys in the frameDicts (see FrameParser). All keys if None.
+        fast (bool): Use scan_report_frames, falling back to iterparse where the report isn't laid out as expected.
+        follow (callable, optional): Returns True while the report is still being written, see open_report.
+
+    Yields:
+        tuple: (pkt, frameDict) where pkt is pkt_dts_time or pkt_pts_time, whichever the report uses.
+    """
+    frames_read = 0
+    if fast:
+        for frame in scan_report_frames(startObj, keys, follow=follow):
+            if frame is None:
+                logger.debug(f"Unexpected content in {os.path.basename(startObj)}, reading the rest of the report with lxml\n")
+                break
+            yield frame
+            frames_read += 1
+        else:
+            return
+
+    # carry on with iterparse after the frames that have been read already
+    for index, frame in enumerate(iterparse_report_frames(startObj, keys, follow=follow)):
+        if index >= frames_read:
+            yield frame
+
+
+class ReportColumns:
+    """
+    Per-tag columns of a decoded QCTools report.
+
+    data is a 2D float64 array with one row per column name, so each tag is contiguous
+    (it may be a read-only memory map of the sidecar). Missing values are NaN.
+    The pkt timestamps are stored as the column named by pkt.
+    """
+
+    def __init__(self, pkt, names, data):
+        self.pkt = pkt
+        self.names = list(names)
+        self.data = data
+        self._index = {name: i for i, name in enumerate(self.names)}
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __getitem__(self, name):
+        return self.data[self._index[name]]
+
+    def column_index(self, name):
+        """Row of data holding the column name."""
+        return self._index[name]
+
+    @property
+    def frame_count(self):
+        return self.data.shape[1]
+
+    @property
+    def timestamps(self):
+        return self[self.pkt]
+
+    def iter_frames(self, keys=None, chunk_size=4096):
+        """
+        Yields (pkt, frameDict) for each frame, like iter_report_frames.
+
+        Tag values are floats rather than strings. Timestamps are formatted with 6 decimal places,
+        the way ffprobe writes them in QCTools reports. If keys is given, only those columns are read.
+        """
+        if keys is None:
+            names = [name for name in self.names if name != self.pkt]
+        else:
+            names = [name for name in self.names if name in set(keys) and name != self.pkt]
+        rows = [self._index[self.pkt]] + [self._index[name] for name in names]
+        for start in range(0, self.frame_count, chunk_size):
+            chunk = self.data[rows, start:start + chunk_size].tolist()
+            for frame_time, *values in zip(*chunk):
+                frameDict = {self.pkt: f"{frame_time:.6f}"}
+                for name, value in zip(names, values):
+                    if value == value:   # skip NaN, the value was missing in the report
+                        frameDict[name] = value
+                yield self.pkt, frameDict
+
+
+class ColumnsBuilder:
+    """Collects frameDicts into per-tag columns, one float per frame."""
+
+    def __init__(self):
+        self.pkt = None
+        self.frame_count = 0
+        self.columns = {}
+
+    def feed(self, pkt, frameDict):
+        if self.pkt is None:
+            self.pkt = pkt
+        for name, value in frameDict.items():
+            column = self.columns.get(name)
+            if column is None:
+                # tag first seen part way through the report, earlier frames didn't have it
+                column = self.columns[name] = array('d', [math.nan]) * self.frame_count
+            try:
+                column.append(float(value))
+            except ValueError:
+                column.append(math.nan)
+        self.frame_count += 1
+        for column in self.columns.values():
+            if len(column) < self.frame_count:
+                column.append(math.nan)
+
+    def build(self):
+        numpy = load_numpy()
+        if numpy is None or self.pkt is None:
+            return None
+        names = list(self.columns)
+        data = numpy.empty((len(names), self.frame_count), dtype=numpy.float64)
+        for i, name in enumerate(names):
+            data[i] = numpy.frombuffer(self.columns[name], dtype=numpy.float64)
+        return ReportColumns(self.pkt, names, data)
+
+
+# Frame stats straight from ffmpeg
+# Instead of qcli writing a report to be read back, ffmpeg's signalstats filter runs over the video and
+# the metadata filter prints the stats of each frame to stdout, where they go straight into columns:
+# frame:1    pts:33367   pts_time:0.033367
+# lavfi.signalstats.YMIN=4
+# ...
+# pts_time only has 6 significant digits, so the time base is set to microseconds and pts is used instead
+signalstats_filter = "settb=AVTB,signalstats=stat=tout+vrep+brng,metadata=mode=print:file=-"
+
+
+def signalstats_command(video_path):
+    """The ffmpeg command that prints the signalstats of every frame of a video's first video stream to stdout."""
+    return ['ffmpeg', '-hide_banner', '-nostats', '-loglevel', 'error', '-i', video_path,
+            '-map', '0:v:0', '-vf', signalstats_filter, '-f', 'null', '-']
+
+
+def iter_signalstats_frames(video_path, keys=None, check_cancelled=None):
+    """
+    Runs ffmpeg's signalstats filter over a video, yielding the stats of each frame as ffmpeg prints them.
+
+    Parameters:
+        video_path (str): Path to the video file.
+        keys (iterable, optional): Only put these keys in the frameDicts (see FrameParser). All keys if None.
+        check_cancelled (callable, optional): Returns True if processing has been cancelled, ffmpeg is then stopped.
+
+    Yields:
+        tuple: (pkt, frameDict), as iter_report_frames. The timestamp is stored as pkt_pts_time.
+    """
+    pkt = 'pkt_pts_time'
+    wanted = None if keys is None else set(keys)
+    names = {}
+    process = subprocess.Popen(signalstats_command(video_path), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               encoding='utf-8')
+    frameDict = None
+    try:
+        for line in process.stdout:
+            if line.startswith('frame:'):
+                if frameDict is not None:
+                    yield pkt, frameDict
+                if check_cancelled is not None and check_cancelled():
+                    return
+                fields = dict(field.partition(':')[::2] for field in line.split())
+                try:
+                    frame_time = f"{int(fields['pts']) / 1000000:.6f}"
+                except (KeyError, ValueError):
+                    frame_time = fields.get('pts_time', '')    # NOPTS
+                frameDict = {pkt: frame_time}
+                continue
+            key, separator, value = line.rstrip('\n').partition('=')
+            if frameDict is None or not separator:
+                continue
+            name = names.get(key)
+            if name is None:
+                name = names[key] = tag_key_name(key)
+            if wanted is None or name in wanted:
+                frameDict[name] = value
+        if frameDict is not None:
+            yield pkt, frameDict
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        errors = process.stderr.read()
+        process.stderr.close()
+        if process.wait() and errors and not (check_cancelled is not None and check_cancelled()):
+            logger.error(f"ffmpeg signalstats of {os.path.basename(video_path)} failed: {errors.strip()}\n")
+
+
+def read_signalstats(video_path, check_cancelled=None):
+    """
+    Gets the signalstats of every frame of a video from ffmpeg, as columns, without writing a QCTools report.
+
+    Returns:
+        ReportColumns or None: None if ffmpeg or numpy is unavailable, there were no frames or it was cancelled.
+    """
+    if load_numpy() is None:
+        return None
+    logger.info(f"Generating signalstats for {os.path.basename(video_path)}\n")
+    builder = ColumnsBuilder()
+    try:
+        for pkt, frameDict in iter_signalstats_frames(video_path, check_cancelled=check_cancelled):
+            builder.feed(pkt, frameDict)
+    except FileNotFoundError:
+        logger.critical("Cannot generate signalstats: ffmpeg was not found\n")
+        return None
+    if check_cancelled is not None and check_cancelled():
+        return None
+    return builder.build()
+
+
+def sidecar_path(report_path, suffix):
+    """
+    Returns the path of a sidecar of a report in cache_dir, creating cache_dir if needed.
+
+    Sidecars are named after the report and a digest of its absolute path, so reports with the
+    same name in different directories get their own sidecars.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path_digest = hashlib.blake2b(os.path.abspath(report_path).encode('utf-8'), digest_size=8).hexdigest()
+    return os.path.join(cache_dir, f"{os.path.basename(report_path)}.{path_digest}{suffix}")
+
+
+def columns_paths(report_path):
+    """Returns the paths of the columns sidecar and its JSON header for a report."""
+    return sidecar_path(report_path, COLUMNS_SUFFIX), sidecar_path(report_path, COLUMNS_HEADER_SUFFIX)
+
+
+def hash_report(report_path):
+    """Returns a BLAKE2b digest of the (compressed) report file."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(report_path, 'rb') as report:
+        for chunk in iter(lambda: report.read(2**20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def report_identity(report_path):
+    """Returns the size, mtime and hash the sidecars of a report are keyed by."""
+    stat = os.stat(report_path)
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'hash': hash_report(report_path)
+    }
+
+
+def source_matches(report_path, header, header_path):
+    """
+    Checks that a sidecar header's 'source' (see report_identity) is still the report at report_path.
+
+    The sidecar matches if the report's size and mtime are unchanged. If they have changed
+    (e.g. the report was copied or re-extracted) the report is hashed, and a matching hash is accepted too.
+    """
+    source = header['source']
+    stat = os.stat(report_path)
+    if stat.st_size != source['size']:
+        return False
+    if stat.st_mtime_ns != source['mtime_ns']:
+        if hash_report(report_path) != source['hash']:
+            return False
+        # same report, new mtime: record it so the next load doesn't need to hash
+        source['mtime_ns'] = stat.st_mtime_ns
+        with open(header_path, 'w') as f:
+            json.dump(header, f)
+    return True
+
+
+def save_columns(report_path, columns):
+    """
+    Writes decoded columns to the report's {report}.columns.npy sidecar, with a {report}.columns.json header.
+
+    Returns:
+        bool: True if the sidecar was written.
+    """
+    numpy = load_numpy()
+    if numpy is None or columns is None:
+        return False
+
+    columns_path, header_path = columns_paths(report_path)
+    header = {
+        'version': COLUMNS_VERSION,
+        'source': report_identity(report_path),
+        'pkt': columns.pkt,
+        'columns': columns.names,
+        'frame_count': columns.frame_count
+    }
+    try:
+        # write to temporary files first so an interrupted write never leaves a sidecar that looks valid
+        with open(columns_path + ".tmp", 'wb') as f:
+            numpy.save(f, numpy.ascontiguousarray(columns.data, dtype=numpy.float64))
+        with open(header_path + ".tmp", 'w') as f:
+            json.dump(header, f)
+        os.replace(columns_path + ".tmp", columns_path)
+        os.replace(header_path + ".tmp", header_path)
+    except OSError as e:
+        logger.error(f"Unable to write QCTools columns sidecar for {os.path.basename(report_path)}: {e}\n")
+        return False
+    logger.debug(f"QCTools report columns written to {os.path.basename(columns_path)}\n")
+    return True
+
+
+def load_columns(report_path):
+    """
+    Memory maps the columns sidecar of a report, if there is one and it matches the report (see source_matches).
+
+    Returns:
+        ReportColumns or None
+    """
+    numpy = load_numpy()
+    if numpy is None:
+        return None
+
+    columns_path, header_path = columns_paths(report_path)
+    if not (os.path.isfile(columns_path) and os.path.isfile(header_path)):
+        return None
+
+    try:
+        with open(header_path, 'r') as f:
+            header = json.load(f)
+        if header.get('version') != COLUMNS_VERSION:
+            return None
+        if not source_matches(report_path, header, header_path):
+            return None
+        data = numpy.load(columns_path, mmap_mode='r')
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring unreadable QCTools columns sidecar {os.path.basename(columns_path)}: {e}\n")
+        return None
+
+    if data.shape != (len(header['columns']), header['frame_count']):
+        return None
+    return ReportColumns(header['pkt'], header['columns'], data)
+
+
+def get_report_columns(report_path, use_cache=True, check_cancelled=None, keys=None, follow=None):
+    """
+    Returns the columns of a report, decoding it and writing the sidecar first if needed.
+
+    Parameters:
+        report_path (str): Path to the QCTools report file (.qctools.xml.gz)
+        use_cache (bool): If False, the report is always decoded and no sidecar is written.
+        check_cancelled (callable, optional): Returns True if processing has been cancelled.
+        keys (iterable, optional): The keys that will be read. When use_cache is False only these are decoded.
+        follow (callable, optional): Returns True while the report is still being written, see open_report.
+
+    Returns:
+        ReportColumns or None: None if numpy is unavailable, the report has no video frames or decoding was cancelled.
+    """
+    # a report that is still being written can't have a sidecar yet
+    if use_cache and follow is None:
+        columns = load_columns(report_path)
+        if columns is not None:
+            return columns
+    if load_numpy() is None:
+        return None
+    builder = ColumnsBuilder()
+    # the sidecar keeps every key so it can serve any later profile, without it only the needed keys are decoded
+    for pkt, frameDict in iter_report_frames(report_path, keys=None if use_cache else keys, follow=follow):
+        if check_cancelled is not None and check_cancelled():
+            return None
+        builder.feed(pkt, frameDict)
+    columns = builder.build()
+    if columns is not None and use_cache:
+        save_columns(report_path, columns)
+    return columns
+
+
+# Report index
+# Reading a time range out of a report normally means decompressing it from the start. The index records,
+# every index_spacing bytes of XML, the timestamp of a video frame and where that frame starts in the
+# decompressed report, so a reader can start at the checkpoint just before the range it wants.
+# With indexed_gzip installed, its zran checkpoints (compressed offset + the 32 KiB of history inflate
+# needs to resume there) are exported to a {report}.gzidx sidecar as well, which makes that seek O(window):
+# without it, gzip still has to decompress up to the checkpoint, but none of those frames are parsed.
+
+# Bump when the layout of the index sidecar changes
+REPORT_INDEX_VERSION = 1
+REPORT_INDEX_SUFFIX = ".index.json"
+GZIP_INDEX_SUFFIX = ".gzidx"
+index_spacing = 2**20
+# Windows starting up to this many seconds after the first frame are read from the top of the report:
+# skipping the frames before them costs less than indexing the whole report
+window_stream_seconds = 60.0
+frame_pkt_pattern = re.compile(rb'\b(pkt_.ts_time)="([^"]*)"')
+
+
+def load_indexed_gzip():
+    """Helper function to load the optional indexed_gzip package. Returns None if it isn't installed."""
+    try:
+        import indexed_gzip
+        return indexed_gzip
+    except ImportError:
+        return None
+
+
+def index_paths(report_path):
+    """Returns the paths of the index sidecar and the indexed_gzip checkpoint file for a report."""
+    return sidecar_path(report_path, REPORT_INDEX_SUFFIX), sidecar_path(report_path, GZIP_INDEX_SUFFIX)
+
+
+def build_report_index(report_path, spacing=None, check_cancelled=None):
+    """
+    Scans a report once, recording a checkpoint at the first video frame after every `spacing` bytes of XML.
+
+    Parameters:
+        report_path (str): Path to the QCTools report file (.qctools.xml.gz)
+        spacing (int, optional): Decompressed bytes between checkpoints, index_spacing if None.
+        check_cancelled (callable, optional): Returns True if processing has been cancelled.
+
+    Returns:
+        dict or None: The index header, with 'checkpoints' as [seconds, offset] pairs in report order.
+            None if the report couldn't be read or indexing was cancelled.
+    """
+    spacing = spacing or index_spacing
+    pkt = None
+    checkpoints = []
+    next_checkpoint = 0
+    base = 0        # offset of data[0] in the decompressed report
+    data = b""
+    try:
+        with open_report(report_path) as xml:
+            while True:
+                if check_cancelled is not None and check_cancelled():
+                    return None
+                chunk = xml.read(scan_chunk_size)
+                data = data + chunk
+                pos = max(0, next_checkpoint - base)
+                while pos < len(data):
+                    start = data.find(b"<frame", pos)
+                    if start < 0:
+                        pos = max(pos, len(data) - 5)
+                        break
+                    attributes_end = data.find(b">", start)
+                    if attributes_end < 0:
+                        pos = start
+                        break
+                    attributes = data[start + 6:attributes_end]
+                    if not attributes[:1].isspace() or b'media_type="video"' not in attributes:
+                        pos = attributes_end + 1    # <frames>, or not a video frame
+                        continue
+                    found = frame_pkt_pattern.search(attributes)
+                    if found is None or (pkt is not None and found.group(1).decode() != pkt):
+                        pos = attributes_end + 1
+                        continue
+                    pkt = found.group(1).decode()
+                    checkpoints.append([float(found.group(2)), base + start])
+                    next_checkpoint = base + start + spacing
+                    # skip straight to the next checkpoint, the frames in between don't need to be looked at
+                    pos = next_checkpoint - base
+                keep = min(pos, len(data))
+                base += keep
+                data = data[keep:]
+                if not chunk:
+                    break
+    except (OSError, EOFError, ValueError) as e:
+        logger.error(f"Unable to index QCTools report {os.path.basename(report_path)}: {e}\n")
+        return None
+
+    return {
+        'version': REPORT_INDEX_VERSION,
+        'source': report_identity(report_path),
+        'pkt': pkt,
+        'spacing': spacing,
+        'checkpoints': checkpoints,
+        'gzip_index': export_gzip_index(report_path, spacing)
+    }
+
+
+def export_gzip_index(report_path, spacing):
+    """
+    Builds indexed_gzip's seek points for a report and exports them to its {report}.gzidx sidecar.
+
+    Returns:
+        bool: True if the checkpoint file was written, False if indexed_gzip isn't installed or it failed.
+    """
+    indexed_gzip = load_indexed_gzip()
+    if indexed_gzip is None or is_embedded_report(report_path):
+        return False
+    gzip_index_path = index_paths(report_path)[1]
+    try:
+        with indexed_gzip.IndexedGzipFile(report_path, spacing=spacing) as report:
+            report.build_full_index()
+            report.export_index(gzip_index_path + ".tmp")
+        os.replace(gzip_index_path + ".tmp", gzip_index_path)
+    except Exception as e:
+        logger.warning(f"Unable to build gzip seek points for {os.path.basename(report_path)}: {e}\n")
+        return False
+    return True
+
+
+def save_report_index(report_path, index):
+    """
+    Writes a report index to the report's {report}.index.json sidecar.
+
+    Returns:
+        bool: True if the sidecar was written.
+    """
+    index_path = index_paths(report_path)[0]
+    try:
+        with open(index_path + ".tmp", 'w') as f:
+            json.dump(index, f)
+        os.replace(index_path + ".tmp", index_path)
+    except OSError as e:
+        logger.error(f"Unable to write QCTools report index for {os.path.basename(report_path)}: {e}\n")
+        return False
+    logger.debug(f"QCTools report index written to {os.path.basename(index_path)}\n")
+    return True
+
+
+def load_report_index(report_path):
+    """
+    Loads the index sidecar of a report, if there is one and it matches the report (see source_matches).
+
+    Returns:
+        dict or None
+    """
+    index_path = index_paths(report_path)[0]
+    if not os.path.isfile(index_path):
+        return None
+    try:
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+        if index.get('version') != REPORT_INDEX_VERSION:
+            return None
+        if not source_matches(report_path, index, index_path):
+            return None
+        index['checkpoints']
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring unreadable QCTools report index {os.path.basename(index_path)}: {e}\n")
+        return None
+    return index
+
+
+def get_report_index(report_path, use_cache=True):
+    """Returns the index of a report, building (and, if use_cache, saving) it first if needed."""
+    if use_cache:
+        index = load_report_index(report_path)
+        if index is not None:
+            return index
+    index = build_report_index(report_path)
+    if index is not None and use_cache:
+        save_report_index(report_path, index)
+    return index
+
+
+def first_frame_seconds(report_path):
+    """Returns the timestamp of the first video frame of a report, or None if it has none or can't be scanned."""
+    try:
+        with open_report(report_path, 'rt') as xml:
+            for frame in scan_frames(xml, keys=()):
+                if frame is None:
+                    return None
+                pkt, frameDict = frame
+                return float(frameDict[pkt])
+    except (OSError, EOFError, ValueError) as e:
+        logger.error(f"Unable to read QCTools report {os.path.basename(report_path)}: {e}\n")
+    return None
+
+
+@contextlib.contextmanager
+def open_report_at(report_path, offset, index=None):
+    """
+    Opens a report as binary decompressed XML, positioned at `offset`.
+
+    Uses the indexed_gzip checkpoints of the index when they are available,
+    otherwise gzip seeks by decompressing up to the offset.
+    """
+    report = None
+    if offset and index is not None and index.get('gzip_index'):
+        indexed_gzip = load_indexed_gzip()
+        gzip_index_path = index_paths(report_path)[1]
+        if indexed_gzip is not None and os.path.isfile(gzip_index_path):
+            report = indexed_gzip.IndexedGzipFile(report_path)
+            try:
+                report.import_index(gzip_index_path)
+                report.seek(offset)
+            except Exception as e:
+                report.close()
+                report = None
+                logger.warning(f"Unable to use gzip seek points for {os.path.basename(report_path)}: {e}\n")
+    if report is not None:
+        with report:
+            yield report
+        return
+    with open_report(report_path) as report:
+        report.seek(offset)
+        yield report
+
+
+def iter_report_window(report_path, durationStart, durationEnd, keys=None, use_cache=True):
+    """
+    Reads the video frames of a report from the first frame at or after durationStart,
+    up to (not including) the first frame after durationEnd.
+
+    Reading stops as soon as the window has been read. A window that starts within window_stream_seconds of
+    the first frame is read from the top of the report. Otherwise reading starts at the last index checkpoint
+    before durationStart, the index being built (and saved, if use_cache) by the first read that needs it.
+
+    Parameters:
+        report_path (str): Path to the QCTools report file (.qctools.xml.gz)
+        durationStart (float): Start of the window, in seconds.
+        durationEnd (float): End of the window, in seconds.
+        keys (iterable, optional): Only put these keys in the frameDicts (see FrameParser). All keys if None.
+        use_cache (bool): If False, no index sidecar is used or written, and the report is read from the top.
+
+    Yields:
+        tuple: (pkt, frameDict), as iter_report_frames.
+    """
+    durationStart = float(durationStart)
+    durationEnd = float(durationEnd)
+    index = load_report_index(report_path) if use_cache else None
+    if index is None and use_cache:
+        first_seconds = first_frame_seconds(report_path)
+        if first_seconds is not None and durationStart - first_seconds > window_stream_seconds:
+            index = get_report_index(report_path)
+    offset = 0
+    if index is not None:
+        for seconds, checkpoint_offset in index['checkpoints']:
+            if seconds > durationStart:
+                break
+            offset = checkpoint_offset
+
+    frames_read = 0
+    with open_report_at(report_path, offset, index) as report:
+        xml = io.TextIOWrapper(report, encoding='utf-8')
+        for frame in scan_frames(xml, keys):
+            if frame is None:
+                logger.debug(f"Unexpected content in {os.path.basename(report_path)}, reading the window with lxml\n")
+                break
+            pkt, frameDict = frame
+            seconds = float(frameDict[pkt])
+            if seconds < durationStart:
+                continue
+            if seconds > durationEnd:
+                return
+            yield frame
+            frames_read += 1
+        else:
+            return
+
+    # carry on with iterparse after the frames of the window that have been read already
+    window_index = 0
+    for pkt, frameDict in iterparse_report_frames(report_path, keys):
+        seconds = float(frameDict[pkt])
+        if seconds < durationStart:
+            continue
+        if seconds > durationEnd:
+            return
+        if window_index >= frames_read:
+            yield pkt, frameDict
+        window_index += 1
+
+
+# Merging reports
+# A report can be generated in parts, one per segment of the video (and one for the whole audio), and the parts
+# merged afterwards. The frames of the parts are merged by timestamp, as a report of the whole video has the
+# frames of its streams interleaved in time, and copied as text: only their timestamps are rewritten, if they
+# need shifting.
+frame_time_pattern = re.compile(r'\b(pkt_pts_time|pkt_dts_time|pts_time|best_effort_timestamp_time)="(-?[0-9.]+)"')
+# The timestamp frames are ordered by, the first of these in the frame's start tag
+frame_order_pattern = re.compile(r'\b(?:pkt_pts_time|pts_time|best_effort_timestamp_time)="(-?[0-9.]+)"')
+
+
+class ReportFrameTexts:
+    """
+    The <frame> elements of a report, as text, for merging.
+
+    Iterating yields (seconds, text) of each frame, text being the element and the whitespace before it.
+    A frame without a timestamp gets the one of the frame before it.
+
+    Attributes:
+        header (str or None): Everything up to and including <frames>, None if the report has no <frames>.
+        footer (str): </frames>, the whitespace before it and everything after it, once the frames have been iterated.
+        complete (bool): Whether </frames> was found.
+    """
+
+    def __init__(self, report, offset=0):
+        self.report = report
+        self.offset = offset
+        self.header = None
+        self.footer = ""
+        self.complete = False
+        text = ""
+        while True:
+            chunk = report.read(scan_chunk_size)
+            text = text + chunk
+            start = text.find("<frames>")
+            if start >= 0:
+                self.header = text[:start + 8]
+                self.text = text[start + 8:]
+                return
+            if not chunk:
+                return
+
+    def shift(self, match):
+        return f'{match.group(1)}="{float(match.group(2)) + self.offset:.6f}"'
+
+    def __iter__(self):
+        if self.header is None:
+            return
+        text = self.text
+        seconds = 0.0
+        while True:
+            start = text.find("<frame")
+            close = text.find("</frames>")
+            if close >= 0 and (start < 0 or close < start):
+                self.footer = text    # with the indent of </frames>
+                while True:
+                    chunk = self.report.read(scan_chunk_size)
+                    if not chunk:
+                        break
+                    self.footer += chunk
+                self.complete = True
+                return
+            end = -1
+            if start >= 0:
+                start_tag_end = text.find(">", start)
+                if start_tag_end >= 0:
+                    if text[start_tag_end - 1] == "/":
+                        end = start_tag_end + 1
+                    else:
+                        end = text.find("</frame>", start_tag_end)
+                        end = end + 8 if end >= 0 else -1
+            if end < 0:
+                chunk = self.report.read(scan_chunk_size)
+                if not chunk:
+                    return
+                text = text + chunk
+                continue
+            frame = text[:end]
+            text = text[end:]
+            if self.offset:
+                frame = frame_time_pattern.sub(self.shift, frame)
+            match = frame_order_pattern.search(frame, 0, frame.find(">", frame.find("<frame")))
+            if match:
+                seconds = float(match.group(1))
+            yield seconds, frame
+
+
+def merge_reports(report_paths, output_path, offsets=None):
+    """
+    Merges the reports of parts of a video into one report.
+
+    The merged report has the header (versions etc.) of the first report, then the frames of every report
+    in timestamp order, then the end of the last report. Frames with the same timestamp are in the order of
+    the reports, and of the frames within a report. It is written to a temporary file first and moved to
+    output_path once complete.
+
+    Parameters:
+        report_paths (list): Paths of the reports (.qctools.xml.gz): of consecutive segments in order, and
+            of streams reported on separately, after the segments.
+        output_path (str): Path of the merged report (.qctools.xml.gz).
+        offsets (list, optional): Seconds to add to the frame timestamps of each report,
+            for segments whose timestamps start at 0. None if they are already continuous.
+
+    Returns:
+        bool: True if the merged report was written.
+    """
+    if not report_paths:
+        return False
+    complete = False
+    try:
+        with contextlib.ExitStack() as stack:
+            reports = [
+                ReportFrameTexts(stack.enter_context(gzip.open(report_path, 'rt', encoding='utf-8')),
+                                 offset=offsets[i] if offsets else 0)
+                for i, report_path in enumerate(report_paths)
+            ]
+            merged = stack.enter_context(gzip.open(output_path + ".tmp", 'wt', encoding='utf-8', compresslevel=6))
+            if reports[0].header is not None:
+                merged.write(reports[0].header)
+                for seconds, frame in heapq.merge(*reports, key=lambda frame: frame[0]):
+                    merged.write(frame)
+            for report_path, report in zip(report_paths, reports):
+                if not report.complete:
+                    logger.error(f"Unable to merge QCTools reports: {os.path.basename(report_path)} is incomplete\n")
+                    break
+            else:
+                merged.write(reports[-1].footer)
+                complete = True
+    except (OSError, EOFError) as e:
+        logger.error(f"Unable to merge QCTools reports into {os.path.basename(output_path)}: {e}\n")
+        complete = False
+
+    if not complete:
+        if os.path.exists(output_path + ".tmp"):
+            os.remove(output_path + ".tmp")
+        return False
+    os.replace(output_path + ".tmp", output_path)
+    return True
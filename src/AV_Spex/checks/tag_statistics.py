@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Per-tag distribution statistics of a QCTools report
+# Each tag's values go through a streaming accumulator: count, min, max, mean and variance are merged
+# chunk by chunk (Chan et al.'s parallel variance), and a fixed-bin histogram gives approximate percentiles.
+# Only the accumulators are kept, never the values. Frames are accumulated in chunks of chunk_size,
+# from the decoded report columns or from frameDicts, so both give exactly the same results.
+
+import csv
+import math
+from array import array
+
+from ..utils.log_setup import logger
+from .qctools_report import load_numpy, iter_report_frames
+
+chunk_size = 4096
+histogram_bins = 1024
+percentiles = (1, 50, 99)
+
+# Histogram range of each tag, by tag name prefix. signalstats values of 10 bit video fit in 0-1024, and 8 bit in the same bins
+histogram_ranges = {
+    'HUE': (0.0, 360.0),
+    'TOUT': (0.0, 1.0),
+    'VREP': (0.0, 1.0),
+    'BRNG': (0.0, 1.0),
+    'psnr': (0.0, 100.0),
+}
+default_histogram_range = (0.0, 1024.0)
+
+statistics_fieldnames = ['Tag', 'Frames', 'Min', 'Max', 'Mean', 'Std Dev'] + [f"P{p}" for p in percentiles] + \
+    ['Histogram Low', 'Histogram High', 'Histogram']
+
+
+def histogram_range(tag):
+    """Returns the (low, high) range of a tag's histogram. Values outside it are counted in the first or last bin."""
+    for prefix, value_range in histogram_ranges.items():
+        if tag.startswith(prefix):
+            return value_range
+    return default_histogram_range
+
+
+class TagAccumulator:
+    """
+    Streaming statistics of one tag's values.
+
+    Parameters:
+        tag (str): Tag name, as in the config (fullTagList).
+    """
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.low, self.high = histogram_range(tag)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0   # sum of squared differences from the mean
+        self.min = math.inf
+        self.max = -math.inf
+        self.histogram = None
+
+    def update(self, values):
+        """Adds a chunk of values (a NumPy array, NaN where the tag is missing from a frame)."""
+        numpy = load_numpy()
+        values = values[numpy.isfinite(values)]
+        n = int(values.size)
+        if n == 0:
+            return
+        chunk_mean = float(values.mean())
+        chunk_m2 = float(((values - chunk_mean) ** 2).sum())
+        total = self.count + n
+        delta = chunk_mean - self.mean
+        self.mean = self.mean + delta * n / total
+        self.m2 = self.m2 + chunk_m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        width = (self.high - self.low) / histogram_bins
+        bins = numpy.clip(((values - self.low) / width).astype(numpy.int64), 0, histogram_bins - 1)
+        counts = numpy.bincount(bins, minlength=histogram_bins)
+        self.histogram = counts if self.histogram is None else self.histogram + counts
+
+    def percentile(self, p):
+        """Approximate p-th percentile, interpolated within its histogram bin and kept within min and max."""
+        target = self.count * p / 100
+        width = (self.high - self.low) / histogram_bins
+        seen = 0
+        for index, bin_count in enumerate(self.histogram.tolist()):
+            if bin_count and seen + bin_count >= target:
+                value = self.low + width * (index + (target - seen) / bin_count)
+                return min(max(value, self.min), self.max)
+            seen = seen + bin_count
+        return self.max
+
+    def row(self):
+        """The tag's row of the statistics CSV, or None if it was never found in the report."""
+        if self.count == 0:
+            return None
+        std = math.sqrt(self.m2 / self.count)
+        return [self.tag, self.count, self.min, self.max, round(self.mean, 6), round(std, 6)] + \
+            [round(self.percentile(p), 6) for p in percentiles] + \
+            [self.low, self.high, ' '.join(str(bin_count) for bin_count in self.histogram.tolist())]
+
+
+class TagStatistics:
+    """
+    Streaming statistics of every tag, fed whole report columns (update_columns) or one frameDict at a time (feed).
+
+    Parameters:
+        tags (list): (tag, key) for each tag: its name in the config and its frameDict key.
+    """
+
+    done = False   # as a frame by frame analysis, it reads every frame of the report
+
+    def __init__(self, tags):
+        self.tags = list(tags)
+        self.accumulators = [TagAccumulator(tag) for tag, key in self.tags]
+        self.buffers = [array('d') for tag in self.tags]
+
+    def update_columns(self, columns, check_cancelled=None):
+        """Adds every frame of a ReportColumns, chunk_size frames at a time."""
+        for (tag, key), accumulator in zip(self.tags, self.accumulators):
+            if check_cancelled is not None and check_cancelled():
+                return
+            if key not in columns:
+                continue
+            column = columns[key]
+            for start in range(0, columns.frame_count, chunk_size):
+                accumulator.update(column[start:start + chunk_size])
+
+    def feed(self, frameDict):
+        for (tag, key), buffer in zip(self.tags, self.buffers):
+            try:
+                buffer.append(float(frameDict[key]))
+            except (KeyError, ValueError):
+                buffer.append(math.nan)
+        if len(self.buffers[0]) >= chunk_size:
+            self.flush()
+
+    def flush(self):
+        numpy = load_numpy()
+        for accumulator, buffer in zip(self.accumulators, self.buffers):
+            if buffer:
+                accumulator.update(numpy.frombuffer(buffer, dtype=numpy.float64))
+            del buffer[:]
+
+    def finish(self):
+        """Adds the frames fed since the last full chunk."""
+        if self.buffers:
+            self.flush()
+
+    def write_csv(self, output_path):
+        with open(output_path, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(statistics_fieldnames)
+            for accumulator in self.accumulators:
+                row = accumulator.row()
+                if row is not None:
+                    writer.writerow(row)
+
+
+def report_tag_statistics(startObj, tags, check_cancelled=None):
+    """
+    Reads a QCTools report and returns the TagStatistics of its tags.
+
+    Parameters:
+        startObj (str): Path to the QCTools report file (.qctools.xml.gz or .qctools.mkv)
+        tags (list): (tag, key) for each tag, see TagStatistics.
+        check_cancelled (callable, optional): Returns True if processing has been cancelled.
+
+    Returns:
+        TagStatistics or None: None if numpy is unavailable or it was cancelled.
+    """
+    if load_numpy() is None:
+        logger.error("Cannot compute qct-parse tag statistics without numpy\n")
+        return None
+    statistics = TagStatistics(tags)
+    for frame_pkt, frameDict in iter_report_frames(startObj, keys=[key for tag, key in tags]):
+        if check_cancelled is not None and check_cancelled():
+            return None
+        statistics.feed(frameDict)
+    statistics.finish()
+    return statistics
@@ -277,6 +277,11 @@ class ChecksWindow(QWidget, ThemeableMixin):
         thumb_export_desc = QLabel("Export thumbnails of failed frames for review")
         thumb_export_desc.setIndent(20)
 
+        self.tag_statistics_cb = QCheckBox("Tag Statistics")
+        self.tag_statistics_cb.setStyleSheet("font-weight: bold;")
+        tag_statistics_desc = QLabel("Summarize the distribution of every QCTools tag")
+        tag_statistics_desc.setIndent(20)
+
         # Content Filter
         content_filter_label = QLabel("Content Detection")
         content_filter_label.setStyleSheet("font-weight: bold;")
@@ -306,7 +311,8 @@ class ChecksWindow(QWidget, ThemeableMixin):
             "Default Profile": "default",
             "High Tolerance": "highTolerance",
             "Medium Tolerance": "midTolerance",
-            "Low Tolerance": "lowTolerance"
+            "Low Tolerance": "lowTolerance",
+            "All Profiles": "all"
         }
 
         # Add items with display text and corresponding data value
@@ -322,6 +328,8 @@ class ChecksWindow(QWidget, ThemeableMixin):
         qct_layout.addWidget(evaluate_bars_desc)
         qct_layout.addWidget(self.thumb_export_cb)
         qct_layout.addWidget(thumb_export_desc)
+        qct_layout.addWidget(self.tag_statistics_cb)
+        qct_layout.addWidget(tag_statistics_desc)
         qct_layout.addWidget(content_filter_label)
         qct_layout.addWidget(content_filter_desc)
         qct_layout.addWidget(self.content_filter_combo)
@@ -434,6 +442,9 @@ class ChecksWindow(QWidget, ThemeableMixin):
         self.thumb_export_cb.stateChanged.connect(
             lambda state: self.on_boolean_changed(state, ['tools', 'qct_parse', 'thumbExport'])
         )
+        self.tag_statistics_cb.stateChanged.connect(
+            lambda state: self.on_boolean_changed(state, ['tools', 'qct_parse', 'tagStatistics'])
+        )
         self.content_filter_combo.currentIndexChanged.connect(
             lambda index: self.on_qct_combo_changed(self.content_filter_combo.itemData(index), 'contentFilter')
         )
@@ -495,6 +506,7 @@ class ChecksWindow(QWidget, ThemeableMixin):
         self.bars_detection_cb.setChecked(qct.barsDetection)
         self.evaluate_bars_cb.setChecked(qct.evaluateBars)
         self.thumb_export_cb.setChecked(qct.thumbExport)
+        self.tag_statistics_cb.setChecked(qct.tagStatistics)
         
         if qct.contentFilter:
             self.content_filter_combo.setCurrentText(qct.contentFilter[0])
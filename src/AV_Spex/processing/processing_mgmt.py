@@ -1,22 +1,30 @@
+import concurrent.futures
+import gzip
 import os
 import shutil
 import subprocess
+import threading
 import time
+import zlib
+
+from lxml import etree
 
 from ..processing import run_tools
+from ..processing.qctools_segments import run_segmented_qctools
 from ..utils import dir_setup
 from ..utils.log_setup import logger
 from ..utils.config_setup import ChecksConfig, SpexConfig
 from ..utils.config_manager import ConfigManager
 from ..utils.generate_report import generate_final_report
-from ..checks.fixity_check import check_fixity, output_fixity
+from ..checks.fixity_check import check_fixity, output_fixity, clear_file_digests
 from ..checks.mediainfo_check import parse_mediainfo
 from ..checks.mediatrace_check import parse_mediatrace, create_metadata_difference_report
 from ..checks.exiftool_check import parse_exiftool
 from ..checks.ffprobe_check import parse_ffprobe
-from ..checks.embed_fixity import validate_embedded_md5, process_embedded_fixity
+from ..checks.embed_fixity import validate_embedded_md5, process_embedded_fixity, stream_fixity_writes_tags
 from ..checks.make_access import process_access_file
 from ..checks.qct_parse import run_qctparse
+from ..checks.qctools_report import read_signalstats
 from ..checks.mediaconch_check import find_mediaconch_policy, run_mediaconch_command, parse_mediaconch_output
 
 
@@ -24,15 +32,60 @@ config_mgr = ConfigManager()
 checks_config = config_mgr.get_config('checks', ChecksConfig)
 spex_config = config_mgr.get_config('spex', SpexConfig)
 
+class FixityProgress:
+    """
+    Signals for the stream hashes and the file checksum while they run at the same time.
+
+    Both report to the same progress bar, so the progress of each is averaged with the other's and the average is
+    emitted on its own signal (stream_hash_progress or md5_progress). Every other signal is passed through.
+    """
+
+    def __init__(self, signals):
+        self.signals = signals
+        self.percentages = {'stream_hash_progress': 0, 'md5_progress': 0}
+        self.lock = threading.Lock()
+        self.stream_hash_progress = ProgressRelay(self, 'stream_hash_progress')
+        self.md5_progress = ProgressRelay(self, 'md5_progress')
+
+    def __getattr__(self, name):
+        return getattr(self.signals, name)
+
+    def update(self, name, percentage):
+        with self.lock:
+            self.percentages[name] = percentage
+            merged = sum(self.percentages.values()) // len(self.percentages)
+        getattr(self.signals, name).emit(merged)
+
+
+class ProgressRelay:
+    """A progress signal of FixityProgress, emit() reports the progress of one of the two."""
+
+    def __init__(self, progress, name):
+        self.progress = progress
+        self.name = name
+
+    def emit(self, percentage):
+        self.progress.update(self.name, percentage)
+
+
 class ProcessingManager:
     def __init__(self, signals=None, check_cancelled_fn=None):
         self.signals = signals
         self.check_cancelled = check_cancelled_fn or (lambda: False)
+        # checksums are shared by the steps of this run only
+        clear_file_digests()
 
     def process_fixity(self, source_directory, video_path, video_id):
         """
         Orchestrates the entire fixity process, including embedded and file-level operations.
 
+        The stream hashes (an ffmpeg decode of the whole file, CPU bound) and the file checksum (a read of the
+        whole file, I/O bound) run at the same time, on their own threads, unless the stream fixity step may write
+        tags into the MKV, in which case the file checksum has to wait for the file to be final.
+        While both read the file, the file checksum keeps the pages it reads in the page cache for ffmpeg,
+        instead of dropping them and making the file be read from disk twice.
+        Cancelling, or either side failing, stops both.
+
         Args:
             source_directory (str): Directory containing source files
             video_path (str): Path to the video file
@@ -41,53 +94,92 @@ class ProcessingManager:
         
         if self.check_cancelled():
             return None
-        
+
+        fixity = checks_config.fixity
+        stream_fixity = fixity.embed_stream_fixity == 'yes' or fixity.validate_stream_fixity == 'yes'
+        file_fixity = fixity.output_fixity == 'yes' or fixity.check_fixity == 'yes'
+
+        if not (stream_fixity and file_fixity) or stream_fixity_writes_tags(video_path):
+            self.process_stream_fixity(video_path, self.check_cancelled, self.signals)
+            if self.check_cancelled():
+                return None
+            self.process_file_fixity(source_directory, video_path, video_id, self.check_cancelled, self.signals)
+            if self.check_cancelled():
+                return None
+            return
+
+        logger.debug('Generating stream hashes and file checksum at the same time\n')
+        stopped = threading.Event()
+        check_cancelled = lambda: stopped.is_set() or self.check_cancelled()
+        signals = FixityProgress(self.signals) if self.signals else None
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix='fixity') as pool:
+            futures = [
+                pool.submit(self.process_stream_fixity, video_path, check_cancelled, signals),
+                pool.submit(self.process_file_fixity, source_directory, video_path, video_id, check_cancelled, signals, drop_cache=False)
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                if future.exception() is not None:
+                    # stop the other one before the exception is raised
+                    stopped.set()
+            for future in futures:
+                future.result()
+
+        if self.check_cancelled():
+            return None
+
+    def process_stream_fixity(self, video_path, check_cancelled, signals):
+        """Embeds or validates the stream hashes of the MKV, as set in the fixity config."""
         # Embed stream fixity if required  
         if checks_config.fixity.embed_stream_fixity == 'yes':
-            if self.signals:
-                self.signals.fixity_progress.emit("Embedding fixity...")
-            if self.check_cancelled():
+            if signals:
+                signals.fixity_progress.emit("Embedding fixity...")
+            if check_cancelled():
                 return False
-            process_embedded_fixity(video_path, check_cancelled=self.check_cancelled, signals=self.signals)
-            if self.check_cancelled():
+            process_embedded_fixity(video_path, check_cancelled=check_cancelled, signals=signals)
+            if check_cancelled():
                 return False
             # Mark checkbox
-            if self.signals:
-                self.signals.step_completed.emit("Embed Stream Fixity")
+            if signals:
+                signals.step_completed.emit("Embed Stream Fixity")
 
         # Validate stream hashes if required
         if checks_config.fixity.validate_stream_fixity == 'yes':
-            if self.signals:
-                self.signals.fixity_progress.emit("Validating embedded fixity...")
+            if signals:
+                signals.fixity_progress.emit("Validating embedded fixity...")
             if checks_config.fixity.embed_stream_fixity == 'yes':
                 logger.critical("Embed stream fixity is turned on, which overrides validate_fixity. Skipping validate_fixity.\n")
             else:
-                validate_embedded_md5(video_path, check_cancelled=self.check_cancelled, signals=self.signals)
+                validate_embedded_md5(video_path, check_cancelled=check_cancelled, signals=signals)
             # Mark checkbox
-            if self.signals:
-                self.signals.step_completed.emit("Validate Stream Fixity")
+            if signals:
+                signals.step_completed.emit("Validate Stream Fixity")
 
+    def process_file_fixity(self, source_directory, video_path, video_id, check_cancelled, signals, drop_cache=True):
+        """
+        Writes and/or validates the checksum of the whole MKV file, as set in the fixity config.
+        drop_cache is passed on to fixity_check.get_file_digests.
+        """
         # Initialize md5_checksum variable
         md5_checksum = None
 
         # Create checksum for video file and output results
         if checks_config.fixity.output_fixity == 'yes':
-            if self.signals:
-                self.signals.fixity_progress.emit("Outputting fixity...")
-            md5_checksum = output_fixity(source_directory, video_path, check_cancelled=self.check_cancelled, signals=self.signals)
-            if self.signals:
-                self.signals.step_completed.emit("Output Fixity")
+            if signals:
+                signals.fixity_progress.emit("Outputting fixity...")
+            md5_checksum = output_fixity(source_directory, video_path, check_cancelled=check_cancelled, signals=signals, drop_cache=drop_cache)
+            if signals:
+                signals.step_completed.emit("Output Fixity")
+
+        if check_cancelled():
+            return None
 
         # Verify stored checksum and write results  
         if checks_config.fixity.check_fixity == 'yes':
-            if self.signals:
-                self.signals.fixity_progress.emit("Validating fixity...")
-            check_fixity(source_directory, video_id, actual_checksum=md5_checksum, check_cancelled=self.check_cancelled, signals=self.signals)
-            if self.signals:
-                self.signals.step_completed.emit("Validate Fixity")
-
-        if self.check_cancelled():
-            return None
+            if signals:
+                signals.fixity_progress.emit("Validating fixity...")
+            check_fixity(source_directory, video_id, actual_checksum=md5_checksum, check_cancelled=check_cancelled, signals=signals, drop_cache=drop_cache)
+            if signals:
+                signals.step_completed.emit("Validate Fixity")
 
 
     def validate_video_with_mediaconch(self, video_path, destination_directory, video_id):
@@ -293,9 +385,31 @@ def process_qctools_output(video_path, source_directory, destination_directory,
     if check_cancelled():
             return None
 
+    if checks_config.tools.qctools.run_tool == 'yes' and checks_config.tools.qctools.engine == 'signalstats':
+        if checks_config.tools.qct_parse.run_tool != 'yes':
+            logger.warning("QCTools engine is set to signalstats, which writes no report: nothing to do without QCT Parse\n")
+            return results
+        if not report_directory:
+            report_directory = dir_setup.make_report_dir(source_directory, video_id)
+        return run_signalstats_qctparse(video_path, qctools_output_path, report_directory, results, check_cancelled=check_cancelled, signals=signals)
+
+    # Parse the report while qcli is writing it, unless a report from an earlier run is in the way
+    # (qct-parse couldn't tell it apart from the new one), the report is embedded in a .qctools.mkv
+    # or it is generated in segments
+    segmented = checks_config.tools.qctools.segments > 1 and not qctools_output_path.lower().endswith('mkv')
+    if (checks_config.tools.qctools.run_tool == 'yes' and checks_config.tools.qct_parse.run_tool == 'yes'
+            and checks_config.tools.qctools.live_qct_parse == 'yes' and not segmented
+            and not qctools_output_path.lower().endswith('mkv') and not os.path.exists(qctools_output_path)):
+        if not report_directory:
+            report_directory = dir_setup.make_report_dir(source_directory, video_id)
+        return run_live_qctparse(video_path, qctools_output_path, report_directory, results, check_cancelled=check_cancelled, signals=signals)
+
     # Run QCTools command
     if checks_config.tools.qctools.run_tool == 'yes':
-        run_qctools_command('qcli -i', video_path, '-o', qctools_output_path, check_cancelled=check_cancelled)
+        if segmented:
+            run_segmented_qctools(video_path, qctools_output_path, checks_config.tools.qctools.segments, check_cancelled=check_cancelled)
+        else:
+            run_qctools_command('qcli -i', video_path, '-o', qctools_output_path, check_cancelled=check_cancelled)
         logger.debug('')  # Add new line for cleaner terminal output
         results['qctools_output_path'] = qctools_output_path
         if signals:
@@ -319,25 +433,98 @@ def process_qctools_output(video_path, source_directory, destination_directory,
 
     return results
 
-def run_qctools_command(command, input_path, output_type, output_path, check_cancelled=None):
+def run_live_qctparse(video_path, qctools_output_path, report_directory, results, check_cancelled=None, signals=None):
+    """
+    Runs qcli and qct-parse at the same time, qct-parse analyzing the report as qcli writes it.
+
+    qct-parse finishes shortly after qcli does, instead of starting once qcli has finished.
+
+    Args:
+        video_path (str): Path to the input video file
+        qctools_output_path (str): Path qcli writes the report to
+        report_directory (str): Directory to save reports
+        results (dict): Results of process_qctools_output, updated with the report path
+
+    Returns:
+        dict: Processing results and paths, or None if cancelled
+    """
+    process = start_qctools_command('qcli -i', video_path, '-o', qctools_output_path)
+
+    def qctools_running():
+        # stop following the report if processing is cancelled, so qct-parse doesn't wait for qcli
+        return process.poll() is None and not check_cancelled()
+
+    try:
+        run_qctparse(video_path, qctools_output_path, report_directory, check_cancelled=check_cancelled, follow=qctools_running)
+    except (EOFError, gzip.BadGzipFile, zlib.error, etree.XMLSyntaxError):
+        # the report ended before it was complete, or is corrupt: qcli failed or was stopped
+        if not check_cancelled():
+            logger.critical(f"QCTools report {os.path.basename(qctools_output_path)} is incomplete, qcli may have failed\n")
+    finally:
+        if process.poll() is None:
+            stop_process(process)
+
     if check_cancelled():
         return None
-    
+    logger.debug('')  # Add new line for cleaner terminal output
+    results['qctools_output_path'] = qctools_output_path
+    if signals:
+        signals.step_completed.emit("QCTools")
+        signals.step_completed.emit("QCT Parse")
+    return results
+
+def run_signalstats_qctparse(video_path, qctools_output_path, report_directory, results, check_cancelled=None, signals=None):
+    """
+    Runs qct-parse on frame stats from ffmpeg's signalstats filter, without writing a QCTools report.
+
+    Args:
+        video_path (str): Path to the input video file
+        qctools_output_path (str): Where the QCTools report would be, used to name qct-parse outputs
+        report_directory (str): Directory to save reports
+        results (dict): Results of process_qctools_output
+
+    Returns:
+        dict: Processing results and paths, or None if cancelled
+    """
+    columns = read_signalstats(video_path, check_cancelled=check_cancelled)
+    if check_cancelled():
+        return None
+    if columns is None:
+        logger.critical(f"Unable to check {os.path.basename(video_path)}: no signalstats were generated\n")
+        return results
+    if signals:
+        signals.step_completed.emit("QCTools")
+
+    run_qctparse(video_path, qctools_output_path, report_directory, check_cancelled=check_cancelled, columns=columns)
+    if signals:
+        signals.step_completed.emit("QCT Parse")
+    return results
+
+def start_qctools_command(command, input_path, output_type, output_path):
     env = os.environ.copy()
     env['PATH'] = '/usr/local/bin:' + env.get('PATH', '')
 
     full_command = f"{command} \"{input_path}\" {output_type} {output_path}"
     logger.debug(f'Running command: {full_command}\n')
     
-    process = subprocess.Popen(full_command, shell=True, env=env)
+    return subprocess.Popen(full_command, shell=True, env=env)
+
+def stop_process(process):
+    process.terminate()  # Send SIGTERM
+    try:
+        process.wait(timeout=5)  # Wait up to 5 seconds for graceful termination
+    except subprocess.TimeoutExpired:
+        process.kill()  # Force kill if process doesn't terminate
+
+def run_qctools_command(command, input_path, output_type, output_path, check_cancelled=None):
+    if check_cancelled():
+        return None
+    
+    process = start_qctools_command(command, input_path, output_type, output_path)
     
     while process.poll() is None:  # While process is running
         if check_cancelled():
-            process.terminate()  # Send SIGTERM
-            try:
-                process.wait(timeout=5)  # Wait up to 5 seconds for graceful termination
-            except subprocess.TimeoutExpired:
-                process.kill()  # Force kill if process doesn't terminate
+            stop_process(process)
             return None
         time.sleep(1)  # Check cancel status every 0.5 seconds
     
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Generating a QCTools report in segments
+# qcli works through a video on a single core, and has no option to report on part of a video, so it can't be
+# run per segment. Instead, the video is split into time segments, the report of each segment is generated by
+# its own ffprobe process running the filters qcli runs (qctools_video_filters and qctools_audio_filters,
+# copied from QCTools: they have to be kept in step with the QCTools release the reports are compared with),
+# and the segment reports are merged into one report.
+# Some video filters carry state from frame to frame (YDIF compares with the previous frame, cropdetect skips
+# its first frames, idet counts over the frames before and looks at the next one). Each segment is filtered
+# from overlap seconds before it to overlap seconds after it, and the frames outside it are dropped once they
+# have been through the filters, so the frames at its ends get the values they get in a report of the whole
+# video. ebur128 averages over the whole program and passes audio on in frames of its own, so the audio isn't
+# split: its report is generated from the whole video by one more ffprobe process, alongside the segments.
+# Every frame keeps its timestamp in the video, and the reports are merged in timestamp order, video before
+# audio at the same timestamp as ffprobe outputs them, so the merged report has the same frames in the same
+# order as a report of the whole video.
+
+import concurrent.futures
+import gzip
+import json
+import os
+import subprocess
+
+from ..utils.log_setup import logger
+from ..checks.qctools_report import merge_reports
+
+# Filters QCTools runs, https://bavc.org/programs/preservation/preservation-tools/
+qctools_video_filters = "signalstats=stat=tout+vrep+brng,cropdetect=reset=1:round=1,idet=half_life=1,split[a][b];[a]field=top[a1];[b]field=bottom,split[b1][b2];[a1][b1]psnr[c1];[c1][b2]ssim"
+qctools_audio_filters = "ebur128=metadata=1,astats=metadata=1:reset=1:length=0.4"
+
+# Seconds filtered before and after each segment and dropped: idet's counts halve every frame (half_life=1),
+# after a second of frames nothing is left of the frames before
+overlap = 1.0
+
+
+def escape_filter_value(value, special):
+    """Backslash escapes the characters in `special`, see 'Notes on filtergraph escaping' in the ffmpeg docs."""
+    return ''.join('\\' + character if character in special else character for character in value)
+
+
+def get_segment_source(video_path):
+    """
+    Returns the duration of a video in seconds and whether it has audio, from ffprobe.
+
+    Returns:
+        tuple: (duration, has_audio), or (None, False) if ffprobe couldn't read the video.
+    """
+    command = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration:stream=codec_type', '-of', 'json', video_path]
+    try:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+        probe = json.loads(result.stdout)
+        duration = float(probe['format']['duration'])
+    except (OSError, subprocess.CalledProcessError, ValueError, KeyError) as e:
+        logger.error(f"Unable to get the duration of {os.path.basename(video_path)}: {e}\n")
+        return None, False
+    has_audio = any(stream.get('codec_type') == 'audio' for stream in probe.get('streams', []))
+    return duration, has_audio
+
+
+def movie_filter_path(video_path):
+    """The path of a video as an option of the movie filter, inside a filtergraph: it is escaped for both."""
+    return escape_filter_value(escape_filter_value(video_path.replace('\\', '/'), "\\':"), "\\'[],;")
+
+
+def segment_filtergraph(video_path, start, end):
+    """
+    The lavfi graph that reads one segment of a video and runs the QCTools video filters on it.
+
+    start and end are in seconds, end is None for the last segment. trim keeps the frames' timestamps.
+    The frames from overlap seconds before start to overlap seconds after end go through the filters
+    (idet compares each frame with the next one too), the ones outside the segment are dropped after them.
+    """
+    overlap_start = max(0, round(start - overlap, 6))
+    trim = f"start={overlap_start}" if end is None else f"start={overlap_start}:end={round(end + overlap, 6)}"
+    graph = f"movie={movie_filter_path(video_path)}:s=dv:seek_point={overlap_start}[in0];[in0]trim={trim},{qctools_video_filters}"
+    if overlap_start != start or end is not None:
+        graph += f",trim=start={start}" if end is None else f",trim=start={start}:end={end}"
+    return graph + "[out0]"
+
+
+def audio_filtergraph(video_path):
+    """
+    The lavfi graph that runs the QCTools audio filters on the whole audio of a video.
+
+    An empty video output comes first, so the audio frames have stream_index 1, as in a report of the whole video.
+    """
+    return f"nullsrc=d=0[out0];amovie={movie_filter_path(video_path)}:s=da,{qctools_audio_filters}[out1]"
+
+
+def generate_segment_report(segment_path, graph, check_cancelled=None):
+    """
+    Generates the QCTools report of a lavfi graph with ffprobe, gzipping it to segment_path.
+
+    Returns:
+        bool: True if the report was written, False if ffprobe failed or it was cancelled.
+    """
+    command = ['ffprobe', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i', graph,
+               '-show_frames', '-show_versions', '-of', 'xml=x=1:q=1', '-noprivate']
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        with gzip.open(segment_path, 'wb', compresslevel=6) as segment:
+            for chunk in iter(lambda: process.stdout.read(2**20), b''):
+                if check_cancelled is not None and check_cancelled():
+                    return False
+                segment.write(chunk)
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        returncode = process.wait()
+    return returncode == 0
+
+
+def run_segmented_qctools(video_path, output_path, segments, check_cancelled=None):
+    """
+    Generates the QCTools report of a video in `segments` parallel parts, merged into output_path.
+
+    Parameters:
+        video_path (str): Path to the input video file
+        output_path (str): Path of the QCTools report (.qctools.xml.gz)
+        segments (int): Number of segments the video is split into. They run at most one per CPU core at a time.
+        check_cancelled (callable, optional): Returns True if processing has been cancelled.
+
+    Returns:
+        str or None: output_path, or None if the report could not be generated or it was cancelled.
+    """
+    if check_cancelled is None:
+        check_cancelled = lambda: False
+
+    duration, has_audio = get_segment_source(video_path)
+    if duration is None:
+        return None
+
+    bounds = [round(duration * i / segments, 6) for i in range(segments)] + [None]
+    # the audio report first, so it doesn't wait for a free core and hold up the merge
+    graphs = [audio_filtergraph(video_path)] if has_audio else []
+    graphs += [segment_filtergraph(video_path, bounds[i], bounds[i + 1]) for i in range(segments)]
+    segment_paths = [f"{output_path}.part{i}.xml.gz" for i in range(len(graphs))]
+    logger.info(f"Generating QCTools report of {os.path.basename(video_path)} in {segments} segments\n")
+
+    try:
+        # the work is done by the ffprobe processes, the threads only gzip what they print
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(graphs), os.cpu_count() or 1)) as pool:
+            futures = [pool.submit(generate_segment_report, segment_paths[i], graphs[i], check_cancelled) for i in range(len(graphs))]
+            generated = all([future.result() for future in futures])
+        if check_cancelled():
+            return None
+        if not generated:
+            logger.critical(f"Unable to generate the QCTools report of {os.path.basename(video_path)}: ffprobe failed\n")
+            return None
+        # the audio report last, so video frames come first at the same timestamp
+        if not merge_reports(segment_paths[1:] + segment_paths[:1] if has_audio else segment_paths, output_path):
+            return None
+    finally:
+        for segment_path in segment_paths:
+            if os.path.exists(segment_path):
+                os.remove(segment_path)
+
+    logger.debug(f"QCTools report written to {os.path.basename(output_path)}\n")
+    return output_path
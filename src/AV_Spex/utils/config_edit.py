@@ -335,7 +335,8 @@ profile_step2 = {
             "contentFilter": [],
             "profile": [],
             "tagname": None,
-            "thumbExport": True
+            "thumbExport": True,
+            "tagStatistics": False
         }
     },
     "outputs": {
@@ -384,7 +385,8 @@ profile_allOff = {
             "contentFilter": [],
             "profile": [],
             "tagname": None,
-            "thumbExport": False
+            "thumbExport": False,
+            "tagStatistics": False
         }
     },
     "outputs": {
@@ -47,6 +47,15 @@ class ConfigManager:
             
         return cls._instance
 
+    def get_user_config_dir(self) -> str:
+        """
+        Get the user config directory, where saved configs and user files are kept
+
+        Returns:
+            str: Path to the user config directory
+        """
+        return self._user_config_dir
+
     def get_logo_path(self, logo_filename: str) -> Optional[str]:
         """
         Get the full path for a logo file in the bundled logo_image_files directory
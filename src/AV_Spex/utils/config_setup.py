@@ -301,6 +301,8 @@ class FixityConfig:
     embed_stream_fixity: str
     output_fixity: str
     overwrite_stream_fixity: str
+    checksum_algorithms: List[str] = field(default_factory=lambda: ['md5'])
+    cache_max_age_days: int = 30
 
 # Tool-specific configurations
 @dataclass
@@ -311,6 +313,9 @@ class BasicToolConfig:
 @dataclass
 class QCToolsConfig:
     run_tool: str
+    live_qct_parse: str = "no"
+    engine: str = "qcli"
+    segments: int = 1
 
 @dataclass
 class MediaConchConfig:
@@ -326,6 +331,7 @@ class QCTParseToolConfig:
     profile: List[str]
     tagname: Optional[str]
     thumbExport: bool
+    tagStatistics: bool = False
 
 @dataclass
 class ToolsConfig:
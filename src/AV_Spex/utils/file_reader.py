@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Reading large files from start to end at disk speed
+# A background thread reads the next block into a preallocated buffer while the caller works on the current one.
+# hashlib releases the GIL while it hashes a block, so reading and hashing overlap instead of taking turns.
+# The kernel is told the file is read sequentially (larger read-ahead), and that the pages already read
+# won't be needed again, so reading a 150 GB capture doesn't push everything else out of the page cache.
+
+import os
+import queue
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Size of each read, and the number of buffers: one being read into while the caller has the other
+block_size = 2**22
+buffer_count = 2
+# Minimum number of seconds between progress callbacks
+progress_interval = 0.1
+
+
+def advise_sequential(fd):
+    """Asks for aggressive read-ahead on fd, where the OS supports it."""
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+
+def advise_done(fd, offset, length):
+    """Tells the OS the pages of fd from offset to offset + length won't be read again."""
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(fd, offset, length, os.POSIX_FADV_DONTNEED)
+
+
+def disable_cache(fd):
+    """macOS has no posix_fadvise, F_NOCACHE keeps the reads of fd out of the cache instead."""
+    if fcntl is not None and hasattr(fcntl, 'F_NOCACHE'):
+        fcntl.fcntl(fd, fcntl.F_NOCACHE, 1)
+
+
+class BlockReader:
+    """
+    Reads a file block by block, reading ahead on a background thread.
+
+    Iterating yields a memoryview of each block. The view is only valid until the next block is requested,
+    its buffer is then reused for reading, so copy anything that has to be kept.
+    Use it as a context manager, leaving the with block stops the reading thread even if the file wasn't read to the end.
+
+    Parameters:
+        path (str): Path to the file
+        block_size (int): Bytes per block.
+        progress (callable, optional): Called with (bytes read, file size), at most every progress_interval seconds,
+            and once more after the last block.
+        drop_cache (bool): Drop the pages that have been read from the page cache. Turn it off if another
+            process is reading the same file at the same time.
+    """
+
+    def __init__(self, path, block_size=block_size, progress=None, drop_cache=True):
+        self.path = path
+        self.block_size = block_size
+        self.progress = progress
+        self.drop_cache = drop_cache
+        self.total_size = os.path.getsize(path)
+        self.bytes_read = 0
+        self.free_buffers = queue.Queue()
+        self.full_buffers = queue.Queue()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def __enter__(self):
+        for _ in range(buffer_count):
+            self.free_buffers.put(bytearray(self.block_size))
+        self.thread = threading.Thread(target=self.read_ahead, name=f"read-ahead {os.path.basename(self.path)}", daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stopped.set()
+        self.free_buffers.put(None)   # wakes the thread if it is waiting for a buffer
+        self.thread.join()
+        return False
+
+    def read_ahead(self):
+        error = None
+        try:
+            with open(self.path, 'rb', buffering=0) as file_object:
+                fd = file_object.fileno()
+                advise_sequential(fd)
+                if self.drop_cache:
+                    disable_cache(fd)
+                offset = 0
+                while not self.stopped.is_set():
+                    buffer = self.free_buffers.get()
+                    if buffer is None:
+                        return
+                    length = file_object.readinto(buffer)
+                    if not length:
+                        return
+                    if self.drop_cache:
+                        advise_done(fd, offset, length)
+                    self.full_buffers.put((buffer, length))
+                    offset += length
+        except BaseException as e:
+            error = e
+        finally:
+            # whatever ends the reading, __iter__ is told, so it never waits for a block that won't come
+            self.full_buffers.put((error, 0))
+
+    def __iter__(self):
+        last_progress = time.monotonic()
+        while True:
+            buffer, length = self.full_buffers.get()
+            if isinstance(buffer, BaseException):
+                raise buffer
+            if not length:
+                break
+            self.bytes_read += length
+            yield memoryview(buffer)[:length]
+            self.free_buffers.put(buffer)
+            if self.progress is not None and time.monotonic() - last_progress >= progress_interval:
+                last_progress = time.monotonic()
+                self.progress(self.bytes_read, self.total_size)
+        if self.progress is not None:
+            self.progress(self.bytes_read, self.total_size)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Checksums kept between runs
+# Re-running AV Spex on a directory doesn't need to read unchanged multi-GB files again to get their checksums.
+# Digests (file checksums and stream hashes) are stored in an SQLite database in the user config directory,
+# keyed by the identity of the file: device, inode, size and modification time. The inode change time
+# is stored with them, it can't be set back like the modification time, so a file that was written to
+# and had its modification time restored doesn't match either. Cached digests older than
+# cache_max_age_days in the fixity config are calculated again, and --force-rehash ignores the cache.
+# Validating fixity (check_fixity, stream hash validation) never uses the cache: decayed content leaves the
+# identity of the file unchanged, only reading the file finds it.
+
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+from ..utils.log_setup import logger
+from ..utils.config_setup import ChecksConfig
+from ..utils.config_manager import ConfigManager
+
+config_mgr = ConfigManager()
+checks_config = config_mgr.get_config('checks', ChecksConfig)
+
+cache_path = os.path.join(config_mgr.get_user_config_dir(), 'fixity_cache.sqlite3')
+
+# Set with --force-rehash: cached digests aren't used, the new ones replace them
+force_rehash = False
+
+schema = """
+CREATE TABLE IF NOT EXISTS digests (
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    ctime_ns INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    path TEXT NOT NULL,
+    calculated REAL NOT NULL,
+    PRIMARY KEY (device, inode, size, mtime_ns, name)
+)
+"""
+
+
+def file_identity(path):
+    """Returns (device, inode, size, mtime_ns) and the inode change time of the file at path."""
+    stat = os.stat(path)
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns), stat.st_ctime_ns
+
+
+def max_age_seconds():
+    """How old a cached digest may be, in seconds, or None if the cache is turned off (cache_max_age_days is 0)."""
+    max_age_days = checks_config.fixity.cache_max_age_days
+    if not max_age_days or max_age_days <= 0:
+        return None
+    return max_age_days * 86400
+
+
+def connect():
+    connection = sqlite3.connect(cache_path, timeout=30)
+    connection.execute(schema)
+    return connection
+
+
+def get_cached_digests(path, names):
+    """
+    Returns the cached digests of the file at path, for each of names that has one.
+
+    Parameters:
+        path (str): Path to the file
+        names (list): Digest names, hashlib algorithm names for file checksums (see fixity_check.get_file_digests),
+            or the stream hash names (see embed_fixity.get_stream_hashes).
+
+    Returns:
+        dict: Digest by name. Empty if the cache is off, --force-rehash was given, or the file has changed.
+    """
+    max_age = max_age_seconds()
+    if force_rehash or max_age is None:
+        return {}
+    try:
+        identity, ctime_ns = file_identity(path)
+        with closing(connect()) as connection:
+            rows = connection.execute(
+                "SELECT name, digest FROM digests WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ? "
+                f"AND ctime_ns = ? AND calculated >= ? AND name IN ({', '.join('?' for name in names)})",
+                (*identity, ctime_ns, time.time() - max_age, *names)
+            ).fetchall()
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Unable to read the fixity cache {cache_path}: {e}\n")
+        return {}
+    return dict(rows)
+
+
+def store_digests(path, digests, read_identity=None):
+    """
+    Caches digests of the file at path, by name. Digests of earlier versions of the file, and
+    digests older than cache_max_age_days, are removed.
+
+    Parameters:
+        path (str): Path to the file
+        digests (dict): Digest by name
+        read_identity (tuple, optional): file_identity(path) from before the file was read. If the file
+            has changed since, the digests aren't cached.
+    """
+    max_age = max_age_seconds()
+    if max_age is None or not digests:
+        return
+    try:
+        identity, ctime_ns = file_identity(path)
+        if read_identity is not None and read_identity != (identity, ctime_ns):
+            logger.warning(f"{os.path.basename(path)} changed while it was being read, its checksums are not cached\n")
+            return
+        calculated = time.time()
+        with closing(connect()) as connection, connection:
+            connection.execute(
+                "DELETE FROM digests WHERE (device = ? AND inode = ? AND (size != ? OR mtime_ns != ? OR ctime_ns != ?)) "
+                "OR calculated < ?",
+                (identity[0], identity[1], identity[2], identity[3], ctime_ns, calculated - max_age)
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(*identity, ctime_ns, name, digest, os.path.realpath(path), calculated) for name, digest in digests.items()]
+            )
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Unable to write to the fixity cache {cache_path}: {e}\n")
@@ -5,6 +5,8 @@ import os
 os.environ["NUMEXPR_MAX_THREADS"] = "11" # troubleshooting goofy numbpy related error "Note: NumExpr detected 11 cores but "NUMEXPR_MAX_THREADS" not set, so enforcing safe limit of 8. # NumExpr defaulting to 8 threads."
 
 import csv
+import heapq
+import re
 from base64 import b64encode
 from ..utils.config_setup import ChecksConfig
 from ..utils.config_manager import ConfigManager
@@ -124,12 +126,13 @@ def find_report_csvs(report_directory):
     qctools_bars_eval_timestamps = None
     colorbars_values_output = None
     qctools_content_check_outputs = []
-    qctools_profile_check_output = None
+    qctools_profile_check_outputs = []
     qctools_profile_timestamps = None
-    profile_fails_csv = None
+    profile_fails_csvs = []
     tags_check_output = None
     tag_fails_csv = None
     colorbars_eval_fails_csv = None
+    failure_segments_csvs = {}
     difference_csv = None
 
     if os.path.isdir(report_directory):
@@ -146,9 +149,12 @@ def find_report_csvs(report_directory):
                     elif "qct-parse_contentFilter" in file:
                         qctools_content_check_outputs.append(file_path)
                     elif "qct-parse_profile_summary" in file:
-                        qctools_profile_check_output = file_path
+                        qctools_profile_check_outputs.append(file_path)
+                    elif "_failure_segments" in file:
+                        # keyed by the failures csv they summarize
+                        failure_segments_csvs[file_path.replace("_failure_segments", "_failures", 1)] = file_path
                     elif "qct-parse_profile_failures" in file:
-                        profile_fails_csv = file_path
+                        profile_fails_csvs.append(file_path)
                     elif "qct-parse_tags_summary.csv" in file:
                         tags_check_output = file_path
                     elif "qct-parse_tags_failures" in file:
@@ -158,7 +164,25 @@ def find_report_csvs(report_directory):
                 elif "metadata_difference" in file:
                     difference_csv = file_path
 
-    return qctools_colorbars_duration_output, qctools_bars_eval_check_output, colorbars_values_output, qctools_content_check_outputs, qctools_profile_check_output, profile_fails_csv, tags_check_output, tag_fails_csv, colorbars_eval_fails_csv, difference_csv
+    qctools_profile_check_outputs.sort()
+    profile_fails_csvs.sort()
+
+    # the failure segments csvs are much shorter than the failures csvs, and summarize_failures reads either
+    profile_fails_csvs = [failure_segments_csvs.get(csv_path, csv_path) for csv_path in profile_fails_csvs]
+    tag_fails_csv = failure_segments_csvs.get(tag_fails_csv, tag_fails_csv)
+    colorbars_eval_fails_csv = failure_segments_csvs.get(colorbars_eval_fails_csv, colorbars_eval_fails_csv)
+
+    return qctools_colorbars_duration_output, qctools_bars_eval_check_output, colorbars_values_output, qctools_content_check_outputs, qctools_profile_check_outputs, profile_fails_csvs, tags_check_output, tag_fails_csv, colorbars_eval_fails_csv, difference_csv
+
+
+def profile_csv_name(csv_path):
+    """
+    Returns the profile name of a qct-parse profile summary, failures or failure segments csv, or None for the csv of a single profile.
+
+    When qct-parse checks several profiles, each one's csvs are named qct-parse_profile_summary_{profile}.csv
+    """
+    match = re.match(r"qct-parse_profile_(?:summary|failures|failure_segments)_(.+)\.csv$", os.path.basename(csv_path))
+    return match.group(1) if match else None
 
 
 def find_qc_metadata(destination_directory):
@@ -197,61 +221,66 @@ def summarize_failures(failure_csv_path):  # Change parameter to accept CSV file
     Summarizes the failure information from the CSV file, prioritizing tags 
     with the greatest difference between tag value and threshold.
 
+    The CSV is either a qct-parse failures CSV, with a row per failing frame and tag, or a failure
+    segments CSV, where each run of consecutive failing frames of a tag is summarized by its peak.
+    It is read one row at a time, keeping only the failures with the greatest differences of each tag
+    in a heap, so the whole CSV is never loaded or sorted.
+
     Args:
         failure_csv_path (str): The path to the CSV file containing failure details.
 
     Returns:
-        str: A formatted summary of the failures.
+        dict: Timestamps and the lists of failures (tag, tagValue, over) kept at each, with the
+            greatest differences first: 5 per tag if there are 1 or 2 tags, otherwise 3.
     """
-    failureInfo = {}
-    # 0. Read the failure information from the CSV
-    with open(failure_csv_path, 'r') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            timestamp = row['Timestamp']
-            if timestamp not in failureInfo:
-                failureInfo[timestamp] = []
-            failureInfo[timestamp].append({
-                'tag': row['Tag'],
-                'tagValue': float(row['Tag Value']),  # Convert to float
-                'over': float(row['Threshold'])     # Convert to float
-            })
-
-    # 1. Collect all unique tags and count their occurrences
-    tag_counts = {}
-    for info_list in failureInfo.values():
-        for info in info_list:
-            tag = info['tag']
-            tag_counts[tag] = tag_counts.get(tag, 0) + 1
-
-    # 2. Determine the maximum number of frames per tag
-    num_tags = len(tag_counts)
-    max_frames_per_tag = 5 if num_tags <= 2 else 3
-
-    # 3. Flatten the failureInfo dictionary into a list of tuples
-    all_failures = []
-    for timestamp, info_list in failureInfo.items():
-        for info in info_list:
-            all_failures.append((timestamp, info))  # Store as (timestamp, info) tuples
-
-    # 4. Sort the flattened list based on tag value difference
-    all_failures.sort(key=lambda x: abs(x[1]['tagValue'] - x[1]['over']), reverse=True)
-
-    # 5. Limit the number of frames per tag
-    limited_failures = []
-    tag_counts = {tag: 0 for tag in tag_counts}  # Reset tag counts
-    for timestamp, info in all_failures:
-        tag = info['tag']
-        if tag_counts[tag] < max_frames_per_tag:
-            limited_failures.append((timestamp, info))
-            tag_counts[tag] += 1
-
-    # 6. Group the limited failures back into a dictionary by timestamp
+    max_frames_per_tag = 5
+    heaps = {}  # the failures with the greatest differences so far, per tag
+    with open(failure_csv_path, 'r', newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader, None)
+        if header is None:
+            return {}
+        column = {name: index for index, name in enumerate(header)}
+        segments = 'Peak Timestamp' in column
+        if segments:
+            # a failure segment is listed at its peak, with the span of the segment
+            timestamp_column, value_column = column['Peak Timestamp'], column['Peak Value']
+        else:
+            timestamp_column, value_column = column['Timestamp'], column['Tag Value']
+        tag_column, threshold_column = column['Tag'], column['Threshold']
+
+        for row_number, row in enumerate(reader):
+            tagValue = float(row[value_column])
+            over = float(row[threshold_column])
+            # the heap's smallest entry is the one to drop: the smallest difference, or the later row if they are equal
+            entry = (abs(tagValue - over), -row_number, row)
+            heap = heaps.setdefault(row[tag_column], [])
+            if len(heap) < max_frames_per_tag:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+    # keep 5 frames per tag if there are 1 or 2 tags, otherwise 3
+    if len(heaps) > 2:
+        max_frames_per_tag = 3
+    kept = []
+    for heap in heaps.values():
+        kept.extend(heapq.nlargest(max_frames_per_tag, heap))
+    kept.sort(reverse=True)
+
+    # Group the kept failures by timestamp, the greatest differences first
     summary_dict = {}
-    for timestamp, info in limited_failures:
-        if timestamp not in summary_dict:
-            summary_dict[timestamp] = []
-        summary_dict[timestamp].append(info)
+    for deviation, row_number, row in kept:
+        info = {
+            'tag': row[tag_column],
+            'tagValue': float(row[value_column]),
+            'over': float(row[threshold_column])
+        }
+        if segments:
+            info['start'] = row[column['Start']]
+            info['end'] = row[column['End']]
+            info['frames'] = int(row[column['Frame Count']])
+        summary_dict.setdefault(row[timestamp_column], []).append(info)
 
     return summary_dict
 
@@ -425,6 +454,7 @@ def make_profile_piecharts(qctools_profile_check_output, sorted_thumbs_dict, fai
             failed_frame_timestamps = []
             failed_frame_values = []
             failed_frame_thresholds = []
+            failed_frame_segments = []
 
             # Get failure details for this tag
             for timestamp, info_list in failureInfoSummary.items():
@@ -433,11 +463,16 @@ def make_profile_piecharts(qctools_profile_check_output, sorted_thumbs_dict, fai
                         failed_frame_timestamps.append(timestamp)
                         failed_frame_values.append(info['tagValue'])
                         failed_frame_thresholds.append(info['over'])
+                        # failures summarized from the failure segments csv span several frames
+                        if info.get('frames', 1) > 1:
+                            failed_frame_segments.append(f"<b>Segment:</b> {info['start']} - {info['end']} ({info['frames']} frames)<br>")
+                        else:
+                            failed_frame_segments.append("")
 
             # Create formatted failure summary string
             formatted_failures = "<br>".join(
-                f"<b>Timestamp: {timestamp}</b><br><b>Value:</b> {value}<br><b>Threshold:</b> {threshold}<br>" 
-                for timestamp, value, threshold in zip(failed_frame_timestamps, failed_frame_values, failed_frame_thresholds)
+                f"<b>Timestamp: {timestamp}</b><br><b>Value:</b> {value}<br><b>Threshold:</b> {threshold}<br>{segment}" 
+                for timestamp, value, threshold, segment in zip(failed_frame_timestamps, failed_frame_values, failed_frame_thresholds, failed_frame_segments)
             )
             summary_html = f"""
             <div style="display: flex; flex-direction: column; align-items: center; background-color: #f5e9e3; padding: 10px;">
@@ -589,7 +624,7 @@ def generate_final_report(video_id, source_directory, report_directory, destinat
 
 def write_html_report(video_id, report_directory, destination_directory, html_report_path, check_cancelled=None):
 
-    qctools_colorbars_duration_output, qctools_bars_eval_check_output, colorbars_values_output, qctools_content_check_outputs, qctools_profile_check_output, profile_fails_csv, tags_check_output, tag_fails_csv, colorbars_eval_fails_csv, difference_csv = find_report_csvs(report_directory)
+    qctools_colorbars_duration_output, qctools_bars_eval_check_output, colorbars_values_output, qctools_content_check_outputs, qctools_profile_check_outputs, profile_fails_csvs, tags_check_output, tag_fails_csv, colorbars_eval_fails_csv, difference_csv = find_report_csvs(report_directory)
 
     if check_cancelled():
         return
@@ -610,11 +645,10 @@ def write_html_report(video_id, report_directory, destination_directory, html_re
     # Get qct-parse thumbs if they exists
     thumbs_dict = find_qct_thumbs(report_directory)
 
-    if profile_fails_csv:
+    failureInfoSummary_profiles = {}
+    for profile_fails_csv in profile_fails_csvs:
         profile_fails_csv_path = os.path.join(report_directory, profile_fails_csv)
-        failureInfoSummary_profile = summarize_failures(profile_fails_csv_path)
-    else:
-        failureInfoSummary_profile = None
+        failureInfoSummary_profiles[profile_csv_name(profile_fails_csv)] = summarize_failures(profile_fails_csv_path)
 
     if tag_fails_csv:
         tag_fails_csv_path = os.path.join(report_directory, tag_fails_csv)
@@ -653,10 +687,21 @@ def write_html_report(video_id, report_directory, destination_directory, html_re
     else:
          colorbars_html = None
 
-    if qctools_profile_check_output and failureInfoSummary_profile:
-        profile_summary_html = make_profile_piecharts(qctools_profile_check_output,thumbs_dict,failureInfoSummary_profile,check_cancelled=check_cancelled)
-    else:
-        profile_summary_html = None
+    # one summary per profile, when qct-parse checked several
+    profile_summaries_html = []
+    for qctools_profile_check_output in qctools_profile_check_outputs:
+        profile_name = profile_csv_name(qctools_profile_check_output)
+        failureInfoSummary_profile = failureInfoSummary_profiles.get(profile_name)
+        if failureInfoSummary_profile:
+            if profile_name is None:
+                profile_thumbs_dict = thumbs_dict
+            else:
+                # the thumbnails of a profile's failures are named {video_id}.threshold_profile_{profile}.{tag}...
+                profile_thumbs_dict = {thumb_name: thumb for thumb_name, thumb in thumbs_dict.items()
+                                       if f".threshold_profile_{profile_name}." in os.path.basename(thumb[0])}
+            profile_summary_html = make_profile_piecharts(qctools_profile_check_output,profile_thumbs_dict,failureInfoSummary_profile,check_cancelled=check_cancelled)
+            if profile_summary_html:
+                profile_summaries_html.append((profile_name, profile_summary_html))
 
     if qctools_content_check_outputs:
         content_summary_html_list = []
@@ -774,9 +819,10 @@ def write_html_report(video_id, report_directory, destination_directory, html_re
         {colorbars_eval_html}
         """
 
-    if profile_summary_html:
+    for profile_name, profile_summary_html in profile_summaries_html:
+        profile_title = f"qct-parse Profile Summary: {profile_name}" if profile_name else "qct-parse Profile Summary"
         html_template += f"""
-        <h3>qct-parse Profile Summary</h3>
+        <h3>{profile_title}</h3>
         <div style="white-space: nowrap;">
             {profile_summary_html}
         </div>
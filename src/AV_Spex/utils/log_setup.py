@@ -52,8 +52,10 @@ class QtLogHandler(logging.Handler, QObject):
 
 
 def get_log_directory():
-    """Determine the appropriate log directory based on how the app is running"""
-    if getattr(sys, 'frozen', False):
+    """Determine the appropriate log directory based on how the app is running, or AVSPEX_LOG_DIR if it is set"""
+    if os.environ.get('AVSPEX_LOG_DIR'):
+        log_dir = os.environ['AVSPEX_LOG_DIR']
+    elif getattr(sys, 'frozen', False):
         # If running as packaged app
         log_dir = os.path.join(str(Path.home()), 'Library', 'Logs', 'AVSpex')
     else:
@@ -0,0 +1,480 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Reading and writing the tags of a Matroska file without mkvtoolnix
+# Only the start of the file and the Tags element are read: the SeekHead gives the position of the Tags
+# (level 1 elements before the first Cluster are scanned too, for files without one), so reading the tags
+# of a multi-GB MKV is a few KB of reads. Tags are exchanged as the XML mkvextract writes (<Tags>, <Tag>,
+# <Targets>, <Simple>), so the code that used mkvextract/mkvpropedit works the same.
+# Writing replaces the Tags element in place: if the new tags fit in the space of the old ones and any Void
+# after them, the rest is filled with a Void, if the Tags are at the end of the file the file is resized,
+# and otherwise the old Tags become a Void, the new ones are appended and the SeekHead is updated. Entries of
+# any SeekHead that point to Tags that became a Void are redirected to the new Tags, or removed.
+# Nothing else in the file moves.
+
+import base64
+import os
+import xml.etree.ElementTree as ET
+
+# Element IDs, with their length marker bits, as in the Matroska specification
+EBML_ID = 0x1A45DFA3
+SEGMENT_ID = 0x18538067
+SEEK_HEAD_ID = 0x114D9B74
+SEEK_ID = 0x4DBB
+SEEK_ID_ID = 0x53AB
+SEEK_POSITION_ID = 0x53AC
+CLUSTER_ID = 0x1F43B675
+TAGS_ID = 0x1254C367
+TAG_ID = 0x7373
+TARGETS_ID = 0x63C0
+SIMPLE_TAG_ID = 0x67C8
+VOID_ID = 0xEC
+
+# Children of Targets and SimpleTag: (element ID, value type) by their mkvextract XML name
+targets_elements = {
+    'TargetTypeValue': (0x68CA, 'uint'),
+    'TargetType': (0x63CA, 'string'),
+    'TrackUID': (0x63C5, 'uint'),
+    'EditionUID': (0x63C9, 'uint'),
+    'ChapterUID': (0x63C4, 'uint'),
+    'AttachmentUID': (0x63C6, 'uint'),
+}
+simple_tag_elements = {
+    'Name': (0x45A3, 'string'),
+    'TagLanguage': (0x447A, 'string'),
+    'TagLanguageIETF': (0x447B, 'string'),
+    'DefaultLanguage': (0x4484, 'uint'),
+    'String': (0x4487, 'string'),
+    'Binary': (0x4485, 'binary'),
+    'Simple': (SIMPLE_TAG_ID, 'master'),
+}
+element_names = {element_id: (name, value_type) for elements in (targets_elements, simple_tag_elements)
+                 for name, (element_id, value_type) in elements.items()}
+
+# Longest element header: 4 byte ID and 8 byte size
+max_header_length = 12
+# Further SeekHeads a SeekHead can point to before they are ignored
+max_seek_heads = 4
+
+
+class MatroskaError(Exception):
+    """The file isn't Matroska, or its structure doesn't allow what was asked."""
+
+
+class Element:
+    """
+    Position of an element in the file.
+
+    Attributes:
+        id (int): Element ID
+        position (int): Offset of the element's first byte
+        header_length (int): Length of the ID and size
+        size (int or None): Length of the data, None if unknown (live streamed Segments and Clusters)
+        size_length (int): Length of the encoded size
+    """
+
+    def __init__(self, element_id, position, header_length, size, size_length):
+        self.id = element_id
+        self.position = position
+        self.header_length = header_length
+        self.size = size
+        self.size_length = size_length
+
+    @property
+    def data_start(self):
+        return self.position + self.header_length
+
+    @property
+    def end(self):
+        return self.data_start + self.size
+
+
+def decode_vint(data, offset):
+    """Returns (value without the length marker, length) of the variable length integer at data[offset]."""
+    if offset >= len(data) or data[offset] == 0:
+        raise MatroskaError("Invalid EBML variable length integer")
+    length = 9 - data[offset].bit_length()
+    if offset + length > len(data):
+        raise MatroskaError("Truncated EBML variable length integer")
+    value = data[offset] & (0xFF >> length)
+    for byte in data[offset + 1:offset + length]:
+        value = (value << 8) | byte
+    return value, length
+
+
+def decode_header(data, offset):
+    """Returns (ID, data size or None if unknown, size length, header length) of the element header at data[offset]."""
+    id_value, id_length = decode_vint(data, offset)
+    if id_length > 4:
+        raise MatroskaError("Invalid EBML element ID")
+    element_id = int.from_bytes(data[offset:offset + id_length], 'big')
+    size, size_length = decode_vint(data, offset + id_length)
+    if size == (1 << (7 * size_length)) - 1:
+        size = None
+    return element_id, size, size_length, id_length + size_length
+
+
+def read_element(file_object, position):
+    """Reads the header of the element at position, or returns None at the end of the file."""
+    file_object.seek(position)
+    data = file_object.read(max_header_length)
+    if not data:
+        return None
+    element_id, size, size_length, header_length = decode_header(data, 0)
+    return Element(element_id, position, header_length, size, size_length)
+
+
+def iter_children(data, start, end):
+    """Yields (ID, data start, data end) of each element in data[start:end]."""
+    offset = start
+    while offset < end:
+        element_id, size, size_length, header_length = decode_header(data, offset)
+        if size is None or offset + header_length + size > end:
+            raise MatroskaError("Element exceeds its parent")
+        yield element_id, offset + header_length, offset + header_length + size
+        offset = offset + header_length + size
+
+
+def decode_uint(data):
+    return int.from_bytes(data, 'big')
+
+
+class SegmentLayout:
+    """
+    The level 1 elements of the Segment that tags are read and written with.
+
+    Attributes:
+        segment (Element): The Segment
+        segment_end (int): End of the Segment, the end of the file if its size is unknown
+        file_size (int): Size of the file
+        tags (list): Tags elements
+        seek_heads (list): (SeekHead element, [(SeekID, SeekPosition), ...]) of each SeekHead
+    """
+
+    def __init__(self, file_object):
+        file_object.seek(0, os.SEEK_END)
+        self.file_size = file_object.tell()
+        header = read_element(file_object, 0)
+        if header is None or header.id != EBML_ID:
+            raise MatroskaError("Not a Matroska file")
+        self.segment = read_element(file_object, header.end)
+        if self.segment is None or self.segment.id != SEGMENT_ID:
+            raise MatroskaError("No Segment found")
+        self.segment_end = self.file_size if self.segment.size is None else self.segment.end
+        self.tags = []
+        self.seek_heads = []
+        self.find_elements(file_object)
+
+    def find_elements(self, file_object):
+        seek_head_positions = []
+        # Level 1 elements before the first Cluster
+        position = self.segment.data_start
+        while position < self.segment_end:
+            element = read_element(file_object, position)
+            if element is None or element.id == CLUSTER_ID or element.size is None:
+                break
+            if element.id == SEEK_HEAD_ID:
+                seek_head_positions.append(position)
+            elif element.id == TAGS_ID:
+                self.tags.append(element)
+            position = element.end
+        # SeekHeads, and the Tags and further SeekHeads they point to
+        while seek_head_positions and len(self.seek_heads) < max_seek_heads:
+            position = seek_head_positions.pop(0)
+            if any(seek_head.position == position for seek_head, entries in self.seek_heads):
+                continue
+            seek_head = read_element(file_object, position)
+            if seek_head is None or seek_head.id != SEEK_HEAD_ID or seek_head.size is None:
+                continue
+            file_object.seek(seek_head.data_start)
+            data = file_object.read(seek_head.size)
+            entries = []
+            for element_id, start, end in iter_children(data, 0, len(data)):
+                if element_id != SEEK_ID:
+                    continue
+                seek_id = seek_position = None
+                for child_id, child_start, child_end in iter_children(data, start, end):
+                    if child_id == SEEK_ID_ID:
+                        seek_id = decode_uint(data[child_start:child_end])
+                    elif child_id == SEEK_POSITION_ID:
+                        seek_position = decode_uint(data[child_start:child_end])
+                if seek_id is not None and seek_position is not None:
+                    entries.append((seek_id, seek_position))
+            self.seek_heads.append((seek_head, entries))
+            for seek_id, seek_position in entries:
+                position = self.segment.data_start + seek_position
+                if seek_id == SEEK_HEAD_ID:
+                    seek_head_positions.append(position)
+                elif seek_id == TAGS_ID and not any(tags.position == position for tags in self.tags):
+                    element = read_element(file_object, position)
+                    if element is not None and element.id == TAGS_ID and element.size is not None:
+                        self.tags.append(element)
+        self.tags.sort(key=lambda element: element.position)
+
+    def voids_after(self, file_object, element):
+        """Returns the end of element and of the Void elements directly after it."""
+        end = element.end
+        while end < self.segment_end:
+            void = read_element(file_object, end)
+            if void is None or void.id != VOID_ID or void.size is None:
+                break
+            end = void.end
+        return min(end, self.segment_end)
+
+
+def decode_value(data, value_type):
+    if value_type == 'uint':
+        return str(decode_uint(data))
+    if value_type == 'binary':
+        return data.hex()
+    return data.rstrip(b'\x00').decode('utf-8', errors='replace')
+
+
+def decode_children(parent, data, start, end, elements):
+    for element_id, child_start, child_end in iter_children(data, start, end):
+        if element_id not in element_names or element_names[element_id][0] not in elements:
+            continue   # CRC-32, Void, or an element mkvextract doesn't write either
+        name, value_type = element_names[element_id]
+        child = ET.SubElement(parent, name)
+        if value_type == 'master':
+            decode_children(child, data, child_start, child_end, simple_tag_elements)
+        else:
+            child.text = decode_value(data[child_start:child_end], value_type)
+
+
+def read_tags(video_path):
+    """
+    Reads the tags of a Matroska file.
+
+    Parameters:
+        video_path (str): Path to the MKV file
+
+    Returns:
+        xml.etree.ElementTree.Element or None: The <Tags> element, in mkvextract's XML layout, or None if
+            the file has no tags.
+
+    Raises:
+        MatroskaError: If the file isn't Matroska or its structure is invalid.
+    """
+    with open(video_path, 'rb') as file_object:
+        layout = SegmentLayout(file_object)
+        if not layout.tags:
+            return None
+        root = ET.Element('Tags')
+        for tags in layout.tags:
+            file_object.seek(tags.data_start)
+            data = file_object.read(tags.size)
+            for element_id, start, end in iter_children(data, 0, len(data)):
+                if element_id != TAG_ID:
+                    continue
+                tag = ET.SubElement(root, 'Tag')
+                for child_id, child_start, child_end in iter_children(data, start, end):
+                    if child_id == TARGETS_ID:
+                        decode_children(ET.SubElement(tag, 'Targets'), data, child_start, child_end, targets_elements)
+                    elif child_id == SIMPLE_TAG_ID:
+                        decode_children(ET.SubElement(tag, 'Simple'), data, child_start, child_end, simple_tag_elements)
+    return root
+
+
+def encode_id(element_id):
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big')
+
+
+def encode_size(size, length=None):
+    """Encodes a data size, in length bytes (the fewest that can hold it if None)."""
+    if length is None:
+        length = 1
+        while size >= (1 << (7 * length)) - 1:
+            length += 1
+    if length > 8 or size >= (1 << (7 * length)) - 1:
+        raise MatroskaError(f"Size {size} doesn't fit in {length} bytes")
+    return ((1 << (7 * length)) | size).to_bytes(length, 'big')
+
+
+def encode_element(element_id, data, size_length=None):
+    return encode_id(element_id) + encode_size(len(data), size_length) + data
+
+
+def encode_uint(value):
+    return value.to_bytes(max(1, (value.bit_length() + 7) // 8), 'big')
+
+
+def void_header(length):
+    """Header of a Void element that is length bytes long in total (at least 2)."""
+    if length >= 9:
+        return encode_id(VOID_ID) + encode_size(length - 9, 8)
+    return encode_id(VOID_ID) + encode_size(length - 2, 1)
+
+
+def encode_value(element, value_type):
+    text = element.text or ''
+    if value_type == 'uint':
+        return encode_uint(int(text.strip()))
+    if value_type == 'binary':
+        if element.get('format') == 'base64':
+            return base64.b64decode(text)
+        return bytes.fromhex(''.join(text.split()))
+    return text.encode('utf-8')
+
+
+def encode_children(parent, elements):
+    data = b''
+    for child in parent:
+        if child.tag not in elements:
+            raise MatroskaError(f"Unknown tag element <{child.tag}> in <{parent.tag}>")
+        element_id, value_type = elements[child.tag]
+        if value_type == 'master':
+            data += encode_element(element_id, encode_children(child, simple_tag_elements))
+        else:
+            data += encode_element(element_id, encode_value(child, value_type))
+    return data
+
+
+def encode_tags(root):
+    """Encodes the data of a Tags element from the <Tags> XML element."""
+    data = b''
+    for tag in root.findall('Tag'):
+        targets = tag.find('Targets')
+        tag_data = encode_element(TARGETS_ID, b'' if targets is None else encode_children(targets, targets_elements))
+        for simple in tag.findall('Simple'):
+            tag_data += encode_element(SIMPLE_TAG_ID, encode_children(simple, simple_tag_elements))
+        data += encode_element(TAG_ID, tag_data)
+    return data
+
+
+def fit_element(element_id, data, length):
+    """
+    Encodes an element to take exactly length bytes, or length - 2 or less so that a Void can fill the rest.
+    Returns None if it doesn't fit.
+    """
+    encoded = encode_element(element_id, data)
+    if len(encoded) == length - 1:
+        # A Void is at least 2 bytes, the size is encoded one byte longer instead
+        size_length = len(encoded) - len(encode_id(element_id)) - len(data) + 1
+        if size_length > 8:
+            return None
+        encoded = encode_element(element_id, data, size_length)
+    if len(encoded) > length:
+        return None
+    return encoded
+
+
+def write_padded(file_object, position, encoded, length):
+    """Writes encoded at position, and a Void up to position + length."""
+    file_object.seek(position)
+    file_object.write(encoded)
+    if len(encoded) < length:
+        file_object.write(void_header(length - len(encoded)))
+
+
+def write_tags(video_path, root):
+    """
+    Replaces the tags of a Matroska file, in place.
+
+    Parameters:
+        video_path (str): Path to the MKV file
+        root (xml.etree.ElementTree.Element): The new <Tags>, in mkvextract's XML layout (see read_tags).
+
+    Raises:
+        MatroskaError: If the file isn't Matroska, or the new tags can't be written without moving other elements
+            (no room in the SeekHead for the new position of the Tags). The file is unchanged then.
+    """
+    tags_data = encode_tags(root)
+    with open(video_path, 'r+b') as file_object:
+        layout = SegmentLayout(file_object)
+        segment = layout.segment
+
+        if layout.tags:
+            old_tags = layout.tags[0]
+            available_end = layout.voids_after(file_object, old_tags)
+            encoded = fit_element(TAGS_ID, tags_data, available_end - old_tags.position)
+            if encoded is not None:
+                # In the space of the old Tags, and of the Voids after them
+                seek_head_updates = plan_seek_heads(file_object, layout, old_tags.position - segment.data_start)
+                write_padded(file_object, old_tags.position, encoded, available_end - old_tags.position)
+                for tags in layout.tags[1:]:
+                    write_padded(file_object, tags.position, b'', tags.end - tags.position)
+                write_seek_heads(file_object, seek_head_updates)
+                return
+            if available_end == layout.segment_end == layout.file_size:
+                # Last in the file, the file is resized
+                encoded = encode_element(TAGS_ID, tags_data)
+                seek_head_updates = plan_seek_heads(file_object, layout, old_tags.position - segment.data_start)
+                resize_segment(file_object, layout, old_tags.position + len(encoded))
+                file_object.seek(old_tags.position)
+                file_object.write(encoded)
+                file_object.truncate()
+                write_seek_heads(file_object, seek_head_updates)
+                return
+
+        # Appended to the end of the Segment, the SeekHeads are updated to point to them
+        if layout.segment_end != layout.file_size:
+            raise MatroskaError("The Segment doesn't end at the end of the file, the tags can't be appended")
+        encoded = encode_element(TAGS_ID, tags_data)
+        seek_head_updates = plan_seek_heads(file_object, layout, layout.file_size - segment.data_start, appended=True)
+        resize_segment(file_object, layout, layout.file_size + len(encoded))
+        file_object.seek(layout.file_size)
+        file_object.write(encoded)
+        write_seek_heads(file_object, seek_head_updates)
+        for tags in layout.tags:
+            write_padded(file_object, tags.position, b'', tags.end - tags.position)
+
+
+def resize_segment(file_object, layout, new_end):
+    """Sets the size of the Segment to end at new_end, unless its size is unknown."""
+    segment = layout.segment
+    if segment.size is None:
+        return
+    size = encode_size(new_end - segment.data_start, segment.size_length)
+    file_object.seek(segment.position + segment.header_length - segment.size_length)
+    file_object.write(size)
+
+
+def encode_seek_head(entries):
+    """Encodes the data of a SeekHead from its (SeekID, SeekPosition) entries."""
+    return b''.join(
+        encode_element(SEEK_ID, encode_element(SEEK_ID_ID, encode_id(seek_id)) + encode_element(SEEK_POSITION_ID, encode_uint(position)))
+        for seek_id, position in entries
+    )
+
+
+def plan_seek_heads(file_object, layout, tags_seek_position, appended=False):
+    """
+    Returns [(position, encoded SeekHead, length available)] of the SeekHeads to rewrite so that none of them
+    points to Tags that are replaced or voided: their Tags entries are replaced by one pointing to the Tags at
+    tags_seek_position, or removed if there is no room for it.
+
+    appended: The Tags are appended after the Clusters, where they are only found through a SeekHead, so one
+        that had no Tags entry gets one too if needed. Raises MatroskaError if no SeekHead has room for it.
+    """
+    updates = []
+    pointed = False
+    # SeekHeads with Tags entries first, the new position replaces those
+    for seek_head, entries in sorted(layout.seek_heads, key=lambda item: not any(seek_id == TAGS_ID for seek_id, position in item[1])):
+        tags_positions = [position for seek_id, position in entries if seek_id == TAGS_ID]
+        if tags_positions == [tags_seek_position]:
+            pointed = True
+            continue
+        if not tags_positions and (pointed or not appended):
+            continue
+        other_entries = [(seek_id, position) for seek_id, position in entries if seek_id != TAGS_ID]
+        length = layout.voids_after(file_object, seek_head) - seek_head.position
+        encoded = fit_element(SEEK_HEAD_ID, encode_seek_head(other_entries + [(TAGS_ID, tags_seek_position)]), length)
+        if encoded is not None:
+            pointed = True
+        elif tags_positions:
+            encoded = fit_element(SEEK_HEAD_ID, encode_seek_head(other_entries), length)
+            if encoded is None:
+                raise MatroskaError("No room in the SeekHead to remove the position of the old tags")
+        else:
+            continue
+        updates.append((seek_head.position, encoded, length))
+    if appended and not pointed:
+        raise MatroskaError("No room in the SeekHead for the position of the new tags")
+    return updates
+
+
+def write_seek_heads(file_object, updates):
+    """Writes the SeekHeads planned by plan_seek_heads."""
+    for position, encoded, length in updates:
+        write_padded(file_object, position, encoded, length)
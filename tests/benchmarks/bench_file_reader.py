@@ -0,0 +1,66 @@
+"""
+MB/s of file hashing: the plain 1 MiB read loop fixity_check used, and BlockReader's read-ahead thread.
+
+Usage:
+    python tests/benchmarks/bench_file_reader.py [file.mkv ...]
+
+Without arguments a 1 GiB file of random data is written to a temporary directory.
+The second reader of a file may find it in the page cache, so each file is read with both readers twice,
+alternating, and the best time of each is reported. Both readers have to give the same md5.
+"""
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+from AV_Spex.utils.file_reader import BlockReader
+
+
+def read_loop_md5(path):
+    md5_object = hashlib.md5()
+    with open(path, 'rb') as file_object:
+        for buf in iter(lambda: file_object.read(2**20), b''):
+            md5_object.update(buf)
+    return md5_object.hexdigest()
+
+
+def block_reader_md5(path):
+    md5_object = hashlib.md5()
+    with BlockReader(path, drop_cache=False) as reader:
+        for block in reader:
+            md5_object.update(block)
+    return md5_object.hexdigest()
+
+
+def megabytes_per_second(hash_function, path):
+    start = time.perf_counter()
+    digest = hash_function(path)
+    return digest, os.path.getsize(path) / 2**20 / (time.perf_counter() - start)
+
+
+def main(paths):
+    for path in paths:
+        print(os.path.basename(path))
+        rates = {}
+        digests = set()
+        for _ in range(2):
+            for name, hash_function in (("read loop", read_loop_md5), ("BlockReader", block_reader_md5)):
+                digest, rate = megabytes_per_second(hash_function, path)
+                digests.add(digest)
+                rates[name] = max(rates.get(name, 0), rate)
+        for name, rate in rates.items():
+            print(f"  {name:12} {rate:,.0f} MB/s")
+        print(f"  conformance: {'ok' if len(digests) == 1 else 'md5s differ'}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(sys.argv[1:])
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "synthetic.mkv")
+            with open(path, 'wb') as f:
+                for _ in range(1024):
+                    f.write(os.urandom(2**20))
+            main([path])
@@ -0,0 +1,59 @@
+"""
+Frames per second of the QCTools report readers: lxml iterparse and the fast scanner.
+
+Usage:
+    python tests/benchmarks/bench_qctools_report.py [report.qctools.xml.gz ...]
+
+Without arguments a synthetic 20,000 frame report is written to a temporary directory.
+Each report is also checked for conformance, both readers have to produce the same frames.
+"""
+import itertools
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conftest import write_qctools_report
+
+from AV_Spex.checks.qctools_report import iterparse_report_frames, scan_report_frames
+
+
+def frames_per_second(reader, report_path):
+    start = time.perf_counter()
+    frame_count = 0
+    for frame in reader(report_path):
+        if frame is None:
+            return frame_count, None
+        frame_count += 1
+    return frame_count, frame_count / (time.perf_counter() - start)
+
+
+def conforms(report_path):
+    for expected, scanned in itertools.zip_longest(iterparse_report_frames(report_path), scan_report_frames(report_path)):
+        if scanned is None:
+            return "scanner fell back to iterparse"
+        if expected != scanned:
+            return f"frames differ: {expected} != {scanned}"
+    return "ok"
+
+
+def main(report_paths):
+    for report_path in report_paths:
+        print(os.path.basename(report_path))
+        for name, reader in (("iterparse", iterparse_report_frames), ("scanner", scan_report_frames)):
+            frame_count, rate = frames_per_second(reader, report_path)
+            if rate is None:
+                print(f"  {name:10} fell back after {frame_count} frames")
+            else:
+                print(f"  {name:10} {frame_count} frames, {rate:,.0f} frames/s")
+        print(f"  conformance: {conforms(report_path)}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(sys.argv[1:])
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            main([write_qctools_report(os.path.join(tmp_dir, "synthetic.mkv.qctools.xml.gz"), 20000)])
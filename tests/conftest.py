@@ -2,8 +2,12 @@
 import pytest
 import os
 import logging
+import tempfile
 from pathlib import Path
 
+# AV_Spex logs to a file from the moment it is imported: keep the test runs' logs out of the repository
+os.environ['AVSPEX_LOG_DIR'] = tempfile.mkdtemp(prefix='avspex_test_logs_')
+
 @pytest.fixture
 def sample_colorbars_csv(tmp_path):
     """Create a sample colorbars values CSV file"""
@@ -47,7 +51,120 @@ def sample_thumbs_dict(tmp_path):
         )
     }
 
+@pytest.fixture(autouse=True)
+def fixity_cache_path(tmp_path_factory, monkeypatch):
+    """Keeps the checksums cached by tests out of the user's fixity cache"""
+    from AV_Spex.utils import fixity_cache
+    cache_path = str(tmp_path_factory.mktemp("fixity_cache") / "fixity_cache.sqlite3")
+    monkeypatch.setattr(fixity_cache, 'cache_path', cache_path)
+    return cache_path
+
+@pytest.fixture(autouse=True)
+def qctools_cache_dir(tmp_path_factory, monkeypatch):
+    """Keeps the report sidecars written by tests out of the user's QCTools cache"""
+    from AV_Spex.checks import qctools_report
+    cache_dir = str(tmp_path_factory.mktemp("qctools_cache"))
+    monkeypatch.setattr(qctools_report, 'cache_dir', cache_dir)
+    return cache_dir
+
 @pytest.fixture
 def setup_logging():
     """Setup basic logging configuration for tests"""
-    logging.basicConfig(level=logging.CRITICAL)
\ No newline at end of file
+    logging.basicConfig(level=logging.CRITICAL)
+
+def synthetic_frame_values(index):
+    """QCTools signalstats values for frame `index` of a synthetic 10-bit tape: black, then bars, then program"""
+    if index < 5:
+        return {'YMIN': 4, 'YLOW': 64, 'YAVG': 64, 'YHIGH': 70, 'YMAX': 80, 'UMIN': 500, 'ULOW': 510,
+                'UAVG': 512, 'UHIGH': 514, 'UMAX': 520, 'VMIN': 500, 'VLOW': 510, 'VAVG': 512, 'VHIGH': 514,
+                'VMAX': 520, 'SATMIN': 0, 'SATAVG': 1, 'SATMAX': 2, 'YDIF': 1, 'TOUT': 0, 'VREP': 0, 'BRNG': 0}
+    if index < 125:
+        wobble = index % 3
+        return {'YMIN': 4, 'YLOW': 64, 'YAVG': 400, 'YHIGH': 900, 'YMAX': 940 + wobble, 'UMIN': 100 + wobble,
+                'ULOW': 150, 'UAVG': 512, 'UHIGH': 870, 'UMAX': 900 - wobble, 'VMIN': 120, 'VLOW': 160,
+                'VAVG': 512, 'VHIGH': 860, 'VMAX': 880 + wobble, 'SATMIN': 0, 'SATAVG': 200, 'SATMAX': 400 + wobble,
+                'YDIF': 2.5, 'TOUT': 0.001, 'VREP': 0, 'BRNG': 0.01}
+    step = index % 17
+    return {'YMIN': 30 + step, 'YLOW': 60 + step, 'YAVG': 450 + step, 'YHIGH': 930 + step, 'YMAX': 930 + 2 * step,
+            'UMIN': 90 + step, 'ULOW': 300, 'UAVG': 512, 'UHIGH': 700, 'UMAX': 890 + step, 'VMIN': 110 + step,
+            'VLOW': 320, 'VAVG': 512, 'VHIGH': 690, 'VMAX': 870 + step, 'SATMIN': 1, 'SATAVG': 90,
+            'SATMAX': 170 + step * 2.5, 'YDIF': 5 + step, 'TOUT': 0.002 * step, 'VREP': 0.004 * step,
+            'BRNG': 0.001 * step}
+
+
+def write_qctools_report(path, frame_count, frame_values=synthetic_frame_values, pkt='pkt_pts_time', first_frame=0, time_offset=0):
+    """
+    Write a gzipped QCTools style report with an audio frame after every video frame
+
+    first_frame and time_offset write a segment of a longer report: frames first_frame to first_frame + frame_count,
+    with time_offset seconds taken off their timestamps
+    """
+    import gzip
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             "<ffprobe:ffprobe xmlns:ffprobe='http://www.ffmpeg.org/schema/ffprobe' xmlns:xsi='http://www.w3.org/2001/XMLSchema-instance'>",
+             '    <frames>']
+    for index in range(first_frame, first_frame + frame_count):
+        timestamp = f"{index * 1001 / 30000 - time_offset:.6f}"
+        lines.append(f'        <frame media_type="video" stream_index="0" key_frame="1" {pkt}="{timestamp}" pkt_duration_time="0.033367" width="720" height="486" pix_fmt="yuv422p10le">')
+        for key, value in frame_values(index).items():
+            lines.append(f'            <tag key="lavfi.signalstats.{key}" value="{value}"/>')
+        lines.append(f'            <tag key="lavfi.psnr.mse.y" value="{index % 7}"/>')
+        lines.append('        </frame>')
+        lines.append(f'        <frame media_type="audio" stream_index="1" key_frame="1" {pkt}="{timestamp}" pkt_duration_time="0.033367">')
+        lines.append('            <tag key="lavfi.astats.Overall.Peak_level" value="-6.02"/>')
+        lines.append('        </frame>')
+    lines += ['    </frames>', '</ffprobe:ffprobe>', '']
+    with gzip.open(path, 'wt') as report:
+        report.write('\n'.join(lines))
+    return str(path)
+
+
+@pytest.fixture
+def qctools_report(tmp_path):
+    """A synthetic 400 frame JPC_AV_00001.qctools.xml.gz report"""
+    return write_qctools_report(tmp_path / "JPC_AV_00001.mkv.qctools.xml.gz", 400)
+
+
+def start_growing_copy(source, destination, pieces=20, delay=0.01):
+    """Copy source to destination a piece at a time from a background thread, the way qcli writes a report"""
+    import threading
+    import time
+    with open(source, 'rb') as f:
+        data = f.read()
+
+    def write():
+        time.sleep(delay)   # the report doesn't exist when the reader starts
+        with open(destination, 'wb') as f:
+            for index in range(pieces):
+                f.write(data[index * len(data) // pieces:(index + 1) * len(data) // pieces])
+                f.flush()
+                time.sleep(delay)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    return writer
+
+
+def write_signalstats_output(path, frame_count, frame_values=synthetic_frame_values):
+    """Write what ffmpeg's metadata=mode=print filter prints for the frames of write_qctools_report"""
+    lines = []
+    for index in range(frame_count):
+        pts = round(index * 1001 / 30000 * 1000000)  # microseconds, set by settb=AVTB
+        lines.append(f"frame:{index:<4} pts:{pts:<7} pts_time:{pts / 1000000:.6g}")
+        for key, value in frame_values(index).items():
+            lines.append(f"lavfi.signalstats.{key}={value}")
+        lines.append(f"lavfi.psnr.mse.y={index % 7}")
+    Path(path).write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+
+@pytest.fixture
+def signalstats_output(tmp_path, monkeypatch):
+    """ffmpeg's signalstats command replaced by one printing the stats of the 400 frames of qctools_report"""
+    import sys
+    from AV_Spex.checks import qctools_report
+    output_path = write_signalstats_output(tmp_path / "signalstats.txt", 400)
+    monkeypatch.setattr(qctools_report, 'signalstats_command', lambda video_path: [
+        sys.executable, '-c', 'import shutil, sys; shutil.copyfileobj(open(sys.argv[1]), sys.stdout)', output_path
+    ])
+    return output_path
@@ -0,0 +1,60 @@
+import os
+import threading
+
+import pytest
+
+from AV_Spex.utils import file_reader
+from AV_Spex.utils.file_reader import BlockReader
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / "capture.mkv"
+    path.write_bytes(os.urandom(5 * 2**16 + 123))
+    return str(path)
+
+
+def test_blocks_match_file(data_file):
+    with BlockReader(data_file, block_size=2**16) as reader:
+        blocks = [bytes(block) for block in reader]
+    with open(data_file, 'rb') as f:
+        assert b''.join(blocks) == f.read()
+    assert [len(block) for block in blocks] == [2**16] * 5 + [123]
+
+
+def test_progress_throttled(data_file, monkeypatch):
+    monkeypatch.setattr(file_reader, 'progress_interval', 3600)
+    progress = []
+    with BlockReader(data_file, block_size=2**16, progress=lambda read, total: progress.append((read, total))) as reader:
+        for block in reader:
+            pass
+    assert progress == [(os.path.getsize(data_file), os.path.getsize(data_file))]   # only the final callback
+
+
+def test_leaving_early_stops_reading(data_file):
+    threads = threading.active_count()
+    with BlockReader(data_file, block_size=2**16) as reader:
+        for block in reader:
+            break
+    assert reader.bytes_read == 2**16
+    assert not reader.thread.is_alive()
+    assert threading.active_count() == threads
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / "empty.mkv"
+    path.write_bytes(b'')
+    with BlockReader(str(path), progress=lambda read, total: None) as reader:
+        assert list(reader) == []
+
+
+def test_read_error_raised_in_caller(data_file, monkeypatch):
+    def fail(fd, offset, length):
+        raise ValueError("not an OSError")
+    monkeypatch.setattr(file_reader, 'advise_done', fail)
+    # the error ends the read-ahead thread, iterating raises it instead of waiting for a block
+    with pytest.raises(ValueError):
+        with BlockReader(data_file, block_size=2**16) as reader:
+            for block in reader:
+                pass
+    assert not reader.thread.is_alive()
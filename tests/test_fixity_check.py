@@ -0,0 +1,159 @@
+import hashlib
+import os
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from AV_Spex.checks import embed_fixity, fixity_check
+from AV_Spex.utils import fixity_cache
+
+
+@pytest.fixture
+def video_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(fixity_check, 'file_digests', {})
+    video_path = tmp_path / "JPC_AV_00001.mkv"
+    video_path.write_bytes(os.urandom(3 * 2**20 + 12345))
+    return str(video_path)
+
+
+def count_reads(monkeypatch):
+    reads = []
+    hash_file = fixity_check.hash_file
+
+    def counting_hash_file(filename, algorithms=('md5',), check_cancelled=None, signals=None, drop_cache=True):
+        reads.append(list(algorithms))
+        return hash_file(filename, algorithms, check_cancelled=check_cancelled, signals=signals, drop_cache=drop_cache)
+
+    monkeypatch.setattr(fixity_check, 'hash_file', counting_hash_file)
+    return reads
+
+
+def test_hash_file_computes_every_algorithm(video_file):
+    digests = fixity_check.hash_file(video_file, fixity_check.checksum_algorithms, check_cancelled=lambda: False)
+    with open(video_file, 'rb') as f:
+        data = f.read()
+    assert digests == {algorithm: hashlib.new(algorithm, data).hexdigest() for algorithm in fixity_check.checksum_algorithms}
+    assert fixity_check.hashlib_md5(video_file, check_cancelled=lambda: False) == digests['md5']
+
+
+def test_file_read_once_per_run(video_file, tmp_path, monkeypatch, setup_logging):
+    reads = count_reads(monkeypatch)
+    (tmp_path / "JPC_AV_00001_qc_metadata").mkdir()
+    md5_checksum = fixity_check.output_fixity(str(tmp_path), video_file, check_cancelled=lambda: False)
+    fixity_check.check_fixity(str(tmp_path), "JPC_AV_00001", check_cancelled=lambda: False)
+    assert reads == [['md5']]
+
+    fixity_check.get_file_digests(video_file, ['sha256', 'SHA256', 'crc32'], check_cancelled=lambda: False)
+    assert reads == [['md5'], ['sha256']]   # only what hasn't been calculated yet
+
+    with open(video_file, 'ab') as f:
+        f.write(b'changed')
+    os.utime(video_file, ns=(0, 0))
+    assert fixity_check.get_file_digests(video_file, check_cancelled=lambda: False)['md5'] != md5_checksum
+    assert len(reads) == 3
+
+
+def test_output_fixity_sidecars(video_file, tmp_path, monkeypatch):
+    monkeypatch.setattr(fixity_check.checks_config.fixity, 'checksum_algorithms', ['md5', 'sha256', 'blake2b'])
+    fixity_check.output_fixity(str(tmp_path), video_file, check_cancelled=lambda: False)
+    sidecars = {name.rsplit('.', 1)[1]: (tmp_path / name).read_text() for name in os.listdir(tmp_path) if '_fixity.' in name}
+    assert set(sidecars) == {'txt', 'md5', 'sha256', 'blake2b'}
+    with open(video_file, 'rb') as f:
+        data = f.read()
+    assert sidecars['sha256'] == f"{hashlib.sha256(data).hexdigest()}  JPC_AV_00001.mkv\n"
+    assert sidecars['txt'] == sidecars['md5'] == f"{hashlib.md5(data).hexdigest()}  JPC_AV_00001.mkv\n"
+
+
+def test_cached_digests_reused_across_runs(video_file, monkeypatch):
+    reads = count_reads(monkeypatch)
+    md5_checksum = fixity_check.get_file_digests(video_file, check_cancelled=lambda: False)['md5']
+    monkeypatch.setattr(fixity_check, 'file_digests', {})   # a new run
+    assert fixity_check.get_file_digests(video_file, check_cancelled=lambda: False)['md5'] == md5_checksum
+    assert reads == [['md5']]
+
+    monkeypatch.setattr(fixity_check, 'file_digests', {})
+    monkeypatch.setattr(fixity_cache, 'force_rehash', True)
+    assert fixity_check.get_file_digests(video_file, check_cancelled=lambda: False)['md5'] == md5_checksum
+    assert reads == [['md5'], ['md5']]
+    monkeypatch.setattr(fixity_cache, 'force_rehash', False)
+
+    # written to, with its modification time put back: the inode change time still differs
+    stat = os.stat(video_file)
+    with open(video_file, 'r+b') as f:
+        f.write(b'changed')
+    os.utime(video_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    monkeypatch.setattr(fixity_check, 'file_digests', {})
+    assert fixity_check.get_file_digests(video_file, check_cancelled=lambda: False)['md5'] != md5_checksum
+    assert len(reads) == 3
+
+
+def test_cache_max_age(video_file, fixity_cache_path, monkeypatch):
+    reads = count_reads(monkeypatch)
+    fixity_check.get_file_digests(video_file, check_cancelled=lambda: False)
+    with closing(sqlite3.connect(fixity_cache_path)) as connection, connection:
+        connection.execute("UPDATE digests SET calculated = calculated - 31 * 86400")
+    monkeypatch.setattr(fixity_check, 'file_digests', {})
+    fixity_check.get_file_digests(video_file, check_cancelled=lambda: False)
+    assert len(reads) == 2   # older than the default 30 days
+
+    monkeypatch.setattr(fixity_check.checks_config.fixity, 'cache_max_age_days', 0)
+    monkeypatch.setattr(fixity_check, 'file_digests', {})
+    fixity_check.get_file_digests(video_file, check_cancelled=lambda: False)
+    assert len(reads) == 3
+    assert fixity_cache.get_cached_digests(video_file, ['md5']) == {}
+
+
+def test_stream_hashes_cached(video_file, monkeypatch):
+    calls = []
+
+    def make_stream_hash(video_path, check_cancelled=None, signals=None):
+        calls.append(video_path)
+        return 'a' * 32, 'b' * 32
+
+    monkeypatch.setattr(embed_fixity, 'make_stream_hash', make_stream_hash)
+    assert embed_fixity.get_stream_hashes(video_file) == ('a' * 32, 'b' * 32)
+    assert embed_fixity.get_stream_hashes(video_file) == ('a' * 32, 'b' * 32)
+    assert calls == [video_file]
+
+
+def test_overwrite_recalculates_cached_stream_hashes(video_file, monkeypatch, setup_logging):
+    """Overwriting the embedded stream hashes calculates them again, as --force-rehash does"""
+    calls = []
+
+    def make_stream_hash(video_path, check_cancelled=None, signals=None):
+        calls.append(video_path)
+        return 'a' * 32, 'b' * 32
+
+    tags = {'xml': embed_fixity.add_stream_hash_tag('<Tags><Tag/></Tags>', 'c' * 32, 'd' * 32)}
+
+    def write_tags_to_mkv(video_path, xml_tags):
+        tags['xml'] = xml_tags
+        return True
+
+    fixity_cache.store_digests(video_file, {'video_stream_md5': 'c' * 32, 'audio_stream_md5': 'd' * 32})
+    monkeypatch.setattr(embed_fixity, 'make_stream_hash', make_stream_hash)
+    monkeypatch.setattr(embed_fixity, 'extract_tags', lambda video_path: tags['xml'])
+    monkeypatch.setattr(embed_fixity, 'write_tags_to_mkv', write_tags_to_mkv)
+    monkeypatch.setattr(embed_fixity.checks_config.fixity, 'overwrite_stream_fixity', 'yes')
+    embed_fixity.process_embedded_fixity(video_file, check_cancelled=lambda: False)
+    assert calls == [video_file]
+    assert 'a' * 32 in tags['xml'] and 'b' * 32 in tags['xml']
+    assert embed_fixity.get_stream_hashes(video_file) == ('a' * 32, 'b' * 32)
+
+
+def test_check_fixity_reads_the_file(video_file, tmp_path, monkeypatch, setup_logging):
+    """The fixity cache can't see decayed content: validating reads the file even when a checksum is cached"""
+    reads = count_reads(monkeypatch)
+    stored_md5 = 'f' * 32   # the checksum of the file before it decayed, cached and in the sidecar
+    fixity_cache.store_digests(video_file, {'md5': stored_md5})
+    (tmp_path / "JPC_AV_00001_2024_01_01_fixity.txt").write_text(f"{stored_md5}  JPC_AV_00001.mkv\n")
+    (tmp_path / "JPC_AV_00001_qc_metadata").mkdir()
+
+    # output_fixity uses the cache, check_fixity in the same run still reads the file
+    assert fixity_check.output_fixity(str(tmp_path), video_file, check_cancelled=lambda: False) == stored_md5
+    assert reads == []
+    fixity_check.check_fixity(str(tmp_path), "JPC_AV_00001", check_cancelled=lambda: False)
+    assert reads == [['md5']]
+    result_file, = (tmp_path / "JPC_AV_00001_qc_metadata").iterdir()
+    assert result_file.read_text().startswith("Fixity check failed")
@@ -0,0 +1,214 @@
+import json
+import shutil
+import subprocess
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from AV_Spex.checks import embed_fixity
+from AV_Spex.utils import mkv_tags
+
+
+def element(element_id, data):
+    """EBML element with an 8 byte size, as muxers write their level 1 elements"""
+    return bytes.fromhex(element_id) + (0x01 << 56 | len(data)).to_bytes(8, 'big') + data
+
+
+def void(length):
+    return b'\xec' + (0x01 << 56 | length - 9).to_bytes(8, 'big') + bytes(length - 9)
+
+
+def simple_tag(name, value):
+    return element('67c8', element('45a3', name.encode()) + element('4487', value.encode()))
+
+
+def tags_element(*tags):
+    return element('1254c367', b''.join(tags))
+
+
+global_tags = element('7373', element('63c0', b'') + simple_tag('ENCODER', 'Lavf60.3.100') + simple_tag('ENCODER_SETTINGS', 'SN 12345'))
+track_tags = element('7373', element('63c0', element('63c5', (42).to_bytes(4, 'big'))) + simple_tag('DURATION', '00:00:10.000000000'))
+cluster = element('1f43b675', bytes(range(256)) * 64)
+
+
+def write_mkv(path, tags_first=True, void_after_tags=0, seek_void=64):
+    """Minimal MKV: SeekHead, Info, Tags (before or after the Cluster), Cluster"""
+    info = element('1549a966', element('2ad7b1', (1000000).to_bytes(3, 'big')))
+    tags = tags_element(global_tags, track_tags) + (void(void_after_tags) if void_after_tags else b'')
+
+    def seek_head(info_position, tags_position):
+        seek = element('4dbb', element('53ab', bytes.fromhex('1549a966')) + element('53ac', info_position.to_bytes(8, 'big'))) + \
+            element('4dbb', element('53ab', bytes.fromhex('1254c367')) + element('53ac', tags_position.to_bytes(8, 'big')))
+        return element('114d9b74', seek) + void(seek_void) if seek_void else element('114d9b74', seek)
+
+    info_position = len(seek_head(0, 0))
+    body = info + tags + cluster if tags_first else info + cluster + tags
+    tags_position = info_position + (len(info) if tags_first else len(info) + len(cluster))
+    segment = element('18538067', seek_head(info_position, tags_position) + body)
+    ebml = element('1a45dfa3', element('4282', b'matroska'))
+    path.write_bytes(ebml + segment)
+    return str(path)
+
+
+def seek(element_id, position):
+    return element('4dbb', element('53ab', bytes.fromhex(element_id)) + element('53ac', position.to_bytes(8, 'big')))
+
+
+def write_mkv_split_tags(path, void_after_tags=0):
+    """
+    MKV with the tags in two Tags elements, one before and one after the Cluster, as some muxers write them.
+    The first SeekHead points to both, and to a second SeekHead after the Cluster that points to the second.
+    """
+    info = element('1549a966', element('2ad7b1', (1000000).to_bytes(3, 'big')))
+    first_tags = tags_element(global_tags) + (void(void_after_tags) if void_after_tags else b'')
+    second_tags = tags_element(track_tags)
+    seek_head_length = len(element('114d9b74', seek('1549a966', 0) * 4)) + 64
+    info_position = seek_head_length
+    first_tags_position = info_position + len(info)
+    second_tags_position = first_tags_position + len(first_tags) + len(cluster)
+    second_seek_head_position = second_tags_position + len(second_tags)
+    seek_head = element('114d9b74', seek('1549a966', info_position) + seek('1254c367', first_tags_position) +
+                        seek('1254c367', second_tags_position) + seek('114d9b74', second_seek_head_position)) + void(64)
+    second_seek_head = element('114d9b74', seek('1254c367', second_tags_position))
+    segment = element('18538067', seek_head + info + first_tags + cluster + second_tags + second_seek_head)
+    path.write_bytes(element('1a45dfa3', element('4282', b'matroska')) + segment)
+    return str(path)
+
+
+def check_seek_heads(path):
+    """Asserts that every Tags entry of every SeekHead points to a Tags element, and returns the layout"""
+    with open(path, 'rb') as f:
+        layout = mkv_tags.SegmentLayout(f)
+        for seek_head, entries in layout.seek_heads:
+            for seek_id, position in entries:
+                if seek_id == mkv_tags.TAGS_ID:
+                    assert mkv_tags.read_element(f, layout.segment.data_start + position).id == mkv_tags.TAGS_ID
+    return layout
+
+
+def simple_tags(root):
+    return {simple.findtext('Name'): simple.findtext('String') for simple in root.iter('Simple')}
+
+
+def add_tag(root, name, value):
+    simple = ET.SubElement(root.find('Tag'), 'Simple')
+    ET.SubElement(simple, 'Name').text = name
+    ET.SubElement(simple, 'String').text = value
+
+
+def test_read_tags(tmp_path):
+    root = mkv_tags.read_tags(write_mkv(tmp_path / "tags_first.mkv"))
+    assert [tag.findtext('Targets/TrackUID') for tag in root.findall('Tag')] == [None, '42']
+    assert simple_tags(root) == {'ENCODER': 'Lavf60.3.100', 'ENCODER_SETTINGS': 'SN 12345', 'DURATION': '00:00:10.000000000'}
+    # after the Cluster, found through the SeekHead
+    assert ET.tostring(mkv_tags.read_tags(write_mkv(tmp_path / "tags_last.mkv", tags_first=False))) == ET.tostring(root)
+
+
+def test_no_tags_or_not_matroska(tmp_path):
+    path = tmp_path / "no_tags.mkv"
+    path.write_bytes(element('1a45dfa3', b'') + element('18538067', element('1549a966', b'') + cluster))
+    assert mkv_tags.read_tags(str(path)) is None
+    path.write_bytes(b'RIFF' + bytes(100))
+    with pytest.raises(mkv_tags.MatroskaError):
+        mkv_tags.read_tags(str(path))
+
+
+@pytest.mark.parametrize("tags_first, void_after_tags, size_change", [
+    (True, 200, 0),       # fits in the Void after the Tags
+    (True, 0, 0),         # doesn't fit: appended, the old Tags become a Void
+    (False, 0, None),     # last in the file: the file grows
+])
+def test_write_tags_in_place(tmp_path, tags_first, void_after_tags, size_change):
+    path = write_mkv(tmp_path / "video.mkv", tags_first, void_after_tags)
+    with open(path, 'rb') as f:
+        original = f.read()
+    root = mkv_tags.read_tags(path)
+    add_tag(root, 'VIDEO_STREAM_HASH', 'a' * 32)
+    mkv_tags.write_tags(path, root)
+
+    with open(path, 'rb') as f:
+        written = f.read()
+    assert simple_tags(mkv_tags.read_tags(path))['VIDEO_STREAM_HASH'] == 'a' * 32
+    assert ET.tostring(mkv_tags.read_tags(path)) == ET.tostring(root)
+    assert written.find(cluster) == original.find(cluster)   # the Cluster hasn't moved
+    if size_change == 0:
+        assert len(written) == len(original)
+    with open(path, 'rb') as f:
+        layout = mkv_tags.SegmentLayout(f)
+    assert layout.segment.end == len(written)
+    assert len(layout.tags) == 1
+
+    # smaller again: in place, padded with a Void
+    root.find('Tag').remove(root.find('Tag').findall('Simple')[-1])
+    mkv_tags.write_tags(path, root)
+    assert 'VIDEO_STREAM_HASH' not in simple_tags(mkv_tags.read_tags(path))
+
+
+def test_seek_head_update(tmp_path):
+    path = write_mkv(tmp_path / "video.mkv", seek_void=0)
+    root = mkv_tags.read_tags(path)
+    add_tag(root, 'VIDEO_STREAM_HASH', 'a' * 32)
+    # no Void after the SeekHead, but its positions are 8 bytes: there is room to point it to the appended Tags
+    mkv_tags.write_tags(path, root)
+    assert simple_tags(mkv_tags.read_tags(path))['VIDEO_STREAM_HASH'] == 'a' * 32
+
+    # without a SeekHead, the Tags can't be appended
+    path = tmp_path / "no_seek_head.mkv"
+    path.write_bytes(element('1a45dfa3', b'') + element('18538067', tags_element(global_tags) + cluster))
+    with pytest.raises(mkv_tags.MatroskaError):
+        mkv_tags.write_tags(str(path), root)
+    assert path.read_bytes() == element('1a45dfa3', b'') + element('18538067', tags_element(global_tags) + cluster)
+
+
+@pytest.mark.parametrize("void_after_tags", [400, 0])   # in the space of the first Tags, or appended
+def test_write_split_tags(tmp_path, void_after_tags):
+    path = write_mkv_split_tags(tmp_path / "video.mkv", void_after_tags)
+    root = mkv_tags.read_tags(path)
+    assert len(check_seek_heads(path).tags) == 2
+    add_tag(root, 'VIDEO_STREAM_HASH', 'a' * 32)
+    mkv_tags.write_tags(path, root)
+
+    # the second Tags are a Void now: no SeekHead points to them any more
+    layout = check_seek_heads(path)
+    assert len(layout.tags) == 1 and len(layout.seek_heads) == 2
+    assert ET.tostring(mkv_tags.read_tags(path)) == ET.tostring(root)
+
+
+def test_embed_stream_hashes(tmp_path, setup_logging):
+    path = write_mkv(tmp_path / "video.mkv")
+    existing_tags = embed_fixity.extract_tags(path)
+    assert embed_fixity.extract_hashes(existing_tags) == (None, None)
+    embed_fixity.write_tags_to_mkv(path, embed_fixity.add_stream_hash_tag(existing_tags, 'a' * 32, 'b' * 32))
+    assert embed_fixity.extract_hashes(embed_fixity.extract_tags(path)) == ('a' * 32, 'b' * 32)
+    assert simple_tags(ET.fromstring(embed_fixity.extract_tags(path)))['ENCODER_SETTINGS'] == 'SN 12345'
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None or shutil.which('ffprobe') is None, reason="needs ffmpeg and ffprobe")
+def test_ffmpeg_mkv_round_trip(tmp_path, setup_logging):
+    path = str(tmp_path / "JPC_AV_00001.mkv")
+    subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc2=size=160x120:rate=30000/1001:duration=2',
+                    '-f', 'lavfi', '-i', 'sine=frequency=1000:sample_rate=48000:duration=2',
+                    '-c:v', 'ffv1', '-level', '3', '-g', '1', '-c:a', 'pcm_s24le',
+                    '-metadata', 'ENCODER_SETTINGS=SN 12345', path], check=True)
+    stream_hashes = embed_fixity.make_stream_hash(path)
+    assert None not in stream_hashes
+
+    # in the space of ffmpeg's Tags, then too long for it: appended after the Clusters
+    embed_fixity.write_tags_to_mkv(path, embed_fixity.add_stream_hash_tag(embed_fixity.extract_tags(path), *stream_hashes))
+    root = mkv_tags.read_tags(path)
+    add_tag(root, 'DESCRIPTION', 'Transferred from U-matic. ' * 200)
+    mkv_tags.write_tags(path, root)
+
+    assert len(check_seek_heads(path).tags) == 1
+    probe = subprocess.run(['ffprobe', '-v', 'error', '-show_entries', 'format_tags:stream=codec_type', '-of', 'json', path],
+                           stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    assert probe.stderr == ''
+    probed = json.loads(probe.stdout)
+    assert [stream['codec_type'] for stream in probed['streams']] == ['video', 'audio']
+    assert probed['format']['tags']['VIDEO_STREAM_HASH'] == stream_hashes[0]
+    assert probed['format']['tags']['ENCODER_SETTINGS'] == 'SN 12345'
+    assert probed['format']['tags']['DESCRIPTION'] == 'Transferred from U-matic. ' * 200
+    decode = subprocess.run(['ffmpeg', '-v', 'error', '-i', path, '-map', '0', '-f', 'null', '-'],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    assert decode.stderr == ''
+    assert embed_fixity.make_stream_hash(path) == stream_hashes
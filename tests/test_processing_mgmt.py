@@ -0,0 +1,167 @@
+import gzip
+import os
+import threading
+import time
+from dataclasses import replace
+
+import pytest
+
+from conftest import write_qctools_report
+
+from AV_Spex.checks import fixity_check, qct_parse
+from AV_Spex.processing import processing_mgmt
+
+
+class Signal:
+    def __init__(self):
+        self.emitted = []
+
+    def emit(self, value):
+        self.emitted.append(value)
+
+
+class Signals:
+    def __init__(self):
+        for name in ('fixity_progress', 'step_completed', 'md5_progress', 'stream_hash_progress'):
+            setattr(self, name, Signal())
+
+
+@pytest.fixture
+def fixity_settings(monkeypatch):
+    settings = replace(processing_mgmt.checks_config.fixity, embed_stream_fixity='no', validate_stream_fixity='yes',
+                       output_fixity='yes', check_fixity='no')
+    monkeypatch.setattr(processing_mgmt.checks_config, 'fixity', settings)
+    return settings
+
+
+def test_fixity_progress_merged():
+    signals = Signals()
+    progress = processing_mgmt.FixityProgress(signals)
+    progress.md5_progress.emit(50)
+    progress.stream_hash_progress.emit(10)
+    progress.md5_progress.emit(100)
+    progress.fixity_progress.emit("Outputting fixity...")
+    assert signals.md5_progress.emitted == [25, 55]
+    assert signals.stream_hash_progress.emitted == [30]
+    assert signals.fixity_progress.emitted == ["Outputting fixity..."]
+
+
+def test_stream_and_file_fixity_overlap(fixity_settings, monkeypatch):
+    both_running = threading.Barrier(2, timeout=5)
+    monkeypatch.setattr(processing_mgmt, 'stream_fixity_writes_tags', lambda video_path: False)
+    monkeypatch.setattr(processing_mgmt, 'validate_embedded_md5', lambda video_path, check_cancelled, signals: both_running.wait())
+    monkeypatch.setattr(processing_mgmt, 'output_fixity', lambda *args, check_cancelled, signals, **kwargs: both_running.wait())
+    signals = Signals()
+    processing_mgmt.ProcessingManager(signals=signals).process_fixity("/tmp", "/tmp/JPC_AV_00001.mkv", "JPC_AV_00001")
+    assert set(signals.step_completed.emitted) == {"Validate Stream Fixity", "Output Fixity"}
+
+
+def test_file_fixity_waits_for_tags(fixity_settings, monkeypatch):
+    steps = []
+    monkeypatch.setattr(processing_mgmt, 'stream_fixity_writes_tags', lambda video_path: True)
+    monkeypatch.setattr(processing_mgmt, 'validate_embedded_md5', lambda video_path, check_cancelled, signals: time.sleep(0.05) or steps.append('stream'))
+    monkeypatch.setattr(processing_mgmt, 'output_fixity', lambda *args, check_cancelled, signals, **kwargs: steps.append('file'))
+    processing_mgmt.ProcessingManager().process_fixity("/tmp", "/tmp/JPC_AV_00001.mkv", "JPC_AV_00001")
+    assert steps == ['stream', 'file']
+
+
+def test_failure_stops_the_other(fixity_settings, monkeypatch):
+    stream_cancelled = threading.Event()
+
+    def stream_hash(video_path, check_cancelled, signals):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            if check_cancelled():
+                stream_cancelled.set()
+                return None
+            time.sleep(0.01)
+
+    def output_fixity(*args, check_cancelled, signals, **kwargs):
+        raise OSError("disk error")
+
+    monkeypatch.setattr(processing_mgmt, 'stream_fixity_writes_tags', lambda video_path: False)
+    monkeypatch.setattr(processing_mgmt, 'validate_embedded_md5', stream_hash)
+    monkeypatch.setattr(processing_mgmt, 'output_fixity', output_fixity)
+    with pytest.raises(OSError):
+        processing_mgmt.ProcessingManager().process_fixity("/tmp", "/tmp/JPC_AV_00001.mkv", "JPC_AV_00001")
+    assert stream_cancelled.is_set()
+
+
+@pytest.mark.parametrize("writes_tags, drop_cache", [(False, False), (True, True)])
+def test_cache_kept_while_ffmpeg_reads(fixity_settings, monkeypatch, tmp_path, writes_tags, drop_cache):
+    """While ffmpeg decodes the same file, the file checksum mustn't drop the pages it is about to read"""
+    video_path = tmp_path / "JPC_AV_00001.mkv"
+    video_path.write_bytes(os.urandom(2**20))
+    readers = []
+
+    class RecordingReader(fixity_check.BlockReader):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            readers.append(self.drop_cache)
+
+    monkeypatch.setattr(fixity_check, 'file_digests', {})
+    monkeypatch.setattr(fixity_check, 'BlockReader', RecordingReader)
+    monkeypatch.setattr(processing_mgmt, 'stream_fixity_writes_tags', lambda video_path: writes_tags)
+    monkeypatch.setattr(processing_mgmt, 'validate_embedded_md5', lambda video_path, check_cancelled, signals: None)
+    processing_mgmt.ProcessingManager().process_fixity(str(tmp_path), str(video_path), "JPC_AV_00001")
+    assert readers == [drop_cache]
+
+
+class FinishedProcess:
+    """qcli, exited with an error"""
+    def poll(self):
+        return 1
+
+
+def damage_report(path, damage):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if damage == 'truncated':
+        data = data[:len(data) // 2]
+    elif damage == 'not_gzip':
+        data = b'qcli' + data
+    elif damage == 'corrupt_gzip':
+        data = data[:200] + bytes(byte ^ 0xff for byte in data[200:400]) + data[400:]
+    elif damage == 'corrupt_xml':
+        data = gzip.compress(gzip.decompress(data).replace(b'</frame>', b'</frme>', 5))
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+@pytest.mark.parametrize("damage", ['truncated', 'not_gzip', 'corrupt_gzip', 'corrupt_xml'])
+def test_live_qctparse_incomplete_report(monkeypatch, tmp_path, damage):
+    settings = replace(qct_parse.checks_config.tools.qct_parse, run_tool='yes', barsDetection=True,
+                       contentFilter=[], profile=['default'], tagname=None, thumbExport=False)
+    monkeypatch.setattr(qct_parse.checks_config.tools, 'qct_parse', settings)
+    monkeypatch.setattr(qct_parse.checks_config.outputs, 'qctools_ext', 'qctools.xml.gz')
+    report_path = write_qctools_report(tmp_path / "JPC_AV_00001.mkv.qctools.xml.gz", 400)
+    damage_report(report_path, damage)
+    critical = []
+    monkeypatch.setattr(processing_mgmt, 'start_qctools_command', lambda *args: FinishedProcess())
+    monkeypatch.setattr(processing_mgmt.logger, 'critical', critical.append)
+
+    results = processing_mgmt.run_live_qctparse("JPC_AV_00001.mkv", report_path, str(tmp_path), {},
+                                                check_cancelled=lambda: False)
+    assert results == {'qctools_output_path': report_path}
+    assert critical == ["QCTools report JPC_AV_00001.mkv.qctools.xml.gz is incomplete, qcli may have failed\n"]
+
+
+def test_each_run_reads_the_file_again(monkeypatch, tmp_path):
+    """Checksums calculated in one run (of the GUI, say) aren't reused by the next"""
+    video_path = tmp_path / "JPC_AV_00001.mkv"
+    video_path.write_bytes(os.urandom(2**16))
+    reads = []
+    hash_file = fixity_check.hash_file
+
+    def counting_hash_file(filename, algorithms=('md5',), **kwargs):
+        reads.append(filename)
+        return hash_file(filename, algorithms, **kwargs)
+
+    monkeypatch.setattr(fixity_check, 'file_digests', {})
+    monkeypatch.setattr(fixity_check, 'hash_file', counting_hash_file)
+    monkeypatch.setattr(fixity_check.checks_config.fixity, 'cache_max_age_days', 0)
+    for run in range(2):
+        processing_mgmt.ProcessingManager()
+        fixity_check.get_file_digests(str(video_path), check_cancelled=lambda: False)
+        fixity_check.get_file_digests(str(video_path), check_cancelled=lambda: False)   # shared within the run
+    assert reads == [str(video_path)] * 2
@@ -0,0 +1,364 @@
+import collections
+import csv
+import os
+from dataclasses import replace
+
+import pytest
+
+from conftest import start_growing_copy, synthetic_frame_values, write_qctools_report
+
+from AV_Spex.checks import qct_parse
+from AV_Spex.checks import qctools_report as report_reader
+from AV_Spex.checks.qctools_report import columns_paths, get_report_columns
+from AV_Spex.utils.generate_report import find_report_csvs, profile_csv_name, summarize_failures
+
+
+@pytest.fixture
+def qct_parse_settings(monkeypatch):
+    """Run profile, content filter, bars checks and tag statistics without exporting thumbnails"""
+    settings = replace(qct_parse.checks_config.tools.qct_parse,
+                       run_tool='yes', barsDetection=True, evaluateBars=True,
+                       contentFilter=['allBlack'], profile=['default'], tagname=None, thumbExport=False,
+                       tagStatistics=True)
+    monkeypatch.setattr(qct_parse.checks_config.tools, 'qct_parse', settings)
+    monkeypatch.setattr(qct_parse.checks_config.outputs, 'qctools_ext', 'qctools.xml.gz')
+    return settings
+
+
+def read_outputs(report_directory):
+    outputs = {}
+    for file in sorted(os.listdir(report_directory)):
+        with open(os.path.join(report_directory, file), 'rb') as f:
+            outputs[file] = f.read()
+    return outputs
+
+
+def test_single_pass_matches_multipass(qctools_report, qct_parse_settings, tmp_path, setup_logging):
+    multipass_dir = tmp_path / "multipass"
+    single_pass_dir = tmp_path / "single_pass"
+    multipass_dir.mkdir()
+    single_pass_dir.mkdir()
+
+    qct_parse.run_qctparse("JPC_AV_00001.mkv", qctools_report, str(multipass_dir), check_cancelled=lambda: False, single_pass=False)
+    qct_parse.run_qctparse("JPC_AV_00001.mkv", qctools_report, str(single_pass_dir), check_cancelled=lambda: False, single_pass=True)
+
+    multipass_outputs = read_outputs(multipass_dir)
+    assert set(multipass_outputs) == {
+        "qct-parse_contentFilter_allBlack_summary.csv",
+        "qct-parse_profile_failures.csv",
+        "qct-parse_profile_failure_segments.csv",
+        "qct-parse_profile_summary.csv",
+        "qct-parse_colorbars_durations.csv",
+        "qct-parse_colorbars_values.csv",
+        "qct-parse_colorbars_eval_failures.csv",
+        "qct-parse_colorbars_eval_failure_segments.csv",
+        "qct-parse_colorbars_eval_summary.csv",
+        "qct-parse_tag_statistics.csv",
+    }
+    assert read_outputs(single_pass_dir) == multipass_outputs
+
+
+@pytest.mark.parametrize("single_pass", [True, False])
+def test_report_parsed_while_written(qctools_report, qct_parse_settings, tmp_path, monkeypatch, setup_logging, single_pass):
+    monkeypatch.setattr(report_reader, 'follow_poll_interval', 0.001)
+    finished_dir = tmp_path / "finished"
+    live_dir = tmp_path / "live"
+    finished_dir.mkdir()
+    live_dir.mkdir()
+    qct_parse.run_qctparse("JPC_AV_00001.mkv", qctools_report, str(finished_dir), check_cancelled=lambda: False)
+
+    growing_report = str(tmp_path / "JPC_AV_00001.live.qctools.xml.gz")
+    writer = start_growing_copy(qctools_report, growing_report)
+    qct_parse.run_qctparse("JPC_AV_00001.mkv", growing_report, str(live_dir), check_cancelled=lambda: False,
+                           single_pass=single_pass, follow=writer.is_alive)
+    assert not writer.is_alive()
+    assert read_outputs(live_dir) == read_outputs(finished_dir)
+
+
+def test_run_qctparse_on_signalstats(qctools_report, qct_parse_settings, signalstats_output, tmp_path, setup_logging):
+    report_dir = tmp_path / "report"
+    signalstats_dir = tmp_path / "signalstats"
+    report_dir.mkdir()
+    signalstats_dir.mkdir()
+    qct_parse.run_qctparse("JPC_AV_00001.mkv", qctools_report, str(report_dir), check_cancelled=lambda: False)
+
+    columns = report_reader.read_signalstats("JPC_AV_00001.mkv")
+    qct_parse.run_qctparse("JPC_AV_00001.mkv", str(tmp_path / "JPC_AV_00001.mkv.qctools.xml.gz"), str(signalstats_dir),
+                           check_cancelled=lambda: False, single_pass=False, columns=columns)
+    assert read_outputs(signalstats_dir) == read_outputs(report_dir)
+
+
+def test_single_pass_cancelled(qctools_report, qct_parse_settings, tmp_path, setup_logging):
+    result = qct_parse.run_qctparse("JPC_AV_00001.mkv", qctools_report, str(tmp_path), check_cancelled=lambda: True)
+    assert result is None
+    assert not any(file.startswith("qct-parse_") for file in os.listdir(tmp_path))
+
+
+def test_single_pass_from_columns_cache(qctools_report, qct_parse_settings, tmp_path, setup_logging):
+    first_run_dir = tmp_path / "first_run"
+    cached_run_dir = tmp_path / "cached_run"
+    first_run_dir.mkdir()
+    cached_run_dir.mkdir()
+
+    qct_parse.run_qctparse("JPC_AV_00001.mkv", qctools_report, str(first_run_dir), check_cancelled=lambda: False)
+    assert os.path.isfile(columns_paths(qctools_report)[0])
+    qct_parse.run_qctparse("JPC_AV_00001.mkv", qctools_report, str(cached_run_dir), check_cancelled=lambda: False)
+
+    assert read_outputs(cached_run_dir) == read_outputs(first_run_dir)
+
+
+@pytest.mark.parametrize("durationEnd", [99999999, 5.0])
+def test_evaluate_thresholds_matches_analyzeIt(qctools_report, qct_parse_settings, durationEnd):
+    profile = {'YMIN': 10, 'YMAX': 935, 'SATMAX': 180.0, 'TOUT': 0.009, 'BRNG': 0.01, 'mse.y': 5}
+    qct_parse_dict = qct_parse.asdict(qct_parse_settings)
+    legacy = qct_parse.analyzeIt(qct_parse_dict, "JPC_AV_00001.mkv", profile, "test", qctools_report, 'pkt_pts_time',
+                                 0, durationEnd, "", 9000, 9000, collections.deque(maxlen=11), check_cancelled=lambda: False)
+    columns = get_report_columns(qctools_report)
+    vectorized = qct_parse.evaluate_thresholds(qct_parse_dict, "JPC_AV_00001.mkv", columns, profile, "test", qctools_report,
+                                               0, durationEnd, "", 9000, 9000)
+    assert vectorized[:3] == legacy[:3]
+    assert list(vectorized[3].rows()) == list(legacy[3].rows())
+    assert legacy[2] > 0
+
+
+def test_failure_store_flushes_to_csv(tmp_path):
+    rows = [("1.001000", 'YMIN', 4.0, 10.0, 30), ("1.001000", 'SATMAX', 200.5, 180.0, 30), ("2.002000", 'YMIN', 3.0, 10.0, 60)] * 5
+    streamed_path = tmp_path / "streamed.csv"
+    streamed = qct_parse.FailureStore(str(streamed_path), flush_size=4)
+    in_memory = qct_parse.FailureStore()
+    for row in rows:
+        streamed.add(*row)
+        in_memory.add(*row)
+    assert streamed_path.exists() and len(streamed.seconds) < 4   # flushed as it goes
+    assert len(streamed) == len(in_memory) == len(rows)
+    qct_parse.save_failures_to_csv(streamed, str(streamed_path))
+    qct_parse.save_failures_to_csv(in_memory, str(tmp_path / "in_memory.csv"))
+    assert streamed_path.read_text() == (tmp_path / "in_memory.csv").read_text()
+
+    summary = summarize_failures(str(streamed_path))
+    assert summary[qct_parse.dts2ts("1.001000")][0] == {'tag': 'SATMAX', 'tagValue': 200.5, 'over': 180.0}
+
+    cancelled_path = tmp_path / "cancelled_failures.csv"
+    cancelled = qct_parse.FailureStore(str(cancelled_path), flush_size=1)
+    cancelled.add(*rows[0])
+    cancelled.add(*rows[2])
+    assert cancelled_path.exists()
+    cancelled.discard()
+    assert not cancelled_path.exists()
+    assert not (tmp_path / "cancelled_failure_segments.csv").exists()
+
+
+def test_failure_segments(tmp_path):
+    failures = qct_parse.FailureStore(str(tmp_path / "qct-parse_tags_failures.csv"))
+    for frame in range(10, 20):
+        failures.add(frame / 10, 'YMIN', 9 - frame % 3, 10.0, frame)
+        if frame % 5:
+            failures.add(frame / 10, 'SATMAX', 200.0 + frame, 180.0, frame)
+    failures.add(3.0, 'YMIN', 5.0, 10.0, 30)
+    qct_parse.save_failures_to_csv(failures, str(tmp_path / "qct-parse_tags_failures.csv"))
+
+    with open(tmp_path / "qct-parse_tags_failure_segments.csv", newline='') as f:
+        segments = [(row['Tag'], row['Start'], row['End'], row['Frame Count'], row['Peak Value'], row['Peak Deviation'])
+                    for row in csv.DictReader(f)]
+    ts = qct_parse.dts2ts
+    assert segments == [
+        ('SATMAX', ts(1.1), ts(1.4), '4', '214.0', '34.0'),
+        ('YMIN', ts(1.0), ts(1.9), '10', '7.0', '3.0'),
+        ('SATMAX', ts(1.6), ts(1.9), '4', '219.0', '39.0'),
+        ('YMIN', ts(3.0), ts(3.0), '1', '5.0', '5.0'),
+    ]
+
+    # the report summary can be made from the segments instead of every failing frame
+    summary = summarize_failures(str(tmp_path / "qct-parse_tags_failure_segments.csv"))
+    assert summary[ts(1.9)] == [{'tag': 'SATMAX', 'tagValue': 219.0, 'over': 180.0, 'start': ts(1.6), 'end': ts(1.9), 'frames': 4}]
+    assert summary[ts(3.0)][0]['tagValue'] == 5.0
+
+
+def test_tag_check_single_pass_matches_multipass(qctools_report, qct_parse_settings, tmp_path, monkeypatch, setup_logging):
+    monkeypatch.setattr(qct_parse_settings, 'tagname', "YMIN, lt, 10; SATMAX, gt, 180")
+    multipass_dir = tmp_path / "multipass"
+    single_pass_dir = tmp_path / "single_pass"
+    multipass_dir.mkdir()
+    single_pass_dir.mkdir()
+
+    qct_parse.run_qctparse("JPC_AV_00001.mkv", qctools_report, str(multipass_dir), check_cancelled=lambda: False, single_pass=False)
+    qct_parse.run_qctparse("JPC_AV_00001.mkv", qctools_report, str(single_pass_dir), check_cancelled=lambda: False, single_pass=True)
+
+    multipass_outputs = read_outputs(multipass_dir)
+    summary = multipass_outputs["qct-parse_tags_summary.csv"].decode().splitlines()
+    assert summary[1] == "qct-parse evaluation of user specified tags summary"
+    assert [row.split(",")[0] for row in summary[3:]] == ["Tag", "YMIN", "SATMAX", "Total"]
+    assert "qct-parse_tags_failures.csv" in multipass_outputs
+    assert read_outputs(single_pass_dir) == multipass_outputs
+
+
+def test_all_profiles_in_one_pass(qctools_report, qct_parse_settings, tmp_path, monkeypatch, setup_logging):
+    templates = list(qct_parse.spex_config.qct_parse_values.profiles.__dict__)
+    monkeypatch.setattr(qct_parse_settings, 'profile', ['all'])
+    multipass_dir = tmp_path / "multipass"
+    single_pass_dir = tmp_path / "single_pass"
+    multipass_dir.mkdir()
+    single_pass_dir.mkdir()
+    qct_parse.run_qctparse("JPC_AV_00001.mkv", qctools_report, str(multipass_dir), check_cancelled=lambda: False, single_pass=False)
+    qct_parse.run_qctparse("JPC_AV_00001.mkv", qctools_report, str(single_pass_dir), check_cancelled=lambda: False, single_pass=True)
+    all_outputs = read_outputs(single_pass_dir)
+    assert all_outputs == read_outputs(multipass_dir)
+
+    summaries = find_report_csvs(str(single_pass_dir))[4]
+    assert [profile_csv_name(summary) for summary in summaries] == sorted(templates)
+
+    # each summary is the one a run with just that profile writes
+    for template in templates:
+        profile_dir = tmp_path / template
+        profile_dir.mkdir()
+        monkeypatch.setattr(qct_parse_settings, 'profile', [template])
+        qct_parse.run_qctparse("JPC_AV_00001.mkv", qctools_report, str(profile_dir), check_cancelled=lambda: False)
+        profile_outputs = read_outputs(profile_dir)
+        assert all_outputs[f"qct-parse_profile_summary_{template}.csv"] == profile_outputs["qct-parse_profile_summary.csv"]
+        assert all_outputs.get(f"qct-parse_profile_failures_{template}.csv") == profile_outputs.get("qct-parse_profile_failures.csv")
+
+
+@pytest.mark.parametrize("tagname", [
+    "YMIN, lt, 100",
+    "YMIN, lt, 100; mse_y, gt, 5\nBRNG, foo, 1",
+    [["YMIN", "lt", 100], ["mse_y", "gt", "5"]],
+    ["YMIN, lt, 100", "[mse_y, gt, 5]"],
+])
+def test_compile_tagname(tagname, setup_logging):
+    rules = list(qct_parse.compile_tagname(tagname))
+    assert rules[0] == qct_parse.ThresholdRule('YMIN', 'YMIN', qct_parse.operator.lt, 100.0)
+    if len(rules) > 1:
+        assert rules[1] == qct_parse.ThresholdRule('mse_y', 'mse.y', qct_parse.operator.gt, 5.0)
+    assert len(rules) <= 2   # BRNG has no valid operator
+
+
+def test_needed_keys(qct_parse_settings):
+    qct_parse_dict = qct_parse.asdict(qct_parse_settings)
+    frame_keys = qct_parse.get_needed_keys(qct_parse_dict, threshold_checks=False)
+    assert set(qct_parse.bars_evaluation_keys) <= frame_keys
+    assert 'TOUT' not in frame_keys
+    assert 'TOUT' in qct_parse.get_needed_keys(qct_parse_dict)   # from the default profile
+
+
+def bars_frames(bars, seconds_per_frame=0.1):
+    """frameDicts of an 8-bit tape where frame i has the bars signature if bars[i] is true"""
+    frames = []
+    for index, is_bars in enumerate(bars):
+        values = {'YMAX': 235.0, 'YMIN': 4.0, 'YDIF': 1.0} if is_bars else {'YMAX': 200.0, 'YMIN': 20.0, 'YDIF': 6.0}
+        values.update({key: float(100 + index % 7) for key in qct_parse.bars_evaluation_keys if key not in values})
+        frames.append({'pkt_pts_time': f"{index * seconds_per_frame:.6f}", **values})
+    return frames
+
+
+@pytest.mark.parametrize("bars, durationLimit", [
+    ([False] * 5 + [True] * 40 + [False] * 20, None),                          # bars, then program
+    ([False] * 5 + [True] * 10 + [False] * 3 + [True] * 30 + [False] * 10, None),   # dropout before 2 seconds of bars
+    ([True] * 40, None),                                                       # bars never end
+    ([False] * 40, None),                                                      # no bars
+    ([False] * 5 + [True] * 40 + [False] * 20, 3.0),                           # bars still running at the limit
+    ([False] * 50 + [True] * 40 + [False] * 5, 3.0),                           # bars after the limit
+    ([False] * 5 + [True] + [False] * 10 + [True] * 40 + [False] * 20, None),   # an isolated frame with the signature before the bars
+    ([False] * 5 + [True] * 10 + [False] * 40, None),                          # too short to be bars
+])
+def test_bars_columns_match_frames(bars, durationLimit):
+    frames = bars_frames(bars)
+    builder = report_reader.ColumnsBuilder()
+    for frameDict in frames:
+        builder.feed('pkt_pts_time', frameDict)
+    columns = builder.build()
+
+    barsDetection = qct_parse.BarsDetection('pkt_pts_time', False, durationLimit)
+    for frameDict in frames:
+        barsDetection.feed(frameDict)
+        if barsDetection.done:
+            break
+    barsDuration = qct_parse.detect_bars_columns(columns, False, durationLimit)
+    assert barsDuration == (barsDetection.durationStart, barsDetection.durationEnd, barsDetection.barsStartString, barsDetection.barsEndString)
+
+    if barsDuration.durationStart != "":
+        assert (qct_parse.evaluate_bars_columns(columns, barsDuration.durationStart, barsDuration.durationEnd) ==
+                qct_parse.evalBarsFrames(frames, 'pkt_pts_time', barsDuration.durationStart, barsDuration.durationEnd))
+    if bars == [True] * 40:
+        assert barsDuration.barsEndString is None and barsDuration.durationEnd == pytest.approx(3.9)
+    if bars[:16] == [False] * 5 + [True] + [False] * 10:
+        # the bars start at the first of bars_start_frames frames in a row, not at the isolated frame
+        assert barsDuration.durationStart == pytest.approx(1.6) and barsDuration.barsStartString == qct_parse.dts2ts("1.600000")
+        assert barsDuration.durationEnd == pytest.approx(5.5)
+
+
+def test_content_filter_reads_whole_report(qct_parse_settings, tmp_path, setup_logging):
+    black_frames = set(range(0, 5)) | set(range(200, 211)) | set(range(215, 221)) | set(range(500, 511))
+    report_path = write_qctools_report(
+        tmp_path / "JPC_AV_00001.mkv.qctools.xml.gz", 600,
+        frame_values=lambda index: synthetic_frame_values(0 if index in black_frames else 300))
+    output = tmp_path / "allBlack.csv"
+    qct_parse.detectContentFilter(report_path, 'pkt_pts_time', 'allBlack',
+                                  qct_parse.compile_content_filter({'YMAX': "300.0, lt", 'YHIGH': "115.0, lt", 'YLOW': "97.0, lt", 'YMIN': "6.5, lt"}),
+                                  str(output), qct_parse.asdict(qct_parse_settings), "", "JPC_AV_00001.mkv")
+
+    def timestamp(index):
+        return qct_parse.dts2ts(f"{index * 1001 / 30000:.6f}")
+
+    # 200-210 and 215-220 are less than 5 seconds apart, so they are one segment
+    assert output.read_text().splitlines() == [
+        "qct-parse content detection summary:",
+        "Segments found within thresholds of content filter allBlack:",
+        f"{timestamp(0)} - {timestamp(4)}",
+        f"{timestamp(200)} - {timestamp(220)}",
+        f"{timestamp(500)} - {timestamp(510)}",
+    ]
+
+
+def test_thumbnail_queue_runs_capped_batch(tmp_path, monkeypatch):
+    import threading
+    import time
+
+    running = []
+    ran = []
+    lock = threading.Lock()
+
+    def fake_run(command, **kwargs):
+        with lock:
+            running.append(command)
+            peak = len(running)
+        time.sleep(0.01)
+        with open(command[-1], 'w'):
+            pass
+        with lock:
+            running.remove(command)
+            ran.append((command, peak))
+
+    monkeypatch.setattr(qct_parse.subprocess, 'run', fake_run)
+    queue = qct_parse.ThumbnailQueue(max_workers=2)
+    for index in range(10):
+        queue.add(str(tmp_path / f"{index}.png"), ['ffmpeg', '-ss', f"00:00:0{index}.0000", str(tmp_path / f"{index}.png")])
+    queue.add(str(tmp_path / "0.png"), ['ffmpeg', 'duplicate'])
+
+    assert queue.render() == 10
+    assert len(ran) == 10
+    assert max(peak for command, peak in ran) <= 2
+    assert len(queue) == 0
+
+
+def test_thumbnails_rendered_before_run_qctparse_returns(qctools_report, qct_parse_settings, tmp_path, monkeypatch, setup_logging):
+    commands = []
+
+    def fake_run(command, **kwargs):
+        commands.append(command)
+        with open(command[-1], 'w'):
+            pass
+
+    monkeypatch.setattr(qct_parse.subprocess, 'run', fake_run)
+    monkeypatch.setattr(qct_parse.checks_config.tools, 'qct_parse', replace(qct_parse_settings, thumbExport=True))
+    video_path = tmp_path / "JPC_AV_00001.mkv"
+    video_path.write_bytes(b"")
+    report_directory = tmp_path / "report_csvs"
+    report_directory.mkdir()
+
+    qct_parse.run_qctparse(str(video_path), qctools_report, str(report_directory), check_cancelled=lambda: False)
+
+    assert commands
+    assert all(command[0] == 'ffmpeg' and command[4] == str(video_path) for command in commands)
+    thumbnails = os.listdir(report_directory / "ThumbExports")
+    assert len(thumbnails) == len(commands)
+    assert any(".color_bars_detection.bars_found." in thumbnail for thumbnail in thumbnails)
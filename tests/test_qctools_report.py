@@ -0,0 +1,392 @@
+import os
+
+import pytest
+
+from conftest import start_growing_copy, write_qctools_report
+
+from AV_Spex.checks import qctools_report as report_reader
+from AV_Spex.checks.qctools_report import (
+    iter_report_frames, iterparse_report_frames, scan_report_frames, get_report_columns, load_columns, columns_paths,
+    release_frame, build_report_index, load_report_index, iter_report_window, index_paths, iter_signalstats_frames,
+    read_signalstats, merge_reports
+)
+
+
+def test_columns_round_trip(qctools_report):
+    parsed = list(iter_report_frames(qctools_report))
+    columns = get_report_columns(qctools_report)
+
+    assert columns.pkt == 'pkt_pts_time'
+    assert columns.frame_count == len(parsed) == 400
+    assert 'mse.y' in columns   # psnr/mse keys keep their two-part name
+
+    cached = load_columns(qctools_report)
+    assert cached is not None
+    for (pkt, parsed_frame), (_, cached_frame) in zip(parsed, cached.iter_frames()):
+        assert cached_frame[pkt] == parsed_frame[pkt]
+        assert {key: float(value) for key, value in parsed_frame.items() if key != pkt} == \
+               {key: value for key, value in cached_frame.items() if key != pkt}
+
+
+def test_cancelled_decode_writes_no_columns(qctools_report):
+    assert get_report_columns(qctools_report, check_cancelled=lambda: True) is None
+    assert load_columns(qctools_report) is None
+
+
+def test_stale_columns_ignored(qctools_report):
+    get_report_columns(qctools_report)
+
+    # a touched but unchanged report is matched by its hash
+    stat = os.stat(qctools_report)
+    os.utime(qctools_report, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert load_columns(qctools_report) is not None
+
+    # a different report is not
+    write_qctools_report(qctools_report, 300)
+    assert load_columns(qctools_report) is None
+    assert get_report_columns(qctools_report).frame_count == 300
+
+
+def test_sidecars_kept_out_of_report_directory(qctools_report, qctools_cache_dir, monkeypatch):
+    monkeypatch.setattr(report_reader, 'index_spacing', 4096)
+    monkeypatch.setattr(report_reader, 'window_stream_seconds', 1)
+    get_report_columns(qctools_report)
+    list(iter_report_window(qctools_report, 10, 11))
+    assert os.listdir(os.path.dirname(qctools_report)) == [os.path.basename(qctools_report)]
+    assert os.path.dirname(columns_paths(qctools_report)[0]) == qctools_cache_dir
+    assert load_columns(qctools_report) is not None and load_report_index(qctools_report) is not None
+
+    # a report with the same name in another directory has its own sidecars
+    other_directory = os.path.join(os.path.dirname(qctools_report), "other")
+    os.mkdir(other_directory)
+    other_report = write_qctools_report(os.path.join(other_directory, os.path.basename(qctools_report)), 300)
+    assert columns_paths(other_report) != columns_paths(qctools_report)
+    assert get_report_columns(other_report).frame_count == 300
+    assert get_report_columns(qctools_report).frame_count == 400
+
+
+def test_unreadable_columns_ignored(qctools_report, setup_logging):
+    get_report_columns(qctools_report)
+    columns_path, _ = columns_paths(qctools_report)
+    with open(columns_path, 'wb') as f:
+        f.write(b'not a numpy file')
+    assert load_columns(qctools_report) is None
+
+
+def test_parser_keeps_only_requested_keys(qctools_report):
+    frames = list(iter_report_frames(qctools_report, keys={'YMAX', 'mse.y'}))
+    assert len(frames) == 400
+    assert all(set(frameDict) == {'pkt_pts_time', 'YMAX', 'mse.y'} for pkt, frameDict in frames)
+    last_frame = list(iter_report_frames(qctools_report))[-1][1]
+    assert frames[-1][1] == {key: last_frame[key] for key in ('pkt_pts_time', 'YMAX', 'mse.y')}
+
+
+def test_released_frames_leave_tree(qctools_report):
+    import gzip
+    from lxml import etree
+
+    with gzip.open(qctools_report) as xml:
+        for event, elem in etree.iterparse(xml, events=('end',), tag='frame'):
+            release_frame(elem)
+            assert elem.getprevious() is None
+
+
+def test_long_report_parsed_in_bounded_memory(tmp_path):
+    import gzip
+    import tracemalloc
+
+    # 500k small frames, written in blocks so the report is quick to make
+    frame = ('<frame media_type="video" pkt_pts_time="1.000000"><tag key="lavfi.signalstats.YMAX" value="940"/>'
+             '<tag key="lavfi.signalstats.YMIN" value="4"/></frame>\n')
+    report_path = str(tmp_path / "long.mkv.qctools.xml.gz")
+    with gzip.open(report_path, 'wt', compresslevel=1) as report:
+        report.write("<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n<ffprobe:ffprobe xmlns:ffprobe='http://www.ffmpeg.org/schema/ffprobe'>\n<frames>\n")
+        for block in range(500):
+            report.write(frame * 1000)
+        report.write("</frames>\n</ffprobe:ffprobe>\n")
+
+    tracemalloc.start()
+    try:
+        frame_count = 0
+        for pkt, frameDict in iter_report_frames(report_path, keys={'YMAX'}, fast=False):
+            frame_count += 1
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert frame_count == 500_000
+    assert peak < 5 * 2**20
+
+
+def rewrite_report(report_path, old, new, count=1):
+    import gzip
+    with gzip.open(report_path, 'rt') as report:
+        text = report.read()
+    with gzip.open(report_path, 'wt') as report:
+        report.write(text.replace(old, new, count))
+
+
+@pytest.mark.parametrize("chunk_size", [2**20, 97])
+@pytest.mark.parametrize("keys", [None, {'YMAX', 'YMIN', 'YDIF', 'mse.y'}])
+def test_scanner_matches_iterparse(qctools_report, monkeypatch, chunk_size, keys):
+    # small chunks cut frames, tags and "<frame" itself at every possible place
+    monkeypatch.setattr(report_reader, 'scan_chunk_size', chunk_size)
+    expected = list(iterparse_report_frames(qctools_report, keys))
+    assert list(scan_report_frames(qctools_report, keys)) == expected
+
+
+def test_scanner_pkt_dts_time_and_empty_frames(tmp_path):
+    report_path = write_qctools_report(tmp_path / "dts.mkv.qctools.xml.gz", 50, pkt='pkt_dts_time')
+    # an audio frame without tags is written as a self-closing element
+    rewrite_report(report_path,
+                   'pkt_duration_time="0.033367">\n            <tag key="lavfi.astats.Overall.Peak_level" value="-6.02"/>\n        </frame>',
+                   'pkt_duration_time="0.033367"/>', count=10)
+    expected = list(iterparse_report_frames(report_path))
+    assert expected[0][0] == 'pkt_dts_time'
+    assert list(scan_report_frames(report_path)) == expected
+
+
+def test_scanner_falls_back_on_unexpected_markup(qctools_report):
+    rewrite_report(qctools_report, '<tag key="lavfi.psnr.mse.y" value="3"/>',
+                   '<tag key="lavfi.psnr.mse.y" value="3"/><side_data_list><side_data side_data_type="SEI"/></side_data_list>')
+    scanned = list(scan_report_frames(qctools_report))
+    assert scanned[-1] is None
+    assert 0 < len(scanned) - 1 < 400
+    assert list(iter_report_frames(qctools_report)) == list(iterparse_report_frames(qctools_report))
+
+
+def test_scanner_falls_back_on_escaped_values(qctools_report):
+    rewrite_report(qctools_report, 'value="-6.02"', 'value="&#45;6.02"')
+    scanned = list(scan_report_frames(qctools_report))
+    assert scanned[-1] is None and len(scanned) == 2   # stops at the first audio frame
+    assert list(iter_report_frames(qctools_report)) == list(iterparse_report_frames(qctools_report))
+
+
+def expected_window(report_path, durationStart, durationEnd, keys=None):
+    window = []
+    for pkt, frameDict in iterparse_report_frames(report_path, keys):
+        seconds = float(frameDict[pkt])
+        if seconds > durationEnd:
+            break
+        if seconds >= durationStart:
+            window.append((pkt, frameDict))
+    return window
+
+
+def test_report_index_checkpoints(qctools_report):
+    import gzip
+    with gzip.open(qctools_report, 'rb') as report:
+        xml = report.read()
+
+    index = build_report_index(qctools_report, spacing=4096)
+    assert index['pkt'] == 'pkt_pts_time'
+    assert len(index['checkpoints']) > 10
+    previous_offset = -4096
+    for seconds, offset in index['checkpoints']:
+        # every checkpoint is the start of a video frame with the recorded timestamp
+        assert xml.startswith(b'<frame media_type="video"', offset)
+        assert f'pkt_pts_time="{seconds:.6f}"'.encode() in xml[offset:xml.index(b'>', offset)]
+        assert offset - previous_offset >= 4096
+        previous_offset = offset
+
+
+@pytest.mark.parametrize("durationStart, durationEnd", [(0, 1), (4.1, 6.2), (12.5, 100), (20, 30)])
+def test_report_window_matches_iterparse(qctools_report, monkeypatch, durationStart, durationEnd):
+    monkeypatch.setattr(report_reader, 'index_spacing', 4096)
+    monkeypatch.setattr(report_reader, 'window_stream_seconds', 1)
+    keys = {'YMAX', 'YMIN'}
+    expected = expected_window(qctools_report, durationStart, durationEnd, keys)
+    assert list(iter_report_window(qctools_report, durationStart, durationEnd, keys)) == expected
+    index = load_report_index(qctools_report)
+    if durationStart <= 1:
+        # read from the top, the report isn't indexed
+        assert index is None
+    else:
+        assert index is not None and len(index['checkpoints']) > 10
+    # a second read uses the saved index
+    assert list(iter_report_window(qctools_report, durationStart, durationEnd, keys)) == expected
+
+
+def test_report_window_near_start_not_indexed(qctools_report, monkeypatch):
+    monkeypatch.setattr(report_reader, 'index_spacing', 4096)
+    monkeypatch.setattr(report_reader, 'window_stream_seconds', 5)
+    built = []
+    monkeypatch.setattr(report_reader, 'build_report_index',
+                        lambda *args, **kwargs: built.append(args) or build_report_index(*args, **kwargs))
+    # the bars at the start of a tape: the frames before the window are skipped, not indexed
+    for durationStart, durationEnd in [(0, 3), (2, 4), (5, 7)]:
+        assert list(iter_report_window(qctools_report, durationStart, durationEnd)) == \
+            expected_window(qctools_report, durationStart, durationEnd)
+    assert not built and load_report_index(qctools_report) is None
+
+    # further in, the first read indexes the report and later reads reuse the index
+    for durationStart, durationEnd in [(8, 9), (10, 11), (2, 4)]:
+        assert list(iter_report_window(qctools_report, durationStart, durationEnd)) == \
+            expected_window(qctools_report, durationStart, durationEnd)
+    assert len(built) == 1 and load_report_index(qctools_report) is not None
+
+
+def test_report_window_stale_index_rebuilt(qctools_report, monkeypatch):
+    monkeypatch.setattr(report_reader, 'index_spacing', 4096)
+    monkeypatch.setattr(report_reader, 'window_stream_seconds', 1)
+    list(iter_report_window(qctools_report, 5, 6))
+    write_qctools_report(qctools_report, 300, pkt='pkt_dts_time')
+    assert load_report_index(qctools_report) is None
+    expected = expected_window(qctools_report, 5, 6)
+    assert expected[0][0] == 'pkt_dts_time'
+    assert list(iter_report_window(qctools_report, 5, 6)) == expected
+
+
+def test_report_window_falls_back_on_unexpected_markup(qctools_report, monkeypatch):
+    monkeypatch.setattr(report_reader, 'index_spacing', 4096)
+    monkeypatch.setattr(report_reader, 'window_stream_seconds', 1)
+    rewrite_report(qctools_report, '<tag key="lavfi.psnr.mse.y" value="3"/>',
+                   '<tag key="lavfi.psnr.mse.y" value="3"/><side_data_list><side_data side_data_type="SEI"/></side_data_list>',
+                   count=40)
+    assert list(iter_report_window(qctools_report, 2, 9)) == expected_window(qctools_report, 2, 9)
+
+
+def test_report_window_with_gzip_seek_points(qctools_report, monkeypatch):
+    pytest.importorskip('indexed_gzip')
+    monkeypatch.setattr(report_reader, 'index_spacing', 4096)
+    monkeypatch.setattr(report_reader, 'window_stream_seconds', 1)
+    expected = expected_window(qctools_report, 10, 11)
+    assert list(iter_report_window(qctools_report, 10, 11)) == expected
+    assert load_report_index(qctools_report)['gzip_index']
+    assert os.path.isfile(index_paths(qctools_report)[1])
+
+
+@pytest.fixture
+def embedded_report(qctools_report, tmp_path, monkeypatch):
+    """A .qctools.mkv stand-in, with a command that writes its 'attachment' to stdout the way ffmpeg does"""
+    import shutil
+    import sys
+    mkv_path = str(tmp_path / "JPC_AV_00001.mkv.qctools.mkv")
+    shutil.copyfile(qctools_report, mkv_path)
+    monkeypatch.setattr(report_reader, 'embedded_report_command', lambda startObj: [
+        sys.executable, '-c', 'import shutil, sys; shutil.copyfileobj(open(sys.argv[1], "rb"), sys.stdout.buffer)', startObj
+    ])
+    return mkv_path
+
+
+def test_embedded_report_streamed(qctools_report, embedded_report):
+    assert list(iter_report_frames(embedded_report)) == list(iterparse_report_frames(qctools_report))
+    assert list(iterparse_report_frames(embedded_report)) == list(iterparse_report_frames(qctools_report))
+
+    columns = get_report_columns(embedded_report)
+    assert columns.frame_count == 400
+    # nothing is extracted
+    assert not any(name.endswith('.xml.gz') and name != os.path.basename(qctools_report)
+                   for name in os.listdir(os.path.dirname(embedded_report)))
+    assert os.path.isfile(columns_paths(embedded_report)[0])
+    assert load_columns(embedded_report) is not None
+
+
+def test_embedded_report_window(qctools_report, embedded_report, monkeypatch):
+    monkeypatch.setattr(report_reader, 'index_spacing', 4096)
+    monkeypatch.setattr(report_reader, 'window_stream_seconds', 1)
+    # stops reading (and ffmpeg) once the window has been read
+    assert list(iter_report_window(embedded_report, 2, 3)) == expected_window(qctools_report, 2, 3)
+    assert not load_report_index(embedded_report)['gzip_index']
+    assert list(iter_report_window(embedded_report, 8, 9)) == expected_window(qctools_report, 8, 9)
+
+
+def test_report_followed_while_written(qctools_report, tmp_path, monkeypatch):
+    monkeypatch.setattr(report_reader, 'follow_poll_interval', 0.001)
+    growing_report = str(tmp_path / "growing.qctools.xml.gz")
+    writer = start_growing_copy(qctools_report, growing_report)
+    assert list(iter_report_frames(growing_report, follow=writer.is_alive)) == list(iterparse_report_frames(qctools_report))
+    assert not writer.is_alive()
+
+
+def test_report_that_stops_growing_is_incomplete(qctools_report, tmp_path, monkeypatch):
+    monkeypatch.setattr(report_reader, 'follow_poll_interval', 0.001)
+    with open(qctools_report, 'rb') as f:
+        data = f.read()
+    truncated_report = tmp_path / "truncated.qctools.xml.gz"
+    truncated_report.write_bytes(data[:len(data) // 2])
+    with pytest.raises(EOFError):
+        list(iter_report_frames(str(truncated_report), follow=lambda: False))
+
+
+def test_signalstats_frames(qctools_report, signalstats_output):
+    keys = {'YMAX', 'YMIN', 'mse.y'}
+    signalstats = list(iter_signalstats_frames("JPC_AV_00001.mkv", keys=keys))
+    report = list(iterparse_report_frames(qctools_report, keys))
+    assert len(signalstats) == len(report) == 400
+    for (pkt, frame), (_, report_frame) in zip(signalstats, report):
+        assert pkt == 'pkt_pts_time'
+        assert float(frame.pop(pkt)) == pytest.approx(float(report_frame.pop(pkt)), abs=1e-6)
+        assert frame == report_frame
+
+
+def test_signalstats_columns_match_report(qctools_report, signalstats_output):
+    columns = read_signalstats("JPC_AV_00001.mkv")
+    report_columns = get_report_columns(qctools_report, use_cache=False)
+    assert sorted(columns.names) == sorted(report_columns.names)
+    assert list(columns.iter_frames()) == list(report_columns.iter_frames())
+    assert read_signalstats("JPC_AV_00001.mkv", check_cancelled=lambda: True) is None
+
+
+def read_report_text(report_path):
+    import gzip
+    with gzip.open(report_path, 'rt') as report:
+        return report.read()
+
+
+@pytest.mark.parametrize("chunk_size", [2**20, 97])
+def test_merged_segments_match_serial_report(qctools_report, tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(report_reader, 'scan_chunk_size', chunk_size)
+    segment_paths = [
+        write_qctools_report(tmp_path / f"segment{i}.xml.gz", end - start, first_frame=start)
+        for i, (start, end) in enumerate([(0, 130), (130, 131), (131, 400)])
+    ]
+    merged_path = str(tmp_path / "merged.qctools.xml.gz")
+    assert merge_reports(segment_paths, merged_path)
+    assert read_report_text(merged_path) == read_report_text(qctools_report)
+
+
+def test_merged_streams_interleaved_by_timestamp(qctools_report, tmp_path):
+    import gzip
+    import re
+    serial = read_report_text(qctools_report)
+    stream_paths = []
+    for media_type in ('video', 'audio'):
+        # a report of one stream: the frames of the other one taken out
+        other = 'audio' if media_type == 'video' else 'video'
+        stream_path = str(tmp_path / f"{media_type}.xml.gz")
+        with gzip.open(stream_path, 'wt') as stream:
+            stream.write(re.sub(rf'\n +<frame media_type="{other}".*?</frame>', '', serial, flags=re.S))
+        stream_paths.append(stream_path)
+    merged_path = str(tmp_path / "merged.qctools.xml.gz")
+    # video frames come before audio frames with the same timestamp, as in the serial report
+    assert merge_reports(stream_paths, merged_path)
+    assert read_report_text(merged_path) == serial
+
+
+def test_merged_segments_shifted_to_video_time(qctools_report, tmp_path):
+    starts = [0, 100, 250]
+    segment_paths = []
+    for i, (start, end) in enumerate(zip(starts, starts[1:] + [400])):
+        # a segment whose timestamps start at 0
+        segment_paths.append(write_qctools_report(tmp_path / f"segment{i}.xml.gz", end - start, first_frame=start,
+                                                  time_offset=start * 1001 / 30000))
+    merged_path = str(tmp_path / "merged.qctools.xml.gz")
+    assert merge_reports(segment_paths, merged_path, offsets=[start * 1001 / 30000 for start in starts])
+
+    merged = list(iterparse_report_frames(merged_path))
+    serial = list(iterparse_report_frames(qctools_report))
+    assert len(merged) == len(serial)
+    for (pkt, merged_frame), (_, serial_frame) in zip(merged, serial):
+        assert float(merged_frame.pop(pkt)) == pytest.approx(float(serial_frame.pop(pkt)), abs=2e-6)
+        assert merged_frame == serial_frame
+
+
+def test_incomplete_segment_not_merged(qctools_report, tmp_path, setup_logging):
+    import gzip
+    truncated_path = str(tmp_path / "truncated.xml.gz")
+    with gzip.open(truncated_path, 'wt') as truncated:
+        truncated.write(read_report_text(qctools_report)[:50000])
+    merged_path = str(tmp_path / "merged.qctools.xml.gz")
+    assert not merge_reports([qctools_report, truncated_path], merged_path)
+    assert not os.path.exists(merged_path) and not os.path.exists(merged_path + ".tmp")
@@ -0,0 +1,71 @@
+import gzip
+import shutil
+import subprocess
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from AV_Spex.processing.qctools_segments import (
+    audio_filtergraph, movie_filter_path, qctools_audio_filters, qctools_video_filters, run_segmented_qctools,
+    segment_filtergraph
+)
+
+
+def test_segment_filtergraph_escapes_path():
+    graph = segment_filtergraph("C:\\tapes\\JPC_AV_00001 [take 2].mkv", 60.5, 120.25)
+    assert graph.startswith("movie=C\\\\:/tapes/JPC_AV_00001 \\[take 2\\].mkv:s=dv:seek_point=59.5[in0];")
+    # filtered from a second before to a second after, the frames outside the segment are dropped after the filters
+    assert "[in0]trim=start=59.5:end=121.25,signalstats" in graph
+    assert graph.endswith("ssim,trim=start=60.5:end=120.25[out0]")
+    assert audio_filtergraph("C:\\tapes\\JPC_AV_00001 [take 2].mkv") == \
+        "nullsrc=d=0[out0];amovie=C\\\\:/tapes/JPC_AV_00001 \\[take 2\\].mkv:s=da,ebur128=metadata=1,astats=metadata=1:reset=1:length=0.4[out1]"
+
+
+def test_first_and_last_segment_filtergraph():
+    graph = segment_filtergraph("/tapes/JPC_AV_00001.mkv", 0, 60)
+    assert graph.startswith("movie=/tapes/JPC_AV_00001.mkv:s=dv:seek_point=0[in0];[in0]trim=start=0:end=61.0,signalstats")
+    assert graph.endswith("ssim,trim=start=0:end=60[out0]")
+    graph = segment_filtergraph("/tapes/JPC_AV_00001.mkv", 3600, None)
+    assert "[in0]trim=start=3599.0,signalstats" in graph and graph.endswith("ssim,trim=start=3600[out0]")
+
+
+def report_frames(report_path):
+    """The frames of a QCTools report, video and audio, in the order they are in the report"""
+    with gzip.open(report_path) as report:
+        frames = ET.parse(report).getroot().find('frames')
+    return [(frame.attrib, [(tag.get('key'), tag.get('value')) for tag in frame.iter('tag')]) for frame in frames]
+
+
+def generate_serial_report(video_path, report_path):
+    """The QCTools report of a whole video from one ffprobe process, the video and audio filtered together"""
+    graph = (f"movie={movie_filter_path(video_path)}:s=dv+da[in0][in1];"
+             f"[in0]{qctools_video_filters}[out0];[in1]{qctools_audio_filters}[out1]")
+    result = subprocess.run(['ffprobe', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i', graph,
+                             '-show_frames', '-show_versions', '-of', 'xml=x=1:q=1', '-noprivate'],
+                            stdout=subprocess.PIPE, check=True)
+    with gzip.open(report_path, 'wb') as report:
+        report.write(result.stdout)
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None or shutil.which('ffprobe') is None, reason="needs ffmpeg and ffprobe")
+def test_segmented_report_matches_whole_report(tmp_path):
+    # intra-frame FFV1 with PCM audio, long enough for segments to start past the preroll
+    video_path = str(tmp_path / "JPC_AV_00001.mkv")
+    subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc2=size=160x120:rate=30000/1001:duration=8',
+                    '-f', 'lavfi', '-i', 'sine=frequency=1000:sample_rate=48000:duration=8',
+                    '-c:v', 'ffv1', '-level', '3', '-g', '1', '-c:a', 'pcm_s24le', video_path], check=True)
+
+    generate_serial_report(video_path, tmp_path / "whole.qctools.xml.gz")
+    whole = report_frames(tmp_path / "whole.qctools.xml.gz")
+    media_types = [attrib['media_type'] for attrib, tags in whole]
+    assert media_types.count('video') == 240 and 'audio' in media_types
+    # the serial report interleaves the streams
+    assert media_types.index('audio') < len(media_types) - media_types[::-1].index('video')
+
+    for segments in (1, 3, 4):
+        merged_path = tmp_path / f"merged{segments}.qctools.xml.gz"
+        assert run_segmented_qctools(video_path, str(merged_path), segments)
+        merged = report_frames(merged_path)
+        # every frame, with every value, in the same order, including the first frames of each segment
+        assert merged == whole
+        assert not list(tmp_path.glob(f"merged{segments}.qctools.xml.gz.part*"))
@@ -0,0 +1,49 @@
+import csv
+import random
+
+import pytest
+
+from AV_Spex.utils.generate_report import summarize_failures
+
+
+def sorted_summary(failure_csv_path):
+    """summarize_failures as it was before streaming: every failure loaded and sorted"""
+    all_failures = []
+    with open(failure_csv_path, newline='') as csvfile:
+        for row in csv.DictReader(csvfile):
+            all_failures.append((row['Timestamp'], {'tag': row['Tag'], 'tagValue': float(row['Tag Value']), 'over': float(row['Threshold'])}))
+    max_frames_per_tag = 5 if len({info['tag'] for timestamp, info in all_failures}) <= 2 else 3
+    all_failures.sort(key=lambda x: abs(x[1]['tagValue'] - x[1]['over']), reverse=True)
+    tag_counts = {}
+    summary = {}
+    for timestamp, info in all_failures:
+        if tag_counts.get(info['tag'], 0) < max_frames_per_tag:
+            tag_counts[info['tag']] = tag_counts.get(info['tag'], 0) + 1
+            summary.setdefault(timestamp, []).append(info)
+    return summary
+
+
+def write_failures(path, tags, rows=2000):
+    failures = random.Random(len(tags))
+    with open(path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Timestamp', 'Tag', 'Tag Value', 'Threshold'])
+        for index in range(rows):
+            tag = failures.choice(tags)
+            # few distinct values, so there are ties in the differences
+            writer.writerow([f"00:00:{index // 30:02d}.{index % 30:04d}", tag, float(failures.randint(0, 40)), 20.0])
+    return str(path)
+
+
+@pytest.mark.parametrize("tags", [['YMIN'], ['YMIN', 'SATMAX'], ['YMIN', 'SATMAX', 'TOUT', 'BRNG']])
+def test_summarize_failures_matches_full_sort(tmp_path, tags):
+    failure_csv_path = write_failures(tmp_path / "qct-parse_profile_failures.csv", tags)
+    summary = summarize_failures(failure_csv_path)
+    assert list(summary.items()) == list(sorted_summary(failure_csv_path).items())
+    assert sum(len(infos) for infos in summary.values()) == len(tags) * (5 if len(tags) <= 2 else 3)
+
+
+def test_summarize_failures_empty_csv(tmp_path):
+    failure_csv_path = tmp_path / "qct-parse_profile_failures.csv"
+    failure_csv_path.write_text("")
+    assert summarize_failures(str(failure_csv_path)) == {}
@@ -0,0 +1,48 @@
+import csv
+
+import numpy
+import pytest
+
+from AV_Spex.checks import tag_statistics
+from AV_Spex.checks.qctools_report import get_report_columns
+from AV_Spex.checks.tag_statistics import TagStatistics, report_tag_statistics
+
+
+def read_statistics(path):
+    with open(path, newline='') as csvfile:
+        return {row['Tag']: row for row in csv.DictReader(csvfile)}
+
+
+def test_statistics_match_numpy(monkeypatch):
+    monkeypatch.setattr(tag_statistics, 'chunk_size', 1000)   # several chunks are merged
+    values = numpy.random.default_rng(5).normal(500, 120, 10000)
+    values[::7] = numpy.nan
+    accumulator = tag_statistics.TagAccumulator('YAVG')
+    for start in range(0, values.size, tag_statistics.chunk_size):
+        accumulator.update(values[start:start + tag_statistics.chunk_size])
+
+    finite = values[numpy.isfinite(values)]
+    assert accumulator.count == finite.size
+    assert accumulator.mean == pytest.approx(finite.mean())
+    assert accumulator.m2 / accumulator.count == pytest.approx(finite.var())
+    assert (accumulator.min, accumulator.max) == (finite.min(), finite.max())
+    assert int(accumulator.histogram.sum()) == finite.size
+    bin_width = 1024 / tag_statistics.histogram_bins
+    for p in tag_statistics.percentiles:
+        assert abs(accumulator.percentile(p) - numpy.percentile(finite, p)) <= bin_width
+
+
+def test_columns_match_frames(qctools_report, tmp_path):
+    tags = [('YMIN', 'YMIN'), ('SATMAX', 'SATMAX'), ('TOUT', 'TOUT'), ('mse_y', 'mse.y'), ('Overall_Min_level', 'Overall_Min_level')]
+    from_frames = report_tag_statistics(qctools_report, tags)
+    from_columns = TagStatistics(tags)
+    from_columns.update_columns(get_report_columns(qctools_report, use_cache=False))
+
+    from_frames.write_csv(tmp_path / "frames.csv")
+    from_columns.write_csv(tmp_path / "columns.csv")
+    assert (tmp_path / "frames.csv").read_bytes() == (tmp_path / "columns.csv").read_bytes()
+
+    rows = read_statistics(tmp_path / "frames.csv")
+    assert list(rows) == ['YMIN', 'SATMAX', 'TOUT', 'mse_y']   # audio levels aren't in the video frames
+    assert rows['TOUT']['Histogram High'] == '1.0'
+    assert len(rows['YMIN']['Histogram'].split()) == tag_statistics.histogram_bins